@@ -0,0 +1,31 @@
+"""
+Command line entry point: python -m dungeon_synth_processor <command> [options]
+"""
+
+import os
+import sys
+
+# Modules in this directory import each other by bare name
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    'batch': 'Render presets, tints and sizes for whole directories of images'
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print("usage: python -m dungeon_synth_processor <command> [options]\n\ncommands:")
+        for name, description in COMMANDS.items():
+            print(f"  {name:<10}{description}")
+        return 0 if argv and argv[0] in ('-h', '--help') else 2
+
+    command, args = argv[0], argv[1:]
+    if command == 'batch':
+        import batch
+        return batch.main(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
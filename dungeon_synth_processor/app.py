@@ -1,7 +1,6 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Blueprint, Response, current_app, render_template, request, jsonify, send_file, stream_with_context
 import os
 import uuid
-import tempfile
 import atexit
 import logging
 import signal
@@ -10,51 +9,216 @@ from werkzeug.utils import secure_filename
 import PIL
 from PIL import Image, ImageOps
 import io
-import base64
+import json
 
-from image_processor import DungeonSynthProcessor
+from image_processor import DungeonSynthProcessor, params_digest
 from presets import PROCESSING_PRESETS, COLOR_TINTS, get_color_tint_info
+from upload_store import UploadStore
+from scheduler import RenderScheduler, SchedulerBusy
+from render_params import (ParameterError, coerce_bool, normalize_params, preset_params, normalize_size,
+                           estimate_cost, sweep_values, text_layer)
+from typography import DEFAULT_FONT_DIR
+from export import ExportEntry, stream_export
+from speculative import SpeculativeRenderer
+from upload_stream import SNIFF_BYTES, ChunkHashes, copy_stream
+from janitor import Janitor
+from dispatcher import DISPATCHER_HEADER, WARMUP_HEADER
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # 32MB max file size
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
+# Shared state lives outside any single worker so every process sees it, in
+# one instance folder so upload files and their index always belong together.
+# Paths left unset are placed under INSTANCE_FOLDER (Flask's instance path by default)
+INSTANCE_PATHS = {
+    'UPLOAD_FOLDER': 'uploads',
+    'RENDER_FOLDER': 'renders',
+    'TEXTURE_FOLDER': 'textures',
+    'UPLOAD_STORE': 'uploads.db'
+}
 
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+DEFAULT_CONFIG = {
+    'MAX_CONTENT_LENGTH': 32 * 1024 * 1024,  # 32MB max file size
+    'INSTANCE_FOLDER': None,
+    'UPLOAD_FOLDER': None,
+    'RENDER_FOLDER': None,
+    # Generated paper texture pyramids, memory-mapped by every worker
+    'TEXTURE_FOLDER': None,
+    # .ttf and .otf files offered for the band-logo text layer, by file name
+    'FONT_FOLDER': DEFAULT_FONT_DIR,
+    'UPLOAD_STORE': None,
+    # Render slots per worker and lane overrides, see scheduler.DEFAULT_LANES
+    'SCHEDULER_WORKERS': max(2, os.cpu_count() or 1),
+    'SCHEDULER_LANES': {},
+    # Largest download edge, and render_params.estimate_cost limits: previews
+    # above PREVIEW_COST_LIMIT move to the render lane, renders above
+    # MAX_RENDER_COST are refused before any work starts
+    'MAX_OUTPUT_SIZE': 8000,
+    'PREVIEW_COST_LIMIT': 25_000_000,
+    'MAX_RENDER_COST': 4_000_000_000,
+    # /export matrix limits; renders run this many at a time, default is the render lane's share
+    'MAX_EXPORT_ENTRIES': 200,
+    'MAX_EXPORT_COST': 40_000_000_000,
+    'EXPORT_WORKERS': None,
+    'MAX_CONTACT_TILE': 1000,
+    'MAX_SWEEP_FRAMES': 33,
+    # Background threads pre-rendering the preset gallery after each upload; 0 disables
+    'SPECULATIVE_WORKERS': 1,
+    # Threads splitting one large render into row strips; None sizes it to the CPU count
+    'STRIP_WORKERS': None,
+    # Bytes of free working arrays each worker keeps for reuse by later renders
+    'BUFFER_POOL_BYTES': 64 * 1024 * 1024,
+    # Tone, grain and tint kernels: 'numpy', or 'numba' when installed (verified at startup)
+    'KERNEL_BACKEND': 'numpy',
+    # Chunk size suggested to resumable upload clients
+    'UPLOAD_CHUNK_BYTES': 4 * 1024 * 1024,
+    # Janitor sweep period in seconds (0 disables), idle lifetimes in seconds,
+    # and the byte quota shared by uploads, renders and partial uploads (None for no limit)
+    'JANITOR_INTERVAL': 300,
+    'UPLOAD_TTL': 24 * 3600,
+    'RENDER_TTL': 6 * 3600,
+    'PARTIAL_UPLOAD_TTL': 3600,
+    'CACHE_TTL': 1800,
+    'DISK_QUOTA_BYTES': 2 * 1024 * 1024 * 1024
+}
 
-# Initialize processor
-processor = DungeonSynthProcessor()
+bp = Blueprint('processor', __name__)
 
-# Store processed preview images for download
-preview_cache = {}
+def create_app(config=None):
+    """Build a Flask app; safe to call once per pre-forked worker"""
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_envvar('DUNGEON_SYNTH_SETTINGS', silent=True)
+    if config:
+        app.config.update(config)
+    
+    app.config['INSTANCE_FOLDER'] = app.config['INSTANCE_FOLDER'] or app.instance_path
+    for key, name in INSTANCE_PATHS.items():
+        if not app.config[key]:
+            app.config[key] = os.path.join(app.config['INSTANCE_FOLDER'], name)
+    
+    # Ensure upload directory exists
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    
+    # Renders go to a shared folder so any worker can serve them
+    app.extensions['processor'] = DungeonSynthProcessor(temp_dir=app.config['RENDER_FOLDER'],
+                                                        strip_workers=app.config['STRIP_WORKERS'],
+                                                        pool_bytes=app.config['BUFFER_POOL_BYTES'],
+                                                        kernel_backend=app.config['KERNEL_BACKEND'],
+                                                        texture_dir=app.config['TEXTURE_FOLDER'],
+                                                        font_dir=app.config['FONT_FOLDER'])
+    app.extensions['upload_store'] = UploadStore(app.config['UPLOAD_STORE'])
+    app.extensions['scheduler'] = RenderScheduler(app.config['SCHEDULER_WORKERS'],
+                                                  app.config['SCHEDULER_LANES'])
+    app.extensions['speculative'] = SpeculativeRenderer(app.extensions['scheduler'],
+                                                        app.config['SPECULATIVE_WORKERS'])
+    app.extensions['chunk_hashes'] = ChunkHashes()
+    app.extensions['janitor'] = Janitor(
+        app.extensions['processor'], app.extensions['upload_store'],
+        app.config['UPLOAD_FOLDER'], app.config['RENDER_FOLDER'],
+        interval=app.config['JANITOR_INTERVAL'],
+        upload_ttl=app.config['UPLOAD_TTL'],
+        render_ttl=app.config['RENDER_TTL'],
+        partial_ttl=app.config['PARTIAL_UPLOAD_TTL'],
+        cache_ttl=app.config['CACHE_TTL'],
+        quota_bytes=app.config['DISK_QUOTA_BYTES'],
+        chunk_hashes=app.extensions['chunk_hashes'])
+    
+    app.register_blueprint(bp)
+    return app
 
-# Cleanup on app shutdown
-def cleanup_on_exit():
-    try:
-        processor.cleanup()
-        preview_cache.clear()
-        logger.info("Application shutdown - cleaned up temporary files")
-    except Exception as e:
-        logger.error(f"Cleanup error: {e}")
+def get_processor():
+    return current_app.extensions['processor']
+
+def get_upload_store():
+    return current_app.extensions['upload_store']
+
+def get_scheduler():
+    return current_app.extensions['scheduler']
+
+def get_speculative():
+    return current_app.extensions['speculative']
+
+def get_janitor():
+    return current_app.extensions['janitor']
+
+def get_chunk_hashes():
+    return current_app.extensions['chunk_hashes']
+
+def busy_response(error):
+    """503 with Retry-After when a scheduler lane refuses more work"""
+    response = jsonify({
+        'error': 'Server busy, please retry shortly.',
+        'lane': error.lane,
+        'retry_after': error.retry_after
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def check_font(params):
+    """Refuse a text layer naming a font that is not in FONT_FOLDER before any work starts"""
+    if params.get('text') and not get_processor().typesetter.has_font(params['text_font']):
+        raise ParameterError(f"Unknown font: {params['text_font']}")
+    return params
 
-def signal_handler(signum, frame):
-    logger.info("Received shutdown signal, cleaning up...")
-    cleanup_on_exit()
-    sys.exit(0)
+def speculate_gallery(filename, filepath, color_tint='none', preserve_aspect_ratio=False, logo=None):
+    """Queue low-priority previews of every preset so the gallery hits the cache"""
+    processor = get_processor()
+    speculative = get_speculative()
+    for preset_name in PROCESSING_PRESETS:
+        # The gallery sends the band logo with every preset, so speculation does too
+        params = {**preset_params(preset_name, color_tint, preserve_aspect_ratio), **(logo or {})}
+        cost = render_cost(filename, params, 400)
+        speculative.submit(filename, processor.process_preview, filepath, params, cost=cost.units)
 
-# Register cleanup handlers
-atexit.register(cleanup_on_exit)
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+def render_cost(filename, params, size, include_resample=False):
+    """Estimate a render's cost from recorded upload dimensions"""
+    upload = get_upload_store().get(filename)
+    source_size = (upload['width'], upload['height']) if upload else None
+    return estimate_cost(params, size, source_size, include_resample)
 
 # Allowed image extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'tiff', 'bmp', 'webp', 'tif'}
 MAX_DIMENSION = 20000  # Maximum width or height
 
+def upload_path(filename):
+    """Path of a known upload, marked as just used, or None; answered from the upload index"""
+    if get_upload_store().get(filename) is None:
+        return None
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    get_janitor().touch(filepath)
+    return filepath
+
+def content_filename(digest, extension):
+    """Stored name of an upload; identical bytes always get the same name"""
+    return f"{digest[:32]}.{extension}"
+
+def partial_upload_path(upload_id):
+    """Where an upload is written until it has been validated"""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], f'.{upload_id}.part')
+
+def declared_extension(filename):
+    """Allowed extension of a client file name, None when absent; raises ParameterError otherwise"""
+    if not filename or '.' not in filename:
+        return None
+    extension = filename.rsplit('.', 1)[1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise ParameterError(f'Invalid file type. Supported formats: {", ".join(ALLOWED_EXTENSIONS).upper()}')
+    return extension
+
+def gallery_settings(data):
+    """Tint, aspect setting and band logo an upload's speculative gallery is rendered with"""
+    color_tint = data.get('color_tint', 'none')
+    try:
+        logo = check_font(text_layer(data))
+    except ParameterError:
+        # A logo the gallery will be refused for is not worth pre-rendering
+        logo = {}
+    return (color_tint if color_tint in COLOR_TINTS else 'none',
+            coerce_bool(data.get('preserve_aspect_ratio', 'false')), logo)
+
 def allowed_file(filename):
     if '.' not in filename:
         return False
@@ -70,102 +234,315 @@ def validate_image_size(image):
         return False
     return True
 
-@app.errorhandler(413)
+@bp.app_errorhandler(413)
 def too_large(e):
     return jsonify({'error': 'File too large. Maximum size is 32MB.'}), 413
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(e):
     logger.error(f"Internal server error: {str(e)}")
     return jsonify({'error': 'Internal server error occurred.'}), 500
 
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
-    """Handle file upload and return base64 preview"""
+def upload_response(filename, filepath, width, height, format_info, gallery, deduplicated=False):
+    """Upload reply with the cached 400x400 preview; also starts on the gallery"""
+    preview_base64 = get_scheduler().run('preview', get_processor().upload_preview, filepath)
+    dispatched = bool(request.headers.get(DISPATCHER_HEADER))
+    
+    # Start on the gallery before the client asks for it, on the worker that
+    # will serve it; behind the dispatcher that is the owner, reached via /warm
+    if not dispatched:
+        speculate_gallery(filename, filepath, *gallery)
+    
+    response = jsonify({
+        'success': True,
+        'filename': filename,
+        'width': width,
+        'height': height,
+        'format': format_info,
+        'deduplicated': deduplicated,
+        'preview': preview_base64
+    })
+    if dispatched:
+        # Uploads are routed before they have a name; the dispatcher warms the owner
+        color_tint, preserve_aspect_ratio, logo = gallery
+        response.headers[WARMUP_HEADER] = json.dumps({'filename': filename, 'color_tint': color_tint,
+                                                      'preserve_aspect_ratio': preserve_aspect_ratio, **logo})
+    return response
+
+def accept_upload(partial_path, digest, extension, gallery):
+    """Store a fully received upload under its content name and reply like /upload"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    store = get_upload_store()
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+        existing = store.acquire(digest)
+        if existing and not os.path.exists(os.path.join(upload_folder, existing['filename'])):
+            # Source vanished underneath the index; store this copy afresh
+            store.remove(existing['filename'])
+            existing = None
         
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        # Check file extension
-        if not '.' in file.filename:
-            return jsonify({'error': 'Invalid file - no extension found'}), 400
-        
-        extension = file.filename.rsplit('.', 1)[1].lower()
+        if existing:
+            # Same bytes as a stored upload: share its source and every derived artifact
+            os.remove(partial_path)
+            filename = existing['filename']
+            filepath = os.path.join(upload_folder, filename)
+            get_janitor().touch(filepath)
+            try:
+                response = upload_response(filename, filepath, existing['width'], existing['height'],
+                                           existing['format'], gallery, deduplicated=True)
+            except Exception:
+                release_upload(filename)
+                raise
+            logger.info(f"Duplicate upload mapped to {filename} ({existing['refs']} references)")
+            return response
         
-        if extension not in ALLOWED_EXTENSIONS:
-            supported_formats = list(ALLOWED_EXTENSIONS)
-            return jsonify({
-                'error': f'Invalid file type. Supported formats: {", ".join(supported_formats).upper()}'
-            }), 400
+        filename = content_filename(digest, extension)
+        filepath = os.path.join(upload_folder, filename)
         
-        try:
-            # Generate unique filename
-            filename = str(uuid.uuid4()) + '.' + extension
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+        # Validate image
+        with Image.open(partial_path) as img:
+            # Force load and apply EXIF orientation correction
+            img.load()
+            format_info = img.format or 'Unknown'
+            orientation = img.getexif().get(0x0112, 1)
+            img = ImageOps.exif_transpose(img)
             
-            # Validate image
-            with Image.open(filepath) as img:
-                # Force load and apply EXIF orientation correction
-                img.load()
-                img = ImageOps.exif_transpose(img)
-                
-                # Convert problematic modes to RGB
-                if img.mode not in ('RGB', 'L'):
-                    if img.mode == 'RGBA':
-                        # Handle transparency by creating white background
-                        background = Image.new('RGB', img.size, (255, 255, 255))
-                        background.paste(img, mask=img.split()[-1])
-                        img = background
-                    else:
-                        img = img.convert('RGB')
-                
-                if not validate_image_size(img):
-                    os.remove(filepath)  # Clean up invalid file
-                    return jsonify({'error': f'Image too large. Maximum dimensions: {MAX_DIMENSION}x{MAX_DIMENSION}'}), 400
-                
-                width, height = img.size
-                format_info = img.format or 'Unknown'
-                
-                # Create 400x400 preview matching web app
-                preview_base64 = processor.create_preview_base64(img)
+            # Convert problematic modes to RGB
+            if img.mode not in ('RGB', 'L'):
+                if img.mode == 'RGBA':
+                    # Handle transparency by creating white background
+                    background = Image.new('RGB', img.size, (255, 255, 255))
+                    background.paste(img, mask=img.split()[-1])
+                    img = background
+                else:
+                    img = img.convert('RGB')
             
-            # Initialize preview cache for this file
-            preview_cache[filename] = {}
+            if not validate_image_size(img):
+                os.remove(partial_path)  # Clean up invalid file
+                return jsonify({'error': f'Image too large. Maximum dimensions: {MAX_DIMENSION}x{MAX_DIMENSION}'}), 400
             
-            logger.info(f"Image uploaded successfully: {filename} ({width}x{height}, {format_info})")
+            width, height = img.size
+            mode = img.mode
             
-            return jsonify({
-                'success': True,
-                'filename': filename,
-                'width': width,
-                'height': height,
-                'format': format_info,
-                'preview': preview_base64
-            })
+            # Create 400x400 preview matching web app
+            get_scheduler().run('preview', get_processor().upload_preview, filepath, img)
+        
+        # Publish under the content name, then make the upload known to every worker
+        os.replace(partial_path, filepath)
+        store.add(filename, width, height, format_info, mode, orientation, digest)
+        
+        logger.info(f"Image uploaded successfully: {filename} ({width}x{height}, {format_info})")
+        
+        try:
+            return upload_response(filename, filepath, width, height, format_info, gallery)
+        except Exception:
+            release_upload(filename)
+            raise
+        
+    except Exception as e:
+        # Clean up the partial file if processing failed
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        
+        if isinstance(e, SchedulerBusy):
+            return busy_response(e)
+        
+        error_msg = f'Invalid or corrupted image file: {str(e)}'
+        logger.error(f"Image processing error: {error_msg}")
+        return jsonify({'error': error_msg}), 400
+
+def unsupported_format_response():
+    return jsonify({'error': 'Unrecognized image data. Supported formats: '
+                             f'{", ".join(ALLOWED_EXTENSIONS).upper()}'}), 415
+
+@bp.route('/upload', methods=['POST'])
+def upload_file():
+    """Handle file upload and return base64 preview"""
+    try:
+        if request.mimetype == 'application/octet-stream':
+            # Raw body from a scripted client: no multipart parsing, format comes from the header
+            try:
+                extension = declared_extension(request.args.get('filename'))
+            except ParameterError as e:
+                return jsonify({'error': str(e)}), 400
+            stream = request.stream
+            gallery = gallery_settings(request.args)
+        else:
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file provided'}), 400
             
-        except Exception as e:
-            # Clean up file if processing failed
-            if 'filepath' in locals() and os.path.exists(filepath):
-                os.remove(filepath)
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            
+            # Check file extension
+            if not '.' in file.filename:
+                return jsonify({'error': 'Invalid file - no extension found'}), 400
             
-            error_msg = f'Invalid or corrupted image file: {str(e)}'
-            logger.error(f"Image processing error: {error_msg}")
-            return jsonify({'error': error_msg}), 400
+            try:
+                extension = declared_extension(file.filename)
+            except ParameterError as e:
+                return jsonify({'error': str(e)}), 400
+            stream = file.stream
+            gallery = gallery_settings(request.form)
+        
+        # Hash and sniff while writing so repeat uploads are recognized without a second read
+        partial_path = partial_upload_path(uuid.uuid4().hex)
+        try:
+            digest, sniffed = copy_stream(stream, partial_path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        
+        if extension is None:
+            if sniffed is None:
+                os.remove(partial_path)
+                return unsupported_format_response()
+            extension = sniffed
+        
+        return accept_upload(partial_path, digest, extension, gallery)
         
     except Exception as e:
         logger.error(f"Upload error: {str(e)}")
         return jsonify({'error': 'Upload failed. Please try again.'}), 500
 
-@app.route('/process', methods=['POST'])
+def session_response(session, status=200):
+    return jsonify({
+        'upload_id': session['upload_id'],
+        'offset': session['received'],
+        'size': session['size'],
+        'chunk_size': current_app.config['UPLOAD_CHUNK_BYTES']
+    }), status
+
+def abort_chunked_upload(upload_id):
+    """Forget a chunked upload and delete its partial file"""
+    get_chunk_hashes().discard(upload_id)
+    get_upload_store().remove_session(upload_id)
+    partial_path = partial_upload_path(upload_id)
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+@bp.route('/uploads', methods=['POST'])
+def create_chunked_upload():
+    """Start a resumable upload of a declared number of bytes"""
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            size = int(data.get('size', 0))
+            extension = declared_extension(data.get('filename'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid upload: {str(e)}'}), 400
+        if size <= 0:
+            return jsonify({'error': 'Upload size must be a positive number of bytes'}), 400
+        if size > current_app.config['MAX_CONTENT_LENGTH']:
+            return too_large(None)
+        
+        upload_id = uuid.uuid4().hex
+        store = get_upload_store()
+        store.create_session(upload_id, size, extension)
+        open(partial_upload_path(upload_id), 'wb').close()
+        return session_response(store.get_session(upload_id), 201)
+        
+    except Exception as e:
+        logger.error(f"Chunked upload error: {str(e)}")
+        return jsonify({'error': 'Upload failed. Please try again.'}), 500
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """Where to resume a chunked upload"""
+    session = get_upload_store().get_session(upload_id)
+    if session is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    return session_response(session)
+
+@bp.route('/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """Append the request body at ?offset=, which must equal the bytes received so far"""
+    try:
+        store = get_upload_store()
+        session = store.get_session(upload_id)
+        if session is None:
+            return jsonify({'error': 'Unknown upload'}), 404
+        
+        try:
+            offset = int(request.args.get('offset', ''))
+        except ValueError:
+            return jsonify({'error': 'Chunk offset is required'}), 400
+        if offset != session['received']:
+            # Lost or repeated chunk: tell the client where to resume
+            response, _ = session_response(session)
+            response.status_code = 409
+            return response
+        if offset + (request.content_length or 0) > session['size']:
+            return jsonify({'error': 'Chunk runs past the declared upload size'}), 400
+        
+        partial_path = partial_upload_path(upload_id)
+        chunk_hashes = get_chunk_hashes()
+        writer = chunk_hashes.writer(upload_id, partial_path, offset)
+        try:
+            writer.copy(request.stream, limit=session['size'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if len(writer.header) >= SNIFF_BYTES and writer.format() is None:
+            # Reject non-images after the first chunk rather than after the last
+            abort_chunked_upload(upload_id)
+            return unsupported_format_response()
+        if not store.advance_session(upload_id, offset, writer.offset):
+            return jsonify({'error': 'Another chunk for this offset arrived first'}), 409
+        chunk_hashes.keep(upload_id, writer)
+        return session_response(store.get_session(upload_id))
+        
+    except Exception as e:
+        logger.error(f"Chunk upload error: {str(e)}")
+        return jsonify({'error': 'Chunk upload failed. Resume from the reported offset.'}), 500
+
+@bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_chunked_upload(upload_id):
+    """Validate and store a completely received chunked upload; replies like /upload"""
+    try:
+        store = get_upload_store()
+        session = store.get_session(upload_id)
+        if session is None:
+            return jsonify({'error': 'Unknown upload'}), 404
+        if session['received'] != session['size']:
+            response, _ = session_response(session)
+            response.status_code = 409
+            return response
+        
+        partial_path = partial_upload_path(upload_id)
+        chunk_hashes = get_chunk_hashes()
+        writer = chunk_hashes.writer(upload_id, partial_path, session['received'])
+        chunk_hashes.discard(upload_id)
+        if not store.remove_session(upload_id):
+            # A concurrent finalize already took it
+            return jsonify({'error': 'Unknown upload'}), 404
+        
+        extension = session['extension'] or writer.format()
+        if writer.format() is None or extension is None:
+            os.remove(partial_path)
+            return unsupported_format_response()
+        
+        return accept_upload(partial_path, writer.hexdigest(), extension,
+                             gallery_settings(request.get_json(silent=True) or {}))
+        
+    except Exception as e:
+        logger.error(f"Finalize upload error: {str(e)}")
+        return jsonify({'error': 'Upload failed. Please try again.'}), 500
+
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def delete_chunked_upload(upload_id):
+    """Abandon a chunked upload and its partial file"""
+    if get_upload_store().get_session(upload_id) is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    abort_chunked_upload(upload_id)
+    return jsonify({'success': True})
+
+@bp.route('/process', methods=['POST'])
 def process_image():
     """Process image with given parameters and return preview"""
     try:
@@ -175,79 +552,120 @@ def process_image():
             
         filename = data.get('filename')
         
-        # Extract and validate parameters
+        # Clamp and quantize parameters through the shared schema
         try:
-            contrast = float(data.get('contrast', 1.5))
-            brightness = int(data.get('brightness', 0))
-            threshold = int(data.get('threshold', 128))
-            noise = int(data.get('noise', 20))
-            blur = float(data.get('blur', 0))
-            method = data.get('method', 'custom')
-            color_tint = data.get('color_tint', 'none')
-            preserve_aspect_ratio = data.get('preserve_aspect_ratio', False)
-            
-            # Validate parameter ranges
-            contrast = max(0.1, min(5.0, contrast))
-            brightness = max(-200, min(200, brightness))
-            threshold = max(0, min(255, threshold))
-            noise = max(0, min(100, noise))
-            blur = max(0, min(10, blur))
-            
-            # Validate color tint
-            if color_tint not in COLOR_TINTS:
-                color_tint = 'none'
-            
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid parameters provided'}), 400
+            params = check_font(normalize_params(data))
+        except ParameterError as e:
+            return jsonify({'error': str(e)}), 400
         
         if not filename:
             return jsonify({'error': 'No filename provided'}), 400
         
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not os.path.exists(filepath):
+        filepath = upload_path(filename)
+        if filepath is None:
             return jsonify({'error': 'File not found'}), 404
         
-        # Process with validated parameters
-        params = {
-            'contrast': float(data.get('contrast', 1.5)),
-            'brightness': int(data.get('brightness', 0)),
-            'threshold': int(data.get('threshold', 128)),
-            'noise': int(data.get('noise', 20)),
-            'blur': float(data.get('blur', 0)),
-            'method': data.get('method', 'custom'),
-            'color_tint': color_tint,
-            'preserve_aspect_ratio': preserve_aspect_ratio
-        }
+        # Unusually heavy previews queue with renders instead of the sliders
+        cost = render_cost(filename, params, 400)
+        lane = 'preview' if cost.units <= current_app.config['PREVIEW_COST_LIMIT'] else 'render'
         
         # Process and return base64 preview
-        preview_base64 = processor.process_preview(filepath, params)
-        
-        # Cache the processed preview for download
-        # Convert base64 back to PIL Image for caching
-        image_data = base64.b64decode(preview_base64.split(',')[1])
-        processed_image = Image.open(io.BytesIO(image_data))
-        
-        # Store in cache with method and color tint as key
-        cache_key = f"{method}_{color_tint}"
-        if filename not in preview_cache:
-            preview_cache[filename] = {}
-        preview_cache[filename][cache_key] = processed_image.copy()
-        
-        # Also store with just the method name for preset downloads
-        if method != 'custom':
-            preset_cache_key = f"{method}_{color_tint}"
-            preview_cache[filename][preset_cache_key] = processed_image.copy()
+        preview_base64 = get_scheduler().run(lane, get_processor().process_preview, filepath, params,
+                                             cost=cost.units)
         
         return jsonify({
             'success': True,
             'preview': preview_base64
         })
         
+    except SchedulerBusy as e:
+        return busy_response(e)
     except Exception as e:
         logger.error(f"Processing error: {str(e)}")
         return jsonify({'error': f'Processing failed: {str(e)}'}), 500
 
-@app.route('/download/<preset_name>/<filename>')
+@bp.route('/process_sweep', methods=['POST'])
+def process_sweep():
+    """Render a strip of previews stepping one tone slider, for local scrubbing"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        filename = data.get('filename')
+        slider = data.get('slider')
+        max_frames = current_app.config['MAX_SWEEP_FRAMES']
+        try:
+            values = sweep_values(slider, min(int(data.get('count', 9)), max_frames),
+                                  data.get('start'), data.get('stop'), (data.get('values') or [])[:max_frames])
+            params_list = [check_font(normalize_params({**data, slider: value})) for value in values]
+        except (ParameterError, TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid parameters provided: {str(e)}'}), 400
+        
+        if not filename:
+            return jsonify({'error': 'No filename provided'}), 400
+        
+        filepath = upload_path(filename)
+        if filepath is None:
+            return jsonify({'error': 'File not found'}), 404
+        
+        # Lane choice follows a single preview; the strip is charged in full
+        frame_cost = render_cost(filename, params_list[0], 400)
+        lane = 'preview' if frame_cost.units <= current_app.config['PREVIEW_COST_LIMIT'] else 'render'
+        frames = get_scheduler().run(lane, get_processor().process_preview_sweep, filepath, params_list,
+                                     cost=frame_cost.units * len(params_list))
+        
+        return jsonify({
+            'success': True,
+            'slider': slider,
+            'values': values,
+            'frames': frames
+        })
+        
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        logger.error(f"Sweep error: {str(e)}")
+        return jsonify({'error': f'Sweep failed: {str(e)}'}), 500
+
+@bp.route('/tone_base', methods=['POST'])
+def tone_base():
+    """Blurred luma and grain field for client-side brightness/contrast previews"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        filename = data.get('filename')
+        try:
+            params = normalize_params(data)
+        except ParameterError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not filename:
+            return jsonify({'error': 'No filename provided'}), 400
+        
+        filepath = upload_path(filename)
+        if filepath is None:
+            return jsonify({'error': 'File not found'}), 404
+        
+        base = get_scheduler().run('preview', get_processor().tone_base, filepath, params['blur'],
+                                   params['preserve_aspect_ratio'])
+        
+        return jsonify({
+            'success': True,
+            'blur': params['blur'],
+            'preserve_aspect_ratio': params['preserve_aspect_ratio'],
+            **base
+        })
+        
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        logger.error(f"Tone base error: {str(e)}")
+        return jsonify({'error': f'Tone base failed: {str(e)}'}), 500
+
+@bp.route('/download/<preset_name>/<filename>')
 def download_processed(preset_name, filename):
     """Download processed image at specified size (default 400x400)"""
     try:
@@ -255,47 +673,62 @@ def download_processed(preset_name, filename):
         if preset_name not in PROCESSING_PRESETS and preset_name != 'custom':
             return jsonify({'error': 'Invalid preset name'}), 400
             
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not os.path.exists(filepath):
+        filepath = upload_path(filename)
+        if filepath is None:
             return jsonify({'error': 'Original file not found'}), 404
         
         # Get the current color tint and size from request
         data = request.args
-        color_tint = data.get('tint', 'none')
-        size = int(data.get('size', '400'))
-        preserve_aspect_ratio = data.get('preserve_aspect_ratio', 'false').lower() == 'true'
-        
-        # Create cache key to find the exact processed version
-        cache_key = f"{preset_name}_{color_tint}"
+        try:
+            size = normalize_size(data.get('size', '400'), current_app.config['MAX_OUTPUT_SIZE'])
+            preserve_aspect_ratio = data.get('preserve_aspect_ratio', 'false')
+            if preset_name == 'custom':
+                # For custom, the current slider values come with the request
+                params = normalize_params({**data.to_dict(), 'color_tint': data.get('tint', 'none'),
+                                           'preserve_aspect_ratio': preserve_aspect_ratio},
+                                          method='custom')
+            else:
+                params = preset_params(preset_name, data.get('tint', 'none'), preserve_aspect_ratio)
+                params.update(text_layer(data))
+            check_font(params)
+        except ParameterError as e:
+            return jsonify({'error': str(e)}), 400
+        color_tint = params['color_tint']
+        preserve_aspect_ratio = params['preserve_aspect_ratio']
         
-        # Process the image to get actual dimensions
         logger.info(f"Processing for download: {preset_name} at size {size} with tint {color_tint}, preserve_aspect_ratio={preserve_aspect_ratio}")
         
-        # Get parameters for this preset
-        if preset_name == 'custom':
-            # For custom, we need to get the current slider values from the request
-            params = {
-                'contrast': float(data.get('contrast', 1.5)),
-                'brightness': int(data.get('brightness', 0)),
-                'threshold': int(data.get('threshold', 128)),
-                'noise': int(data.get('noise', 20)),
-                'blur': float(data.get('blur', 0)),
-                'method': 'custom',
-                'color_tint': color_tint,
-                'preserve_aspect_ratio': preserve_aspect_ratio
-            }
-        else:
-            # For presets, use the preset parameters
-            params = PROCESSING_PRESETS[preset_name].copy()
-            params['color_tint'] = color_tint
-            params['preserve_aspect_ratio'] = preserve_aspect_ratio
+        # Refuse work the cost model says no worker should take on
+        cost = render_cost(filename, params, size, include_resample=True)
+        if cost.units > current_app.config['MAX_RENDER_COST']:
+            return jsonify({
+                'error': 'Requested render is too expensive; choose a smaller size or lighter settings',
+                'cost': cost.units,
+                'max_cost': current_app.config['MAX_RENDER_COST']
+            }), 400
         
-        # Process at target size
-        processed_path = processor.process_at_size(filepath, params, size)
+        # Reuse a render any worker already produced for the same request
+        store = get_upload_store()
+        artifact_key = f"download_{size}_{params_digest(params)}"
+        artifact = store.get_artifact(filename, artifact_key)
         
-        # Get actual dimensions of processed image to create accurate filename
-        with Image.open(processed_path) as img:
-            actual_width, actual_height = img.size
+        processed_file = None
+        if artifact:
+            try:
+                # The index already knows the dimensions; opening to serve is the only disk access
+                processed_file = open(artifact['path'], 'rb')
+                get_janitor().touch(artifact['path'])
+                actual_width, actual_height = artifact['width'], artifact['height']
+            except FileNotFoundError:
+                # Swept by the janitor or cleaned up by another worker since it was indexed
+                store.discard_artifact(filename, artifact_key)
+        
+        if processed_file is None:
+            # Process at target size in the capacity-limited lane
+            processed_path, (actual_width, actual_height) = get_scheduler().run(
+                'render', get_processor().process_at_size, filepath, params, size, cost=cost.units)
+            store.add_artifact(filename, artifact_key, processed_path, actual_width, actual_height)
+            processed_file = open(processed_path, 'rb')
         
         # Create filename with actual dimensions
         tint_suffix = f'_{color_tint}' if color_tint != 'none' else ''
@@ -309,52 +742,234 @@ def download_processed(preset_name, filename):
         logger.info(f"Download started: {preset_name} - {filename} with tint {color_tint} (actual: {actual_width}x{actual_height})")
         
         return send_file(
-            processed_path,
+            processed_file,
             as_attachment=True,
             download_name=download_name,
-            mimetype='image/png'
+            mimetype='image/png',
+            etag=f'{filename}-{artifact_key}'
         )
         
+    except SchedulerBusy as e:
+        return busy_response(e)
     except Exception as e:
         logger.error(f"Download error: {str(e)}")
         return jsonify({'error': f'Download failed: {str(e)}'}), 500
 
-@app.route('/get_presets')
+@bp.route('/export/<filename>')
+def export_matrix(filename):
+    """Stream a ZIP of every requested preset x tint x size render"""
+    try:
+        filepath = upload_path(filename)
+        if filepath is None:
+            return jsonify({'error': 'Original file not found'}), 404
+        
+        data = request.args
+        # Repeated names would render the same entry twice
+        preset_names = list(dict.fromkeys(name for name in data.get('presets', 'all').split(',') if name))
+        if preset_names == ['all']:
+            preset_names = list(PROCESSING_PRESETS)
+        tints = list(dict.fromkeys(tint for tint in data.get('tints', data.get('tint', 'none')).split(',') if tint))
+        preserve_aspect_ratio = data.get('preserve_aspect_ratio', 'false')
+        
+        try:
+            sizes = sorted({normalize_size(size, current_app.config['MAX_OUTPUT_SIZE'])
+                            for size in data.get('sizes', data.get('size', '400')).split(',') if size})
+            for tint in tints:
+                if tint not in COLOR_TINTS:
+                    raise ParameterError(f"Unknown tint: {tint}")
+            
+            # Grouped by size so each resampled base is shared by its presets and tints
+            store = get_upload_store()
+            upload = store.get(filename)
+            source_size = (upload['width'], upload['height']) if upload else None
+            entries = []
+            named = set()
+            for size in sizes:
+                for preset_name in preset_names:
+                    for tint in tints:
+                        if preset_name == 'custom':
+                            params = normalize_params({**data.to_dict(), 'color_tint': tint,
+                                                       'preserve_aspect_ratio': preserve_aspect_ratio},
+                                                      method='custom')
+                        else:
+                            # The band logo goes on every preset of the export alike
+                            params = {**preset_params(preset_name, tint, preserve_aspect_ratio),
+                                      **text_layer(data)}
+                        check_font(params)
+                        cost = estimate_cost(params, size, source_size, include_resample=False)
+                        # Sizes beyond a kept shape's source all come out at the
+                        # source size; archive names follow the output, so keep one
+                        output = (preset_name, tint, cost.width, cost.height)
+                        if output in named:
+                            continue
+                        named.add(output)
+                        entries.append(ExportEntry(preset_name, params, size, cost.units))
+        except ParameterError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        total_cost = sum(entry.cost for entry in entries)
+        if not entries or len(entries) > current_app.config['MAX_EXPORT_ENTRIES']:
+            return jsonify({'error': f"Export must contain 1 to {current_app.config['MAX_EXPORT_ENTRIES']} images"}), 400
+        if (total_cost > current_app.config['MAX_EXPORT_COST']
+                or max(entry.cost for entry in entries) > current_app.config['MAX_RENDER_COST']):
+            return jsonify({
+                'error': 'Requested export is too expensive; choose fewer presets or smaller sizes',
+                'cost': total_cost,
+                'max_cost': current_app.config['MAX_EXPORT_COST']
+            }), 400
+        
+        scheduler = get_scheduler()
+        workers = current_app.config['EXPORT_WORKERS'] or scheduler.lanes['render'].max_concurrent
+        logger.info(f"Export started: {filename} with {len(entries)} images across {workers} workers")
+        
+        stem = os.path.splitext(filename)[0]
+        response = Response(
+            stream_with_context(stream_export(get_processor(), scheduler, filepath, entries, workers)),
+            mimetype='application/zip'
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename=dungeon_synth_{stem}.zip'
+        return response
+        
+    except Exception as e:
+        logger.error(f"Export error: {str(e)}")
+        return jsonify({'error': f'Export failed: {str(e)}'}), 500
+
+@bp.route('/contact_sheet/<filename>')
+def contact_sheet(filename):
+    """Render every preset side by side with labels in a single image"""
+    try:
+        filepath = upload_path(filename)
+        if filepath is None:
+            return jsonify({'error': 'Original file not found'}), 404
+        
+        data = request.args
+        color_tint = data.get('tint', 'none')
+        if color_tint not in COLOR_TINTS:
+            return jsonify({'error': f"Unknown tint: {color_tint}"}), 400
+        try:
+            tile_size = normalize_size(data.get('tile', '300'), current_app.config['MAX_CONTACT_TILE'])
+            columns = max(1, min(len(PROCESSING_PRESETS), int(data.get('columns', 4))))
+        except (ParameterError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        preserve_aspect_ratio = coerce_bool(data.get('preserve_aspect_ratio', 'false'))
+        
+        try:
+            logo = text_layer(data)
+            variants = [(preset['name'],
+                         check_font({**preset_params(name, color_tint, preserve_aspect_ratio), **logo}))
+                        for name, preset in PROCESSING_PRESETS.items()]
+        except ParameterError as e:
+            return jsonify({'error': str(e)}), 400
+        cost = sum(render_cost(filename, params, tile_size).units for _, params in variants)
+        
+        png_bytes = get_scheduler().run('render', get_processor().render_contact_sheet, filepath, variants,
+                                        color_tint, tile_size, columns, preserve_aspect_ratio, cost=cost)
+        
+        tint_suffix = f'_{color_tint}' if color_tint != 'none' else ''
+        return send_file(
+            io.BytesIO(png_bytes),
+            mimetype='image/png',
+            download_name=f'dungeon_synth_contact_sheet{tint_suffix}.png'
+        )
+        
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        logger.error(f"Contact sheet error: {str(e)}")
+        return jsonify({'error': f'Contact sheet failed: {str(e)}'}), 500
+
+@bp.route('/get_presets')
 def get_presets():
     """Return available processing presets exactly matching web app"""
     return jsonify(PROCESSING_PRESETS)
 
-@app.route('/get_color_tints')
+@bp.route('/get_color_tints')
 def get_color_tints():
     """Return available color tints for UI"""
     return jsonify(get_color_tint_info())
 
-@app.route('/cleanup/<filename>', methods=['POST'])
+@bp.route('/get_fonts')
+def get_fonts():
+    """Fonts available to the band-logo text layer, by file name"""
+    return jsonify(get_processor().typesetter.fonts())
+
+@bp.route('/get_tint_luts')
+def get_tint_luts():
+    """Exact gray-to-RGB table of every color tint, 256 rows flattened"""
+    processor = get_processor()
+    return jsonify({name: processor.tint_lut(name).ravel().tolist() for name in COLOR_TINTS})
+
+def release_upload(filename):
+    """Drop one reference to an upload, deleting it with its renders after the last one"""
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    store = get_upload_store()
+    
+    # Identical uploads share one source; only the last release deletes it
+    remaining, artifact_paths = store.release(filename)
+    if remaining:
+        return remaining
+    
+    get_speculative().cancel(filename)
+    get_processor().forget(filepath)
+    # A concurrent upload of the same bytes may have stored it again meanwhile
+    if os.path.exists(filepath) and store.get(filename) is None:
+        os.remove(filepath)
+        logger.info(f"Cleaned up file: {filename}")
+    
+    # Clean up derived renders recorded by any worker
+    for artifact_path in artifact_paths:
+        if os.path.exists(artifact_path):
+            os.remove(artifact_path)
+    return 0
+
+@bp.route('/warm', methods=['POST'])
+def warm_upload():
+    """Load an upload and queue its gallery on this worker, its owner; sent by the dispatcher"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    filepath = upload_path(filename)
+    if filepath is None:
+        return jsonify({'error': 'File not found'}), 404
+    try:
+        get_scheduler().run('speculative', get_processor().upload_preview, filepath)
+    except SchedulerBusy as e:
+        return busy_response(e)
+    speculate_gallery(filename, filepath, *gallery_settings(data))
+    return jsonify({'success': True})
+
+@bp.route('/cleanup/<filename>', methods=['POST'])
 def cleanup_file(filename):
     """Clean up uploaded file and cached previews"""
     try:
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(filepath):
-            os.remove(filepath)
-            logger.info(f"Cleaned up file: {filename}")
-        
-        # Clean up cached previews
-        if filename in preview_cache:
-            del preview_cache[filename]
-            
-        return jsonify({'success': True})
+        remaining = release_upload(filename)
+        return jsonify({'success': True, 'references': remaining})
     except Exception as e:
         logger.error(f"Cleanup error: {str(e)}")
         return jsonify({'error': 'Cleanup failed'}), 500
 
-@app.route('/health')
+@bp.route('/health')
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'presets_available': len(PROCESSING_PRESETS),
         'color_tints_available': len(COLOR_TINTS),
-        'upload_folder': os.path.exists(app.config['UPLOAD_FOLDER'])
+        'upload_folder': os.path.exists(current_app.config['UPLOAD_FOLDER']),
+        'uploads_tracked': get_upload_store().count(),
+        'kernel_backend': get_processor().kernels.name,
+        'pid': os.getpid()
+    })
+
+@bp.route('/stats')
+def stats():
+    """Scheduler queues and cache occupancy for this worker"""
+    return jsonify({
+        'pid': os.getpid(),
+        'scheduler': get_scheduler().stats(),
+        'speculative': get_speculative().stats(),
+        'janitor': get_janitor().stats(),
+        'upload_index': get_upload_store().index_stats(),
+        'caches': get_processor().cache_stats()
     })
 
 def find_free_port():
@@ -367,6 +982,26 @@ def find_free_port():
     return port
 
 if __name__ == '__main__':
+    app = create_app()
+    
+    # Cleanup on app shutdown
+    def cleanup_on_exit():
+        try:
+            app.extensions['processor'].cleanup()
+            logger.info("Application shutdown - cleaned up temporary files")
+        except Exception as e:
+            logger.error(f"Cleanup error: {e}")
+    
+    def signal_handler(signum, frame):
+        logger.info("Received shutdown signal, cleaning up...")
+        cleanup_on_exit()
+        sys.exit(0)
+    
+    # Register cleanup handlers
+    atexit.register(cleanup_on_exit)
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    
     logger.info("Starting Enhanced Dungeon Synth Processor...")
     logger.info(f"Upload folder: {app.config['UPLOAD_FOLDER']}")
     logger.info(f"Max file size: {app.config['MAX_CONTENT_LENGTH'] / (1024*1024):.0f}MB")
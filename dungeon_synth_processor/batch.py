@@ -0,0 +1,317 @@
+"""
+Offline batch rendering for whole directories of cover art
+Every input is rendered with each (variant, tint, size) combination across a
+process pool. Inputs are streamed with a bounded number of files in flight,
+and a manifest next to the outputs lets an interrupted run resume where it
+stopped
+"""
+
+import argparse
+import glob
+import json
+import os
+import signal
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from app import ALLOWED_EXTENSIONS
+from image_processor import FAST_PNG_COMPRESS_LEVEL, DungeonSynthProcessor, params_digest
+from kernels import KERNEL_BACKENDS
+from presets import PROCESSING_PRESETS, COLOR_TINTS
+from render_params import (MAX_OUTPUT_SIZE, ParameterError, normalize_params, normalize_size, preset_params,
+                           text_layer)
+from typography import DEFAULT_FONT_DIR, TEXT_BLEND_MODES, TEXT_POSITIONS, font_names
+
+MANIFEST_NAME = '.batch-manifest.jsonl'
+
+Variant = namedtuple('Variant', ['name', 'params'])
+RenderJob = namedtuple('RenderJob', ['output_path', 'params', 'size', 'digest'])
+
+# One processor per pool process, created by the initializer
+_processor = None
+
+
+def load_variants(presets, param_files):
+    """Resolve preset names and JSON parameter files into named parameter sets"""
+    variants = []
+    names = list(PROCESSING_PRESETS) if presets == ['all'] else presets
+    for name in names:
+        variants.append(Variant(name, preset_params(name)))
+
+    for path in param_files:
+        with open(path) as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ParameterError(f"{path}: expected a JSON object of parameters")
+        name = data.get('name') or os.path.splitext(os.path.basename(path))[0]
+        variants.append(Variant(name, normalize_params(data)))
+    return variants
+
+
+def iter_inputs(patterns, recursive=False):
+    """Yield (path, output stem) for every image matched, without listing everything up front"""
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root = pattern
+            if recursive:
+                candidates = (os.path.join(dirpath, name)
+                              for dirpath, dirnames, filenames in os.walk(root)
+                              for name in sorted(filenames))
+            else:
+                candidates = (os.path.join(root, name) for name in sorted(os.listdir(root)))
+        else:
+            root = None
+            candidates = glob.iglob(pattern, recursive=recursive)
+
+        for path in candidates:
+            extension = os.path.splitext(path)[1].lower().lstrip('.')
+            if extension not in ALLOWED_EXTENSIONS or not os.path.isfile(path):
+                continue
+            absolute = os.path.abspath(path)
+            if absolute in seen:
+                continue
+            seen.add(absolute)
+            # Directory inputs keep their layout so equal names never collide
+            relative = os.path.relpath(path, root) if root else os.path.basename(path)
+            yield absolute, os.path.splitext(relative)[0]
+
+
+def plan_jobs(stem, variants, tints, sizes, output_dir):
+    """Every render for one input, grouped by size so resampled bases are shared"""
+    jobs = []
+    for size in sizes:
+        for variant in variants:
+            for tint in tints or [variant.params['color_tint']]:
+                params = {**variant.params, 'color_tint': tint}
+                tint_suffix = f'_{tint}' if tint != 'none' else ''
+                output_path = os.path.join(output_dir, f"{stem}_{variant.name}{tint_suffix}_{size}.png")
+                digest = params_digest(params)
+                jobs.append(RenderJob(output_path, params, size, digest))
+    return jobs
+
+
+class Manifest:
+    """
+    Append-only record of finished outputs and the source state they came from
+    """
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A run killed mid-write leaves at most one torn line
+                        continue
+                    self.entries[entry['output']] = entry
+        self.file = open(self.path, 'a')
+
+    @staticmethod
+    def source_state(path):
+        stat = os.stat(path)
+        return {'source': path, 'mtime_ns': stat.st_mtime_ns, 'bytes': stat.st_size}
+
+    def is_current(self, job, source_state):
+        entry = self.entries.get(job.output_path)
+        return (entry is not None
+                and entry['digest'] == job.digest
+                and entry['size'] == job.size
+                and all(entry.get(key) == value for key, value in source_state.items())
+                and os.path.exists(job.output_path))
+
+    def record(self, job, source_state):
+        entry = {'output': job.output_path, 'digest': job.digest, 'size': job.size, **source_state}
+        self.entries[job.output_path] = entry
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def _init_worker(output_dir, cache_bytes, strip_workers, kernel_backend, font_dir):
+    global _processor
+    # The parent handles Ctrl-C and drains the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Glyph atlases live as long as the process, so a logo is rasterized once per worker
+    _processor = DungeonSynthProcessor(temp_dir=output_dir, cache_bytes=cache_bytes,
+                                       strip_workers=strip_workers, kernel_backend=kernel_backend,
+                                       font_dir=font_dir)
+
+
+def render_file(path, jobs):
+    """Pool task: render every job for one input, then release its caches"""
+    results = []
+    try:
+        for job in jobs:
+            started = time.perf_counter()
+            try:
+                os.makedirs(os.path.dirname(job.output_path), exist_ok=True)
+                width, height = _processor.render_to_file(path, job.params, job.size, job.output_path,
+                                                         FAST_PNG_COMPRESS_LEVEL)
+                results.append((job, width * height, time.perf_counter() - started, None))
+            except Exception as e:
+                results.append((job, 0, time.perf_counter() - started, str(e)))
+    finally:
+        _processor.forget(path)
+    return path, results
+
+
+class Throughput:
+    """Running totals for progress lines and the final summary"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.files = 0
+        self.rendered = 0
+        self.skipped = 0
+        self.failed = 0
+        self.pixels = 0
+
+    def line(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (f"{self.files} files, {self.rendered} rendered, {self.skipped} skipped, "
+                f"{self.failed} failed in {elapsed:.1f}s "
+                f"({self.rendered / elapsed:.2f} images/s, {self.pixels / elapsed / 1e6:.1f} MP/s)")
+
+
+def run_batch(inputs, variants, tints, sizes, output_dir, workers=None, recursive=False,
+              force=False, cache_bytes=256 * 1024 * 1024, kernel_backend='numpy', font_dir=DEFAULT_FONT_DIR,
+              log=print):
+    """Render the full matrix for every input; returns the Throughput totals"""
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    manifest = Manifest(output_dir)
+    totals = Throughput()
+    pending = {}
+
+    def collect(done):
+        for future in done:
+            path, source_state = pending.pop(future)
+            _, results = future.result()
+            totals.files += 1
+            for job, pixels, seconds, error in results:
+                if error:
+                    totals.failed += 1
+                    log(f"  failed {os.path.basename(job.output_path)}: {error}")
+                else:
+                    totals.rendered += 1
+                    totals.pixels += pixels
+                    manifest.record(job, source_state)
+            log(f"{os.path.basename(path)}: {totals.line()}")
+
+    # Cores left over by the process pool go to strip threads inside each render
+    strip_workers = max(1, (os.cpu_count() or 1) // workers)
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(output_dir, cache_bytes, strip_workers, kernel_backend, font_dir))
+    try:
+        for path, stem in iter_inputs(inputs, recursive):
+            source_state = Manifest.source_state(path)
+            jobs = plan_jobs(stem, variants, tints, sizes, output_dir)
+            todo = [job for job in jobs if force or not manifest.is_current(job, source_state)]
+            totals.skipped += len(jobs) - len(todo)
+            if not todo:
+                continue
+
+            # Keep only a couple of files per worker in flight so memory stays flat
+            while len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[executor.submit(render_file, path, todo)] = (path, source_state)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+        executor.shutdown()
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        log("Interrupted; run the same command again to resume")
+        raise
+    finally:
+        manifest.close()
+    return totals
+
+
+def parse_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m dungeon_synth_processor batch',
+        description='Render presets, tints and sizes for directories or globs of images')
+    parser.add_argument('inputs', nargs='+', help='Input directories or glob patterns')
+    parser.add_argument('-o', '--output', required=True, help='Output directory')
+    parser.add_argument('--presets', type=parse_list, default=None,
+                        help="Comma separated preset names, or 'all' (default: all unless --params is given)")
+    parser.add_argument('--params', action='append', default=[], metavar='FILE',
+                        help='JSON parameter file; repeat for several (name defaults to the file name)')
+    parser.add_argument('--tints', type=parse_list, default=None,
+                        help="Comma separated color tints (default: 'none', or each parameter file's own tint)")
+    parser.add_argument('--sizes', type=parse_list, default=['1400'], help='Comma separated output sizes')
+    parser.add_argument('--preserve-aspect-ratio', action='store_true',
+                        help='Fit inside the size box instead of center-cropping to a square')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Render processes')
+    parser.add_argument('--recursive', action='store_true', help='Descend into subdirectories and ** globs')
+    parser.add_argument('--force', action='store_true', help='Re-render outputs that are already up to date')
+    parser.add_argument('--kernels', choices=KERNEL_BACKENDS, default='numpy',
+                        help='Tone, grain and tint kernels; numba needs the optional numba package')
+    parser.add_argument('--text', help=r'Band-logo text drawn on every render; \n starts a new line')
+    parser.add_argument('--font', default='default', help="Font file name in --fonts, or 'default'")
+    parser.add_argument('--fonts', default=DEFAULT_FONT_DIR, help='Folder of .ttf and .otf fonts')
+    parser.add_argument('--text-size', type=float, default=None,
+                        help="Text size in percent of the render's shorter side")
+    parser.add_argument('--text-position', choices=TEXT_POSITIONS, default=None)
+    parser.add_argument('--text-blend', choices=TEXT_BLEND_MODES, default=None)
+    parser.add_argument('--text-color', default=None, help='Hex color such as #e8e0d0')
+    options = parser.parse_args(argv)
+
+    presets = options.presets if options.presets is not None else ([] if options.params else ['all'])
+    try:
+        variants = load_variants(presets, options.params)
+        sizes = sorted({normalize_size(size, MAX_OUTPUT_SIZE) for size in options.sizes})
+    except (ParameterError, OSError, ValueError) as e:
+        parser.error(str(e))
+    if not variants:
+        parser.error('nothing to render: give --presets or --params')
+
+    # Without --tints, presets render untinted and parameter files keep their own tint
+    for tint in options.tints or []:
+        if tint not in COLOR_TINTS:
+            parser.error(f"unknown tint: {tint}")
+
+    if options.preserve_aspect_ratio:
+        variants = [Variant(v.name, {**v.params, 'preserve_aspect_ratio': True}) for v in variants]
+
+    if options.text:
+        style = {'text': options.text.replace('\\n', '\n'), 'text_font': options.font,
+                 'text_size': options.text_size, 'text_position': options.text_position,
+                 'text_blend': options.text_blend, 'text_color': options.text_color}
+        try:
+            logo = text_layer({name: value for name, value in style.items() if value is not None})
+        except ParameterError as e:
+            parser.error(str(e))
+        if logo and logo['text_font'] not in font_names(options.fonts):
+            parser.error(f"unknown font: {options.font} (not in {options.fonts})")
+        variants = [Variant(v.name, {**v.params, **logo}) for v in variants]
+
+    try:
+        totals = run_batch(options.inputs, variants, options.tints, sizes, options.output,
+                           workers=options.workers, recursive=options.recursive, force=options.force,
+                           kernel_backend=options.kernels, font_dir=options.fonts)
+    except KeyboardInterrupt:
+        return 130
+
+    print(f"Done: {totals.line()}")
+    return 1 if totals.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Reusable working arrays for renders
+Every preview allocates and frees the same few float and uint8 planes, so
+renders take them from a pool keyed by shape and dtype and hand them back
+when they finish, instead of churning the allocator on every request
+"""
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class BufferPool:
+    """
+    Thread-safe pool of free arrays keyed by (shape, dtype), bounded by total bytes
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # Least recently returned shapes first, so they are dropped first
+        self.free = OrderedDict()
+        self.retained_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def take(self, shape, dtype=np.float64):
+        """An uninitialized array, reused when one of this shape and dtype is free"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            buffers = self.free.get(key)
+            if buffers:
+                array = buffers.pop()
+                if not buffers:
+                    del self.free[key]
+                self.retained_bytes -= array.nbytes
+                self.hits += 1
+                return array
+            self.misses += 1
+        return np.empty(shape, dtype=dtype)
+
+    def give(self, array):
+        """Return an array from take(); nothing may use it afterwards"""
+        if array.nbytes > self.max_bytes:
+            with self.lock:
+                self.dropped += 1
+            return
+
+        key = (array.shape, array.dtype.str)
+        with self.lock:
+            self.free.setdefault(key, []).append(array)
+            self.free.move_to_end(key)
+            self.retained_bytes += array.nbytes
+            while self.retained_bytes > self.max_bytes:
+                oldest, buffers = next(iter(self.free.items()))
+                self.retained_bytes -= buffers.pop(0).nbytes
+                self.dropped += 1
+                if not buffers:
+                    del self.free[oldest]
+
+    @contextmanager
+    def lease(self):
+        """A Lease whose arrays all go back to the pool when the block exits"""
+        lease = Lease(self)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    def clear(self):
+        with self.lock:
+            self.free.clear()
+            self.retained_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'buffers': sum(len(buffers) for buffers in self.free.values()),
+                'retained_bytes': self.retained_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'dropped': self.dropped,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class Lease:
+    """
+    Arrays borrowed for one render
+    Nothing taken through a lease may outlive it: results leave a render as
+    copies, e.g. the RGB images PIL builds from an array
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.taken = []
+
+    def take(self, shape, dtype=np.float64):
+        array = self.pool.take(shape, dtype)
+        self.taken.append(array)
+        return array
+
+    def release(self):
+        for array in self.taken:
+            self.pool.give(array)
+        self.taken = []
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Filename-affinity dispatcher for multi-process deployments
+A front process consistent-hashes each upload's id onto a fixed render
+worker, so all of an upload's traffic lands on the worker whose in-memory
+caches (decoded source, preview bases) are already warm
+"""
+
+import argparse
+import bisect
+import hashlib
+import http.client
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Older upload filenames are uuid4 strings; content-addressed uploads and
+# chunked upload sessions use 32 hex digits
+UPLOAD_ID_PATTERN = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{32}')
+
+# Headers that describe a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade'
+}
+
+# Requests that may be sent to a worker again after it dropped the connection
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Bodies up to this size are read ahead for their affinity key (JSON render
+# requests); larger ones, like uploads and upload chunks, are streamed through
+# in blocks
+READ_AHEAD_BYTES = 64 * 1024
+STREAM_BLOCK_BYTES = 64 * 1024
+
+# Sent with every forwarded request, so workers know a dispatcher warms an
+# upload's owner; a worker that accepted an upload answers with the upload to
+# warm, and the dispatcher passes it on to the owner's /warm
+DISPATCHER_HEADER = 'X-Affinity-Dispatcher'
+WARMUP_HEADER = 'X-Affinity-Warmup'
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes
+    Adding or removing a worker only moves the keys adjacent to its points
+    """
+
+    def __init__(self, nodes=(), replicas=128):
+        self.replicas = replicas
+        self.points = []
+        self.owners = {}
+        self.lock = threading.Lock()
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+    def add(self, node):
+        with self.lock:
+            for i in range(self.replicas):
+                point = self._hash(f"{node}#{i}")
+                if point not in self.owners:
+                    bisect.insort(self.points, point)
+                self.owners[point] = node
+
+    def remove(self, node):
+        with self.lock:
+            for i in range(self.replicas):
+                point = self._hash(f"{node}#{i}")
+                if self.owners.get(point) == node:
+                    del self.owners[point]
+                    self.points.pop(bisect.bisect_left(self.points, point))
+
+    def get(self, key):
+        """Return the node owning key, or None if the ring is empty"""
+        with self.lock:
+            if not self.points:
+                return None
+            index = bisect.bisect(self.points, self._hash(key)) % len(self.points)
+            return self.owners[self.points[index]]
+
+    @property
+    def nodes(self):
+        with self.lock:
+            return sorted(set(self.owners.values()))
+
+
+def affinity_key(path, query_string, body):
+    """Extract the upload id a request refers to, if any"""
+    match = UPLOAD_ID_PATTERN.search(path) or UPLOAD_ID_PATTERN.search(query_string)
+    if match:
+        return match.group(0)
+
+    if body and body[:1] == b'{':
+        try:
+            filename = json.loads(body).get('filename') or ''
+        except (ValueError, AttributeError):
+            return None
+        match = UPLOAD_ID_PATTERN.search(str(filename))
+        if match:
+            return match.group(0)
+    return None
+
+
+class Dispatcher:
+    """
+    WSGI front end forwarding requests to render workers by upload affinity
+    """
+
+    def __init__(self, backends=(), timeout=600):
+        self.ring = HashRing()
+        self.timeout = timeout
+        self.round_robin = itertools.count()
+        self.routed = {}
+        self.warmups = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        for backend in backends:
+            self.add_backend(backend)
+
+    def add_backend(self, address):
+        self.ring.add(address)
+        logger.info(f"Worker {address} joined the ring")
+
+    def remove_backend(self, address):
+        self.ring.remove(address)
+        logger.info(f"Worker {address} left the ring")
+
+    def watch(self, backends, check_interval=1.0):
+        """Put externally managed workers back on the ring whenever they answer /health again"""
+        backends = list(backends)
+
+        def monitor():
+            while not self.stop_event.wait(check_interval):
+                nodes = self.ring.nodes
+                for address in backends:
+                    if address not in nodes and wait_until_healthy(address, timeout=1.0):
+                        self.add_backend(address)
+
+        threading.Thread(target=monitor, name='dispatcher-health', daemon=True).start()
+
+    def pick(self, key):
+        """Owner of key on the ring; requests without an upload rotate across workers"""
+        if key:
+            return self.ring.get(key)
+        nodes = self.ring.nodes
+        if not nodes:
+            return None
+        return nodes[next(self.round_robin) % len(nodes)]
+
+    def status(self):
+        with self.lock:
+            routed = dict(self.routed)
+            warmups = self.warmups
+        return {'workers': self.ring.nodes, 'routed': routed, 'warmups': warmups}
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '/')
+        if path == '/dispatcher/status':
+            payload = json.dumps(self.status()).encode('utf-8')
+            start_response('200 OK', [('Content-Type', 'application/json'),
+                                      ('Content-Length', str(len(payload)))])
+            return [payload]
+
+        try:
+            length = int(environ['CONTENT_LENGTH']) if environ.get('CONTENT_LENGTH') else None
+        except ValueError:
+            length = None
+        if length is None and not environ.get('wsgi.input_terminated'):
+            # Without a length the body can only be read when the server marks its end
+            length = 0
+        # body holds the whole request body when it was read ahead, else None
+        # and the body is streamed from wsgi.input, which allows no retry
+        body = None
+        if length is not None and length <= READ_AHEAD_BYTES:
+            body = environ['wsgi.input'].read(length) if length else b''
+        query_string = environ.get('QUERY_STRING', '')
+        method = environ.get('REQUEST_METHOD', 'GET')
+        key = affinity_key(path, query_string, body or b'')
+
+        # One retry: a worker that refuses connections is dropped and its keys
+        # fall to the next node
+        for attempt in range(2):
+            backend = self.pick(key)
+            if backend is None:
+                break
+            host, port = backend.rsplit(':', 1)
+            connection = http.client.HTTPConnection(host, int(port), timeout=self.timeout)
+            try:
+                connection.connect()
+            except OSError as e:
+                logger.warning(f"Worker {backend} unreachable: {e}")
+                self.remove_backend(backend)
+                continue
+
+            try:
+                response = self._forward(connection, environ, method, path, query_string, body, length)
+            except OSError as e:
+                connection.close()
+                # The request reached the worker, which may still be rendering it,
+                # so the worker keeps its place on the ring. Only idempotent
+                # requests with a read-ahead body are sent again, never after a timeout
+                timed_out = isinstance(e, TimeoutError)
+                if timed_out or method not in IDEMPOTENT_METHODS or body is None or attempt:
+                    logger.warning(f"Worker {backend} failed {method} {path}: {e}")
+                    if timed_out:
+                        return self._error(start_response, '504 Gateway Timeout', 'Render worker timed out')
+                    return self._error(start_response, '502 Bad Gateway', 'Render worker dropped the request')
+                continue
+
+            with self.lock:
+                self.routed[backend] = self.routed.get(backend, 0) + 1
+
+            warmup = response.getheader(WARMUP_HEADER)
+            if warmup:
+                threading.Thread(target=self._warm_owner, args=(warmup,), daemon=True).start()
+
+            headers = [(name, value) for name, value in response.getheaders()
+                       if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() != WARMUP_HEADER.lower()]
+            headers.append(('X-Render-Worker', backend))
+            start_response(f"{response.status} {response.reason}", headers)
+            return self._stream(connection, response)
+
+        return self._error(start_response, '503 Service Unavailable', 'No render workers available',
+                           [('Retry-After', '1')])
+
+    @staticmethod
+    def _error(start_response, status, message, extra_headers=()):
+        payload = json.dumps({'error': message}).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json'),
+                                ('Content-Length', str(len(payload))), *extra_headers])
+        return [payload]
+
+    def _warm_owner(self, warmup):
+        """
+        Ask the owner of a new upload to load it, wherever the upload itself
+        landed; uploads carry no id until a worker names them by content
+        """
+        try:
+            filename = json.loads(warmup).get('filename') or ''
+        except (ValueError, AttributeError):
+            return
+        match = UPLOAD_ID_PATTERN.search(filename)
+        backend = self.ring.get(match.group(0)) if match else None
+        if backend is None:
+            return
+        host, port = backend.rsplit(':', 1)
+        try:
+            connection = http.client.HTTPConnection(host, int(port), timeout=self.timeout)
+            connection.request('POST', '/warm', body=warmup.encode('utf-8'),
+                               headers={'Content-Type': 'application/json'})
+            status = connection.getresponse().status
+            connection.close()
+        except OSError as e:
+            logger.warning(f"Warming {filename} on {backend} failed: {e}")
+            return
+        if status < 300:
+            with self.lock:
+                self.warmups += 1
+
+    def _forward(self, connection, environ, method, path, query_string, body, length):
+        headers = {}
+        for name, value in environ.items():
+            if name.startswith('HTTP_'):
+                header = name[5:].replace('_', '-').title()
+                if header.lower() not in HOP_BY_HOP_HEADERS:
+                    headers[header] = value
+        if environ.get('CONTENT_TYPE'):
+            headers['Content-Type'] = environ['CONTENT_TYPE']
+        headers[DISPATCHER_HEADER] = '1'
+
+        url = path + (f"?{query_string}" if query_string else '')
+        if body is not None:
+            headers['Content-Length'] = str(len(body))
+            connection.request(method, url, body=body, headers=headers)
+        elif length is not None:
+            headers['Content-Length'] = str(length)
+            connection.request(method, url, body=self._blocks(environ['wsgi.input'], length), headers=headers)
+        else:
+            # Body of unknown length: pass it on chunked
+            headers['Transfer-Encoding'] = 'chunked'
+            connection.request(method, url, body=self._blocks(environ['wsgi.input']), headers=headers,
+                               encode_chunked=True)
+        return connection.getresponse()
+
+    @staticmethod
+    def _blocks(stream, length=None):
+        """Read a request body in blocks, up to length bytes or to its end"""
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = STREAM_BLOCK_BYTES if remaining is None else min(STREAM_BLOCK_BYTES, remaining)
+            block = stream.read(size)
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            yield block
+
+    @staticmethod
+    def _stream(connection, response, chunk_size=64 * 1024):
+        try:
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            connection.close()
+
+
+def run_worker(port, config=None):
+    """Entry point of one render worker process"""
+    # Forked after the front process installed its handlers; restore defaults
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    from app import create_app
+    app = create_app(config)
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def wait_until_healthy(address, timeout=30.0):
+    """Poll a worker's /health endpoint until it answers"""
+    host, port = address.rsplit(':', 1)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, int(port), timeout=2)
+            connection.request('GET', '/health')
+            healthy = connection.getresponse().status == 200
+            connection.close()
+            if healthy:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+class WorkerPool:
+    """
+    Spawns render workers on consecutive ports and keeps the ring in sync
+    A restarted worker reuses its port, so it reclaims exactly its old keys
+    """
+
+    def __init__(self, dispatcher, base_port=5101, config=None, check_interval=1.0):
+        self.dispatcher = dispatcher
+        self.base_port = base_port
+        self.config = config
+        self.check_interval = check_interval
+        self.workers = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.monitor = threading.Thread(target=self._monitor, daemon=True)
+
+    def _spawn(self, port):
+        process = multiprocessing.Process(target=run_worker, args=(port, self.config), daemon=True)
+        process.start()
+        address = f"127.0.0.1:{port}"
+        if wait_until_healthy(address):
+            self.dispatcher.add_backend(address)
+        else:
+            logger.error(f"Worker {address} failed to start")
+        return process
+
+    def scale_to(self, count):
+        """Add or retire workers until count are running"""
+        with self.lock:
+            for index in range(count):
+                port = self.base_port + index
+                if port not in self.workers:
+                    self.workers[port] = self._spawn(port)
+            for port in sorted(self.workers):
+                if port >= self.base_port + count:
+                    # Leave the ring first so no new traffic arrives
+                    self.dispatcher.remove_backend(f"127.0.0.1:{port}")
+                    self.workers.pop(port).terminate()
+
+    def start(self, count):
+        self.scale_to(count)
+        self.monitor.start()
+
+    def _monitor(self):
+        while not self.stop_event.wait(self.check_interval):
+            with self.lock:
+                nodes = self.dispatcher.ring.nodes
+                for port, process in list(self.workers.items()):
+                    address = f"127.0.0.1:{port}"
+                    if process.is_alive():
+                        # Rejoin after a transient failure dropped it from the ring
+                        if address not in nodes and wait_until_healthy(address, timeout=1.0):
+                            self.dispatcher.add_backend(address)
+                        continue
+                    logger.warning(f"Worker on port {port} exited ({process.exitcode}), restarting")
+                    self.dispatcher.remove_backend(address)
+                    self.workers[port] = self._spawn(port)
+
+    def stop(self):
+        self.stop_event.set()
+        with self.lock:
+            for process in self.workers.values():
+                process.terminate()
+            for process in self.workers.values():
+                process.join(timeout=5)
+
+
+def create_dispatcher(backends):
+    """WSGI factory for externally managed workers, e.g. 'dispatcher:create_dispatcher(\"h:p,h:p\")'"""
+    if isinstance(backends, str):
+        backends = [backend for backend in backends.split(',') if backend]
+    dispatcher = Dispatcher(backends)
+    # Nothing restarts external workers from here, so poll for their return
+    if backends:
+        dispatcher.watch(backends)
+    return dispatcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Filename-affinity dispatcher for render workers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Render worker processes to spawn')
+    parser.add_argument('--worker-base-port', type=int, default=5101)
+    parser.add_argument('--backends', default='',
+                        help='Comma separated host:port list of externally managed workers')
+    options = parser.parse_args(argv)
+
+    dispatcher = create_dispatcher(options.backends)
+    pool = None
+    if not options.backends:
+        pool = WorkerPool(dispatcher, options.worker_base_port)
+        pool.start(options.workers)
+
+    def shutdown(signum, frame):
+        logger.info("Received shutdown signal, stopping workers...")
+        dispatcher.stop_event.set()
+        if pool:
+            pool.stop()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    logger.info(f"Dispatching on {options.host}:{options.port} to {len(dispatcher.ring.nodes)} workers")
+    make_server(options.host, options.port, dispatcher, threaded=True).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
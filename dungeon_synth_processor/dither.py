@@ -0,0 +1,130 @@
+"""
+Dithering for the photocopied, one-bit look of old tape inlays
+Ordered dithering compares each pixel against a threshold matrix tiled over
+the image: a recursive Bayer matrix, or a void-and-cluster blue-noise
+matrix without Bayer's cross-hatch. Error diffusion pushes each pixel's
+quantization error onto neighbours that are still to come. Every pixel in
+an anti-diagonal x + 2y = t depends only on earlier diagonals, for both
+Floyd-Steinberg and Atkinson, so each diagonal is quantized as one vector
+"""
+
+import numpy as np
+
+BAYER_SIZE = 8
+BLUE_NOISE_SIZE = 64
+BLUE_NOISE_SIGMA = 1.5
+
+# Error shares as (row offset, column offset, weight)
+DIFFUSION_WEIGHTS = {
+    'diffusion': ((0, 1, 7 / 16), (1, -1, 3 / 16), (1, 0, 5 / 16), (1, 1, 1 / 16)),
+    # Atkinson drops a quarter of the error, which keeps shadows and highlights clean
+    'atkinson': ((0, 1, 1 / 8), (0, 2, 1 / 8), (1, -1, 1 / 8), (1, 0, 1 / 8), (1, 1, 1 / 8), (2, 0, 1 / 8))
+}
+
+# Margins wide enough for every kernel above
+PAD_BOTTOM = 2
+PAD_SIDE = 2
+
+_matrices = {}
+
+
+def bayer_matrix(size=BAYER_SIZE):
+    """Recursive Bayer index matrix with values 0..size*size-1"""
+    matrix = np.zeros((1, 1), dtype=np.int64)
+    while matrix.shape[0] < size:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2],
+                           [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+
+def blue_noise_matrix(size=BLUE_NOISE_SIZE, sigma=BLUE_NOISE_SIGMA, seed=0):
+    """
+    Void-and-cluster rank matrix with values 0..size*size-1
+    Each rank goes to the emptiest spot left by the ones before it, measured
+    by a Gaussian energy that wraps around, so the matrix tiles seamlessly
+    """
+    offsets = np.minimum(np.arange(size), size - np.arange(size))
+    kernel = np.exp(-(offsets[:, None] ** 2 + offsets[None, :] ** 2) / (2 * sigma ** 2))
+    kernel_spectrum = np.fft.fft2(kernel)
+
+    def energy_of(pattern):
+        return np.real(np.fft.ifft2(np.fft.fft2(pattern) * kernel_spectrum))
+
+    def spread(y, x):
+        return np.roll(np.roll(kernel, y, axis=0), x, axis=1)
+
+    # Initial pattern: a tenth of the cells, relaxed until no point moves
+    rng = np.random.RandomState(seed)
+    pattern = np.zeros((size, size), dtype=bool)
+    pattern.flat[rng.choice(size * size, size * size // 10, replace=False)] = True
+    energy = energy_of(pattern)
+    for _ in range(size * size):
+        cluster = np.unravel_index(np.argmax(np.where(pattern, energy, -np.inf)), pattern.shape)
+        pattern[cluster] = False
+        energy -= spread(*cluster)
+        void = np.unravel_index(np.argmin(np.where(pattern, np.inf, energy)), pattern.shape)
+        pattern[void] = True
+        energy += spread(*void)
+        if void == cluster:
+            break
+
+    ranks = np.zeros((size, size), dtype=np.int64)
+    initial, initial_energy = pattern.copy(), energy.copy()
+    points = int(pattern.sum())
+
+    # Ranks below the initial points: remove the tightest cluster each time
+    for rank in range(points - 1, -1, -1):
+        cluster = np.unravel_index(np.argmax(np.where(pattern, energy, -np.inf)), pattern.shape)
+        pattern[cluster] = False
+        energy -= spread(*cluster)
+        ranks[cluster] = rank
+
+    # Ranks above them: fill the largest void each time
+    pattern, energy = initial, initial_energy
+    for rank in range(points, size * size):
+        void = np.unravel_index(np.argmin(np.where(pattern, np.inf, energy)), pattern.shape)
+        pattern[void] = True
+        energy += spread(*void)
+        ranks[void] = rank
+    return ranks
+
+
+def threshold_matrix(name):
+    """uint8 thresholds spread evenly over 0..255 for a named matrix, built once per process"""
+    matrix = _matrices.get(name)
+    if matrix is None:
+        ranks = bayer_matrix() if name == 'bayer' else blue_noise_matrix()
+        matrix = ((ranks + 0.5) * 256 / ranks.size).astype(np.uint8)
+        _matrices[name] = matrix
+    return matrix
+
+
+def error_diffusion(gray, threshold, kernel):
+    """
+    Quantize a float plane to 0 or 255, diffusing the error with a named kernel
+    Pixels at or below threshold become black; returns a view of a new float64 plane
+    """
+    height, width = gray.shape
+    stride = width + 2 * PAD_SIDE
+    work = np.zeros((height + PAD_BOTTOM, stride))
+    work[:height, PAD_SIDE:PAD_SIDE + width] = gray
+    flat = work.ravel()
+    shares = [(dy * stride + dx, weight) for dy, dx, weight in DIFFUSION_WEIGHTS[kernel]]
+
+    rows = np.arange(height)
+    for diagonal in range(width + 2 * (height - 1)):
+        # Rows whose pixel x = diagonal - 2y falls inside the image
+        first = max(0, -(-(diagonal - width + 1) // 2))
+        last = min(height - 1, diagonal // 2)
+        y = rows[first:last + 1]
+        index = y * stride + (diagonal - 2 * y) + PAD_SIDE
+
+        values = flat[index]
+        quantized = np.where(values > threshold, 255.0, 0.0)
+        # Every share lands later in memory, so finished pixels are never touched again
+        flat[index] = quantized
+        error = values - quantized
+        for offset, weight in shares:
+            flat[index + offset] += error * weight
+
+    return work[:height, PAD_SIDE:PAD_SIDE + width]
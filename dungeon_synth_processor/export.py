@@ -0,0 +1,115 @@
+"""
+Streaming ZIP export of a presets x tints x sizes matrix
+Entries are rendered in parallel and each finished PNG is written into a ZIP
+whose bytes go straight to the client; the archive never exists as a whole
+on disk or in memory
+"""
+
+import logging
+import time
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from scheduler import SchedulerBusy
+
+logger = logging.getLogger(__name__)
+
+ExportEntry = namedtuple('ExportEntry', ['name', 'params', 'size', 'cost'])
+
+# Renders give up after this many Retry-After waits on a saturated lane
+BUSY_RETRIES = 3
+
+
+def entry_name(preset_name, color_tint, size, dimensions=None):
+    """Archive name matching the single /download naming scheme"""
+    tint_suffix = f'_{color_tint}' if color_tint != 'none' else ''
+    width, height = dimensions or (size, size)
+    return f'dungeon_synth_{preset_name}{tint_suffix}_{width}x{height}.png'
+
+
+class ZipStreamWriter:
+    """
+    Write-only file object collecting ZipFile output until it is drained
+    Without tell() or seek(), ZipFile writes data descriptors and never
+    goes back to patch headers, which is what makes streaming possible
+    """
+
+    def __init__(self):
+        self.chunks = deque()
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _render(processor, scheduler, filepath, entry):
+    """Render and encode one entry in the render lane, waiting out busy spells"""
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            return scheduler.run('render', processor.render_png, filepath, entry.params, entry.size,
+                                 cost=entry.cost)
+        except SchedulerBusy as e:
+            if attempt == BUSY_RETRIES:
+                raise
+            time.sleep(e.retry_after)
+
+
+def stream_export(processor, scheduler, filepath, entries, workers):
+    """
+    Yield ZIP bytes for entries as their renders complete
+    Entries should be grouped by size so the per-size resampled base in the
+    processor cache is shared; at most `workers` renders are held in memory
+    """
+    writer = ZipStreamWriter()
+    archive = zipfile.ZipFile(writer, mode='w', compression=zipfile.ZIP_STORED)
+    failures = []
+    pending = {}
+    remaining = iter(entries)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit_next():
+            entry = next(remaining, None)
+            if entry is not None:
+                pending[executor.submit(_render, processor, scheduler, filepath, entry)] = entry
+
+        for _ in range(workers):
+            submit_next()
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entry = pending.pop(future)
+                    submit_next()
+                    try:
+                        png_bytes, dimensions = future.result()
+                    except Exception as e:
+                        logger.error(f"Export entry {entry.name} failed: {str(e)}")
+                        failures.append(f"{entry.name}: {str(e)}")
+                        continue
+
+                    info = zipfile.ZipInfo(entry_name(entry.name, entry.params['color_tint'],
+                                                      entry.size, dimensions),
+                                           date_time=time.localtime()[:6])
+                    # PNG data is already deflated; storing avoids a second pass
+                    info.compress_type = zipfile.ZIP_STORED
+                    archive.writestr(info, png_bytes)
+                    yield writer.drain()
+        finally:
+            # Client went away or the loop finished: do not start anything new
+            for future in pending:
+                future.cancel()
+
+    if failures:
+        archive.writestr('errors.txt', '\n'.join(failures) + '\n')
+    archive.close()
+    yield writer.drain()
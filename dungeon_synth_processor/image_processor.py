@@ -1,26 +1,114 @@
 import numpy as np
-from PIL import Image, ImageFilter, ImageOps
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
 import io
 import base64
+import hashlib
 import tempfile
 import os
 import atexit
 import shutil
-from presets import get_color_tint
+import json
+import math
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from presets import get_color_tint, get_texture
+from render_cache import LRUCache
+from buffer_pool import BufferPool
+from kernels import select_kernels
+from dither import DIFFUSION_WEIGHTS, error_diffusion, threshold_matrix
+from screens import halftone_tile, hatch_tile, tile_screen
+from edges import EDGE_HALO, edge_magnitude
+from textures import DEFAULT_TEXTURE_DIR, TextureLibrary, blend_texture
+from typography import DEFAULT_FONT_DIR, Typesetter
 
 # Note: OpenCV is listed in requirements.txt but not actually used in this implementation
 # If you're getting OpenCV errors, you can either:
 # 1. Remove it from requirements.txt, or
 # 2. Comment out any cv2 imports if they exist elsewhere
 
+# Contact sheet layout, in pixels
+CONTACT_SHEET_GUTTER = 16
+CONTACT_SHEET_LABEL_HEIGHT = 32
+CONTACT_SHEET_BACKGROUND = (17, 17, 17)
+CONTACT_SHEET_LABEL_COLOR = (221, 221, 221)
+
+# Renders of at least this many pixels are processed in row strips on a thread
+# pool. Strips have a fixed height and seed their own grain, so the output
+# depends only on the image and parameters, never on the thread count
+STRIP_MIN_PIXELS = 4_000_000
+STRIP_ROWS = 256          # a multiple of 64, so grain cells and dither matrices line up across strips
+STRIP_SEED_STRIDE = 7919
+
+# Luminosity weights, and the rows converted per np.dot call; np.dot casts its
+# uint8 input to float64 first, so blocks keep that copy small
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114])
+LUMA_BLOCK_ROWS = 64
+
+# Line art: the tone underneath is washed towards paper white, and edges
+# start to ink a quarter of the way from 255 down to the threshold, reaching
+# full black LINE_ART_SOFTNESS levels further on
+LINE_ART_WASH = 0.5
+LINE_ART_EDGE_SCALE = 0.25
+LINE_ART_SOFTNESS = 16
+
+# zlib level for exports and batch files. optimize=True costs several times
+# the render itself at download sizes; level 3 is within about 15% of its size
+FAST_PNG_COMPRESS_LEVEL = 3
+
+def blur_halo(radius):
+    """Rows above and below a strip that PIL's three-pass box blur can reach"""
+    return int(math.ceil(3 * radius)) + 8
+
+def _canonical_params(params):
+    return json.dumps(params, sort_keys=True, default=str).encode('utf-8')
+
+def params_digest(params):
+    """
+    Stable digest of processing parameters, identical in every worker process
+    Names cached and shared renders, so it is wide enough never to collide
+    """
+    return hashlib.sha256(_canonical_params(params)).hexdigest()[:32]
+
+def params_seed(params):
+    """Small stable number from the parameters; only seeds grain, never names a render"""
+    return zlib.crc32(_canonical_params(params))
+
 class DungeonSynthProcessor:
     """
     Enhanced dungeon synth processor with authentic visual processing and color tinting
     """
     
-    def __init__(self):
-        self.temp_dir = tempfile.mkdtemp()
-        self.processed_cache = {}
+    def __init__(self, temp_dir=None, cache_bytes=256 * 1024 * 1024, strip_workers=None,
+                 pool_bytes=64 * 1024 * 1024, kernel_backend='numpy', texture_dir=None,
+                 font_dir=None):
+        # A shared render directory outlives this process, a private one does not
+        if temp_dir:
+            os.makedirs(temp_dir, exist_ok=True)
+            self.temp_dir = temp_dir
+            self.owns_temp_dir = False
+        else:
+            self.temp_dir = tempfile.mkdtemp()
+            self.owns_temp_dir = True
+        # Decoded sources and preview bases stay hot in the worker that built them
+        self.source_cache = LRUCache(cache_bytes)
+        self.processed_cache = LRUCache(cache_bytes // 4)
+        self.tint_luts = {}
+        # Paper textures are generated once per machine and memory-mapped
+        self.textures = TextureLibrary(texture_dir or DEFAULT_TEXTURE_DIR)
+        self.texture_luts = {}
+        # Glyph atlases per (font, size), shared by every render of a logo
+        self.typesetter = Typesetter(font_dir or DEFAULT_FONT_DIR)
+        # Dither matrices and engraving screens tiled to the shapes being rendered
+        self.screen_cache = LRUCache(32 * 1024 * 1024)
+        # Working planes are borrowed per render and reused by the next one
+        self.buffer_pool = BufferPool(pool_bytes)
+        # Tone, grain and tint kernels; anything but the NumPy reference is verified first
+        self.kernels = select_kernels(kernel_backend, self)
+        # One strip pool per processor, shared by every concurrent render
+        self.strip_workers = strip_workers or os.cpu_count() or 1
+        self.strip_pool = None
+        self.strip_pool_lock = threading.Lock()
         atexit.register(self.cleanup)
     
     def create_preview_base64(self, image):
@@ -58,57 +146,143 @@ class DungeonSynthProcessor:
         except Exception as e:
             raise Exception(f"Error creating preview: {str(e)}")
     
+    def upload_preview(self, filepath, image=None):
+        """Upload response preview, built once per stored source"""
+        return self.processed_cache.get_or_create(
+            (filepath, 'upload_preview'),
+            lambda: self.create_preview_base64(image if image is not None else self._load_source(filepath)))
+    
+    def _load_source(self, filepath):
+        """Decode, orient and normalize an upload once per worker"""
+        return self.source_cache.get_or_create((filepath, 'source'), lambda: self._decode_source(filepath))
+    
+    def _decode_source(self, filepath):
+        """Open an upload and normalize its orientation and color mode"""
+        img = Image.open(filepath)
+        img.load()
+        
+        # Fix orientation from EXIF data
+        img = ImageOps.exif_transpose(img)
+        
+        # Ensure proper color mode
+        if img.mode not in ('RGB', 'L'):
+            if img.mode == 'RGBA':
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[-1])
+                img = background
+            else:
+                img = img.convert('RGB')
+        
+        if not self._validate_image(img):
+            img.close()
+            raise Exception("Invalid or corrupted image file")
+        
+        return img
+    
+    def _load_preview_base(self, filepath, size, preserve_aspect_ratio):
+        """Resized preview base, shared by every slider change and preset"""
+        key = (filepath, 'preview', size, bool(preserve_aspect_ratio))
+        return self.source_cache.get_or_create(
+            key, lambda: self._create_square_preview(self._load_source(filepath), size, preserve_aspect_ratio))
+    
+    def forget(self, filepath):
+        """Drop every in-memory artifact derived from an upload"""
+        self.source_cache.discard_where(lambda key: key[0] == filepath)
+        self.processed_cache.discard_where(lambda key: key[0] == filepath)
+    
+    def cache_stats(self):
+        """Occupancy and hit rates of the in-memory caches"""
+        return {
+            'source': self.source_cache.stats(),
+            'processed': self.processed_cache.stats(),
+            'screens': self.screen_cache.stats(),
+            'buffer_pool': self.buffer_pool.stats(),
+            'textures': self.textures.stats(),
+            'glyph_atlases': self.typesetter.stats()
+        }
+    
     def process_preview(self, filepath, params):
         """Process image with parameters and return 400x400 preview as base64"""
         try:
-            img = Image.open(filepath)
-            img.load()
-            
-            # Fix orientation from EXIF data
-            img = ImageOps.exif_transpose(img)
-            
-            # Ensure proper color mode
-            if img.mode not in ('RGB', 'L'):
-                if img.mode == 'RGBA':
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[-1])
-                    img = background
-                else:
-                    img = img.convert('RGB')
-            
-            if not self._validate_image(img):
-                img.close()
-                raise Exception("Invalid or corrupted image file")
-            
-            preserve_aspect_ratio = params.get('preserve_aspect_ratio', False)
+            # Concurrent requests for the same preview, speculative or not, render it once
+            digest = params_digest(params)
+            return self.processed_cache.get_or_create(
+                (filepath, 'preview_uri', digest), lambda: self._render_preview(filepath, params, digest))
             
-            # Create preview first - this gives us consistent 400x400 base
-            preview = self._create_square_preview(img, 400, preserve_aspect_ratio)
-            img.close()
-            
-            # Apply processing to the 400x400 preview
-            processed = self._apply_processing_to_preview(preview, params)
-            
-            # Apply color tinting if specified
-            color_tint = params.get('color_tint', 'none')
-            if color_tint and color_tint != 'none':
-                processed = self._apply_color_tint(processed, color_tint)
-            
-            # Cache the processed result for later download consistency
-            cache_key = f"{os.path.basename(filepath)}_{hash(str(params))}"
-            self.processed_cache[cache_key] = processed.copy()
-            
-            # Convert to base64
-            buffer = io.BytesIO()
-            processed.save(buffer, format='PNG')
-            buffer.seek(0)
-            preview_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            buffer.close()
+        except Exception as e:
+            raise Exception(f"Error processing preview: {str(e)}")
+    
+    def _render_preview(self, filepath, params, digest):
+        preserve_aspect_ratio = params.get('preserve_aspect_ratio', False)
+        
+        # Create preview first - this gives us consistent 400x400 base
+        preview = self._load_preview_base(filepath, 400, preserve_aspect_ratio)
+        
+        # Apply processing and tint to the 400x400 preview, exactly once
+        processed = self._apply_processing_to_preview(
+            preview, params, edges_key=(filepath, 'edges', 400, bool(preserve_aspect_ratio)))
+        
+        # Cache the processed result for later download consistency
+        self.processed_cache.put((filepath, digest), processed)
+        
+        return self._png_data_uri(processed)
+    
+    def process_preview_sweep(self, filepath, params_list):
+        """
+        Render 400x400 previews for parameter sets that differ only in tone
+        sliders; the base and blurred luma are computed once for all of them
+        """
+        try:
+            first = params_list[0]
+            preserve_aspect_ratio = bool(first.get('preserve_aspect_ratio', False))
+            preview = self._load_preview_base(filepath, 400, preserve_aspect_ratio)
+            edges_key = (filepath, 'edges', 400, preserve_aspect_ratio)
+            frames = []
+            with self.buffer_pool.lease() as buffers:
+                luma = self._luma(preview, first.get('blur', 0), buffers)
+                for params in params_list:
+                    # Each frame hands its planes back before the next one starts
+                    with self.buffer_pool.lease() as frame_buffers:
+                        frames.append(self._png_data_uri(
+                            self._tinted(luma, params, params.get('color_tint', 'none'), frame_buffers, edges_key)))
+            return frames
             
-            return f"data:image/png;base64,{preview_base64}"
+        except Exception as e:
+            raise Exception(f"Error processing preview sweep: {str(e)}")
+    
+    def tone_base(self, filepath, blur, preserve_aspect_ratio=False):
+        """
+        Blurred 400x400 luma plus a unit grain field, both as 8-bit PNG data
+        URIs, so a client can apply brightness, contrast and tint locally
+        """
+        try:
+            preview = self._load_preview_base(filepath, 400, preserve_aspect_ratio)
+            with self.buffer_pool.lease() as buffers:
+                plane = self._luma(preview, blur, buffers)
+                np.rint(plane, out=plane)
+                luma = np.clip(plane, 0, 255, out=plane).astype(np.uint8)
+            
+            # Fixed seed: the field only stands in for the grain texture until
+            # the authoritative render arrives
+            rng = np.random.RandomState(0)
+            grain = rng.randint(0, 256, luma.shape).astype(np.uint8)
+            
+            return {
+                'width': luma.shape[1],
+                'height': luma.shape[0],
+                'luma': self._png_data_uri(self._gray_image(luma)),
+                'grain': self._png_data_uri(self._gray_image(grain))
+            }
             
         except Exception as e:
-            raise Exception(f"Error processing preview: {str(e)}")
+            raise Exception(f"Error preparing tone base: {str(e)}")
+
+    def _png_data_uri(self, image):
+        """Encode an image as a base64 PNG data URI"""
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        preview_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        return f"data:image/png;base64,{preview_base64}"
     
     def _apply_color_tint(self, image, tint_name):
         """Apply color tinting to processed image"""
@@ -127,22 +301,74 @@ class DungeonSynthProcessor:
             tint_layer = Image.new('RGB', image.size, tint_rgb)
             
             # Apply blend mode
-            if blend_mode == 'overlay':
-                result = self._blend_overlay(image, tint_layer, opacity)
-            elif blend_mode == 'multiply':
-                result = self._blend_multiply(image, tint_layer, opacity)
-            elif blend_mode == 'soft_light':
-                result = self._blend_soft_light(image, tint_layer, opacity)
-            else:
-                # Default to normal blend
-                result = Image.blend(image, tint_layer, opacity)
-            
-            return result
+            return self._blend(image, tint_layer, blend_mode, opacity)
             
         except Exception as e:
             # If tinting fails, return original image
             return image
     
+    def _blend(self, base, layer, blend_mode, opacity):
+        """Blend a layer over an image of the same size and mode"""
+        if blend_mode == 'overlay':
+            return self._blend_overlay(base, layer, opacity)
+        elif blend_mode == 'multiply':
+            return self._blend_multiply(base, layer, opacity)
+        elif blend_mode == 'soft_light':
+            return self._blend_soft_light(base, layer, opacity)
+        # Default to normal blend
+        return Image.blend(base, layer, opacity)
+    
+    def tint_lut(self, tint_name):
+        """256x3 table of the tinted RGB value for every gray level"""
+        lut = self.tint_luts.get(tint_name)
+        if lut is None:
+            # Every blend mode is per pixel, so tinting a gray ramp gives the exact mapping
+            ramp = np.repeat(np.arange(256, dtype=np.uint8), 3).reshape(1, 256, 3)
+            lut = np.array(self._apply_color_tint(Image.fromarray(ramp), tint_name)).reshape(256, 3)
+            self.tint_luts[tint_name] = lut
+        return lut
+    
+    def texture_lut(self, texture_name):
+        """65536-entry table of the blended gray level, indexed by texture level * 256 + gray level"""
+        lut = self.texture_luts.get(texture_name)
+        if lut is None:
+            # Blend every gray level under every texture level, with the same blend modes as tinting
+            texture_info = get_texture(texture_name)
+            levels = np.arange(256, dtype=np.uint8)
+            gray = Image.fromarray(np.tile(levels, (256, 1)))
+            texture = Image.fromarray(np.ascontiguousarray(np.repeat(levels[:, np.newaxis], 256, axis=1)))
+            blended = self._blend(gray, texture, texture_info['blend_mode'], texture_info['opacity'])
+            lut = np.array(blended).ravel()
+            self.texture_luts[texture_name] = lut
+        return lut
+    
+    def _apply_text_layer(self, output, params):
+        """Blend the band-logo text into a finished RGB uint8 render in place, weighted by glyph coverage"""
+        if not params.get('text'):
+            return
+        height, width = output.shape[:2]
+        coverage, (left, top) = self.typesetter.layout(params, width, height)
+        
+        # Only the part of the text box inside the render is blended
+        x0, y0 = max(0, left), max(0, top)
+        x1 = min(width, left + coverage.shape[1])
+        y1 = min(height, top + coverage.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            return
+        region = output[y0:y1, x0:x1]
+        alpha = coverage[y0 - top:y1 - top, x0 - left:x1 - left].astype(np.float32) / 255.0
+        
+        hex_color = params['text_color'].lstrip('#')
+        text_rgb = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+        layer = Image.new('RGB', (x1 - x0, y1 - y0), text_rgb)
+        blended = np.asarray(self._blend(Image.fromarray(region), layer, params['text_blend'], 1.0),
+                             dtype=np.float32)
+        
+        base = region.astype(np.float32)
+        base += (blended - base) * alpha[..., np.newaxis]
+        np.rint(base, out=base)
+        region[...] = base
+    
     def _blend_overlay(self, base, overlay, opacity):
         """Overlay blend mode implementation"""
         base_array = np.array(base, dtype=np.float32) / 255.0
@@ -191,52 +417,6 @@ class DungeonSynthProcessor:
         
         return Image.fromarray(result)
     
-    def process_full_resolution(self, filepath, params, preset_name='custom'):
-        """Process image at full resolution using the same method as preview for consistency"""
-        try:
-            # Try to use cached preview result first for exact consistency
-            cache_key = f"{os.path.basename(filepath)}_{hash(str(params))}"
-            preserve_aspect_ratio = params.get('preserve_aspect_ratio', False)
-            
-            if cache_key in self.processed_cache:
-                # Use the exact processed preview and upscale it intelligently
-                processed_preview = self.processed_cache[cache_key]
-                
-                # Load original image to get target dimensions
-                original_img = Image.open(filepath)
-                original_img = ImageOps.exif_transpose(original_img)
-                orig_width, orig_height = original_img.size
-                
-                # Determine if we should crop to square or maintain aspect ratio
-                if preserve_aspect_ratio:
-                    # Apply processing to full resolution for better quality
-                    final_processed = self._apply_processing_to_image(original_img, params)
-                elif abs(orig_width - orig_height) < min(orig_width, orig_height) * 0.1:
-                    # Nearly square - upscale to fit the larger dimension
-                    target_size = max(orig_width, orig_height)
-                    final_processed = processed_preview.resize((target_size, target_size), Image.Resampling.LANCZOS)
-                else:
-                    # Rectangular - create final image matching original aspect ratio
-                    # Apply processing to full resolution for better quality on rectangular images
-                    final_processed = self._apply_processing_to_image(original_img, params)
-                
-                original_img.close()
-            else:
-                # Fallback: process the full image directly
-                img = Image.open(filepath)
-                img = ImageOps.exif_transpose(img)
-                final_processed = self._apply_processing_to_image(img, params)
-                img.close()
-            
-            # Save to temporary file
-            output_path = os.path.join(self.temp_dir, f"processed_{preset_name}_{os.path.basename(filepath)}.png")
-            final_processed.save(output_path, 'PNG', quality=100, optimize=True)
-            
-            return output_path
-            
-        except Exception as e:
-            raise Exception(f"Error processing full resolution image: {str(e)}")
-    
     def _validate_image(self, image):
         """Validate image file"""
         try:
@@ -274,16 +454,12 @@ class DungeonSynthProcessor:
             cropped = image.crop((sx, sy, sx + crop_size, sy + crop_size))
             return cropped.resize((size, size), Image.Resampling.LANCZOS)
     
-    def _apply_processing_to_preview(self, preview_image, params):
+    def _apply_processing_to_preview(self, preview_image, params, edges_key=None):
         """Apply processing specifically tuned for 400x400 preview"""
-        processed = self._apply_dungeon_synth_processing(preview_image, params, is_preview=True)
-        
-        # Apply color tinting if specified
-        color_tint = params.get('color_tint', 'none')
-        if color_tint and color_tint != 'none':
-            processed = self._apply_color_tint(processed, color_tint)
-        
-        return processed
+        # Color tinting goes through the exact per-gray-level table
+        return self._apply_dungeon_synth_processing(preview_image, params, is_preview=True,
+                                                    color_tint=params.get('color_tint', 'none'),
+                                                    edges_key=edges_key)
     
     def _apply_processing_to_image(self, image, params):
         """Apply processing to any size image with scaling adjustments"""
@@ -300,121 +476,273 @@ class DungeonSynthProcessor:
             sy = (height - size) // 2
             processed_img = image.crop((sx, sy, sx + size, sy + size))
         
-        # Apply processing
-        processed = self._apply_dungeon_synth_processing(processed_img, params, is_preview=False)
-        
-        # Apply color tinting if specified
-        color_tint = params.get('color_tint', 'none')
-        if color_tint and color_tint != 'none':
-            processed = self._apply_color_tint(processed, color_tint)
+        # Apply processing and color tinting
+        return self._process_and_tint(processed_img, params)
+    
+    def _gray_image(self, gray):
+        """Mode L image sharing a C-contiguous uint8 plane's memory instead of copying it"""
+        return Image.frombuffer('L', (gray.shape[1], gray.shape[0]), gray, 'raw', 'L', 0, 1)
+    
+    def _tinted(self, luma, params, color_tint, buffers, edges_key=None):
+        """Toned, grained and tinted RGB image of a luma plane, rendered by the kernel backend"""
+        # Image.fromarray copies RGB data, so the buffer can go back to the pool
+        output = buffers.take(luma.shape + (3,), np.uint8)
+        lut = self.tint_lut(color_tint or 'none')
+        self.kernels.tone_grain_tint(self, luma, params, lut, output, buffers,
+                                     edges=self._edge_plane(luma, params, edges_key))
+        self._apply_text_layer(output, params)
+        return Image.fromarray(output)
+    
+    def _edge_plane(self, luma, params, edges_key=None):
+        """
+        Gradient magnitude of a luma plane for line art, None for other methods
+        edges_key names the upload and render size the plane came from; with
+        it the gradients are cached per blur level, so tone and threshold
+        changes reuse them
+        """
+        if params.get('method') != 'lineart':
+            return None
+        if edges_key is None:
+            return edge_magnitude(luma)
+        return self.source_cache.get_or_create(edges_key + (params.get('blur', 0),),
+                                               lambda: edge_magnitude(luma))
+    
+    def _process_and_tint(self, image, params, edges_key=None):
+        """Processed and tinted render of a cropped and resized image"""
+        # Error diffusion carries error across every row, so it never splits into strips
+        if image.width * image.height >= STRIP_MIN_PIXELS and params.get('method') not in DIFFUSION_WEIGHTS:
+            return self._process_strips(image, params)
         
-        return processed
+        return self._apply_dungeon_synth_processing(image, params, is_preview=False,
+                                                    color_tint=params.get('color_tint', 'none'),
+                                                    edges_key=edges_key)
     
-    def _apply_dungeon_synth_processing(self, image, params, is_preview=True):
-        """Enhanced dungeon synth processing with research-based methods"""
+    def _strip_executor(self):
+        """The shared strip pool, started on first use; None when single-threaded"""
+        if self.strip_workers <= 1:
+            return None
+        with self.strip_pool_lock:
+            if self.strip_pool is None:
+                self.strip_pool = ThreadPoolExecutor(max_workers=self.strip_workers,
+                                                     thread_name_prefix='strip')
+            return self.strip_pool
+    
+    def _process_strips(self, image, params):
+        """Blur, tone, grain and tint row strips in parallel, straight into one output buffer"""
         try:
             if image.mode != 'RGB':
                 image = image.convert('RGB')
+            source = np.asarray(image)
+            height, width = source.shape[:2]
+            
+            lut = self.tint_lut(params.get('color_tint') or 'none')
+            
+            strips = [(index, top, min(top + STRIP_ROWS, height))
+                      for index, top in enumerate(range(0, height, STRIP_ROWS))]
+            executor = self._strip_executor()
+            with self.buffer_pool.lease() as buffers:
+                output = buffers.take((height, width, 3), np.uint8)
+                if executor is None:
+                    for strip in strips:
+                        self._process_strip(source, output, params, lut, *strip)
+                else:
+                    # Consume every result so a failing strip raises here
+                    list(executor.map(lambda strip: self._process_strip(source, output, params, lut, *strip),
+                                      strips))
+                
+                # Text spans strips, so it goes over the assembled render
+                self._apply_text_layer(output, params)
+                return Image.fromarray(output)
             
-            img_array = np.array(image)
-            
-            if img_array is None or img_array.size == 0:
-                raise Exception("Invalid image array")
-            
-            # Verify array shape
-            if len(img_array.shape) != 3 or img_array.shape[2] != 3:
-                raise Exception(f"Invalid image array shape: {img_array.shape}")
-            
-            # Apply blur first if needed
-            blur_amount = params.get('blur', 0)
-            if blur_amount > 0:
-                pil_img = Image.fromarray(img_array)
-                pil_img = pil_img.filter(ImageFilter.GaussianBlur(radius=blur_amount))
-                img_array = np.array(pil_img)
-            
-            # Convert to grayscale using luminosity method
-            gray = np.dot(img_array[...,:3], [0.299, 0.587, 0.114])
-            
-            # Apply brightness
-            brightness = params.get('brightness', 0)
-            gray = np.clip(gray + brightness, 0, 255)
-            
-            # Apply contrast with research-based curves
-            contrast = params.get('contrast', 1.5)
-            method = params.get('method', 'custom')
-            
-            # Apply method-specific contrast curves
-            if method in ['comfy', 'sepia']:
-                # Lower contrast for warm, inviting aesthetics
-                gray = np.clip((gray - 128) * (contrast * 0.8) + 128, 0, 255)
-            elif method in ['lithographic', 'forest']:
-                # Medium contrast with S-curve
-                gray = self._apply_s_curve(gray, contrast)
-            else:
-                # Standard contrast
-                gray = np.clip((gray - 128) * contrast + 128, 0, 255)
-            
-            # Apply method-specific processing
-            threshold = params.get('threshold', 128)
-            
-            if method == 'threshold':
-                gray = np.where(gray > threshold, 255, 0)
-            elif method == 'silhouette':
-                gray = np.where(gray > threshold, 255, 0)
-            elif method == 'manuscript':
-                # Manuscript processing with aged parchment effect
-                gray = self._apply_manuscript_effect(gray, threshold)
-            elif method == 'ghostly':
-                gray = np.where(gray > threshold, np.minimum(255, gray + 30), np.maximum(0, gray - 20))
-            elif method == 'atmospheric':
-                # Tonal compression for atmospheric effect
-                gray = self._apply_tonal_compression(gray)
-            elif method == 'cavern':
-                gray = np.where(gray > threshold + 40, 255,
-                               np.where(gray < threshold - 60, 0, gray * 0.3))
-            elif method == 'frozen':
-                # Crystalline processing
-                gray = self._apply_crystalline_effect(gray, threshold)
-            elif method == 'ritual':
-                gray = np.where(gray > threshold + 20, 255,
-                               np.where(gray < threshold - 40, 0, gray * 0.8))
-            elif method == 'lithographic':
-                # Lithographic/engraving simulation
-                gray = self._apply_lithographic_effect(gray, threshold)
-            elif method == 'sepia':
-                # Vintage film effect
-                gray = self._apply_vintage_film_effect(gray)
-            elif method == 'comfy':
-                # Warm hearth effect
-                gray = self._apply_comfy_effect(gray)
-            elif method == 'forest':
-                # Organic texture enhancement
-                gray = self._apply_forest_effect(gray, threshold)
-            
-            # Add noise/grain with method-specific characteristics
-            noise_amount = params.get('noise', 20)
-            if noise_amount > 0:
-                gray = self._apply_method_specific_noise(gray, noise_amount, method, params)
-            
-            gray = gray.astype(np.uint8)
-            
-            # Ensure the result is 2D before stacking
-            if len(gray.shape) != 2:
-                raise Exception(f"Gray array has invalid shape after processing: {gray.shape}")
-            
-            result = np.stack([gray, gray, gray], axis=-1)
-            return Image.fromarray(result)
+        except Exception as e:
+            raise Exception(f"Error in strip processing: {str(e)}")
+    
+    def _process_strip(self, source, output, params, lut, index, top, bottom):
+        """One strip of _process_strips; rows outside [top, bottom) are only read as blur or edge halo"""
+        # Line art reads one row past each end of the strip for its gradients
+        edge_halo = EDGE_HALO if params.get('method') == 'lineart' else 0
+        read_top = max(0, top - edge_halo)
+        read_bottom = min(source.shape[0], bottom + edge_halo)
+        
+        blur_amount = params.get('blur', 0)
+        if blur_amount > 0:
+            halo = blur_halo(blur_amount)
+            halo_top = max(0, read_top - halo)
+            halo_bottom = min(source.shape[0], read_bottom + halo)
+            blurred = Image.fromarray(source[halo_top:halo_bottom]).filter(
+                ImageFilter.GaussianBlur(radius=blur_amount))
+            pixels = np.asarray(blurred)[read_top - halo_top:read_bottom - halo_top]
+        else:
+            pixels = source[read_top:read_bottom]
+        
+        with self.buffer_pool.lease() as buffers:
+            luma = self._luma_of_pixels(pixels, buffers)
+            edges = self._edge_plane(luma, params)
+            rows = slice(top - read_top, bottom - read_top)
+            self.kernels.tone_grain_tint(self, luma[rows], params, lut, output[top:bottom], buffers,
+                                         strip_index=index, edges=None if edges is None else edges[rows])
+    
+    def _apply_dungeon_synth_processing(self, image, params, is_preview=True, color_tint='none', edges_key=None):
+        """Enhanced dungeon synth processing with research-based methods, tinted through the exact LUT"""
+        try:
+            with self.buffer_pool.lease() as buffers:
+                luma = self._luma(image, params.get('blur', 0), buffers)
+                return self._tinted(luma, params, color_tint, buffers, edges_key)
             
         except Exception as e:
             raise Exception(f"Error in dungeon synth processing: {str(e)}")
     
+    def _luma(self, image, blur_amount, buffers):
+        """Blurred luminosity plane of an image, as float64"""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        # Blur on the PIL side, so pixels cross into numpy once
+        if blur_amount > 0:
+            image = image.filter(ImageFilter.GaussianBlur(radius=blur_amount))
+        
+        img_array = np.asarray(image)
+        
+        if img_array is None or img_array.size == 0:
+            raise Exception("Invalid image array")
+        
+        # Verify array shape
+        if len(img_array.shape) != 3 or img_array.shape[2] != 3:
+            raise Exception(f"Invalid image array shape: {img_array.shape}")
+        
+        # Convert to grayscale using luminosity method
+        return self._luma_of_pixels(img_array, buffers)
+    
+    def _luma_of_pixels(self, pixels, buffers):
+        """Luminosity of an RGB uint8 array, written block by block into one float64 plane"""
+        gray = buffers.take(pixels.shape[:2])
+        for top in range(0, gray.shape[0], LUMA_BLOCK_ROWS):
+            bottom = top + LUMA_BLOCK_ROWS
+            np.dot(pixels[top:bottom], LUMA_WEIGHTS, out=gray[top:bottom])
+        return gray
+    
+    def _tone_and_grain(self, gray, params, buffers, strip_index=None, edges=None):
+        """
+        Brightness, contrast curve, method remap and grain; returns a uint8 plane borrowed from buffers
+        edges is the line-art gradient magnitude of gray, computed here when not given
+        """
+        luma = gray
+        # Apply brightness; the input may be a shared luma plane, so this is the
+        # one copy, and the curves below work on it in place
+        brightness = params.get('brightness', 0)
+        gray = np.add(gray, brightness, out=buffers.take(gray.shape))
+        np.clip(gray, 0, 255, out=gray)
+        
+        # Apply contrast with research-based curves
+        contrast = params.get('contrast', 1.5)
+        method = params.get('method', 'custom')
+        
+        # Apply method-specific contrast curves
+        if method in ['comfy', 'sepia']:
+            # Lower contrast for warm, inviting aesthetics
+            self._apply_linear_contrast(gray, contrast * 0.8)
+        elif method in ['lithographic', 'forest']:
+            # Medium contrast with S-curve
+            gray = self._apply_s_curve(gray, contrast)
+        else:
+            # Standard contrast
+            self._apply_linear_contrast(gray, contrast)
+        
+        # Apply method-specific processing
+        threshold = params.get('threshold', 128)
+        
+        if method == 'threshold':
+            gray = np.where(gray > threshold, 255, 0)
+        elif method == 'silhouette':
+            gray = np.where(gray > threshold, 255, 0)
+        elif method == 'manuscript':
+            # Manuscript processing with aged parchment effect
+            gray = self._apply_manuscript_effect(gray, threshold)
+        elif method == 'ghostly':
+            gray = np.where(gray > threshold, np.minimum(255, gray + 30), np.maximum(0, gray - 20))
+        elif method == 'atmospheric':
+            # Tonal compression for atmospheric effect
+            gray = self._apply_tonal_compression(gray)
+        elif method == 'cavern':
+            gray = np.where(gray > threshold + 40, 255,
+                           np.where(gray < threshold - 60, 0, gray * 0.3))
+        elif method == 'frozen':
+            # Crystalline processing
+            gray = self._apply_crystalline_effect(gray, threshold)
+        elif method == 'ritual':
+            gray = np.where(gray > threshold + 20, 255,
+                           np.where(gray < threshold - 40, 0, gray * 0.8))
+        elif method == 'lithographic':
+            # Lithographic/engraving simulation
+            gray = self._apply_lithographic_effect(gray, threshold)
+        elif method == 'lineart':
+            # Ink drawing over a pale wash of the tone
+            if edges is None:
+                edges = edge_magnitude(luma)
+            gray = self._apply_line_art(gray, edges, threshold, buffers)
+        elif method == 'halftone':
+            # Engraved dot screen
+            gray = self._apply_screen(gray, threshold, method, halftone_tile(), strip_index)
+        elif method == 'crosshatch':
+            # Engraved line screens, layered into the shadows
+            gray = self._apply_screen(gray, threshold, method, hatch_tile(), strip_index)
+        elif method == 'sepia':
+            # Vintage film effect
+            gray = self._apply_vintage_film_effect(gray)
+        elif method == 'comfy':
+            # Warm hearth effect
+            gray = self._apply_comfy_effect(gray)
+        elif method == 'forest':
+            # Organic texture enhancement
+            gray = self._apply_forest_effect(gray, threshold)
+        elif method in ['bayer', 'bluenoise']:
+            # Photocopied one-bit look with a fixed screen
+            gray = self._apply_screen(gray, threshold, method, threshold_matrix(method), strip_index)
+        elif method in DIFFUSION_WEIGHTS:
+            # Photocopied one-bit look with diffused error
+            gray = error_diffusion(gray, threshold, method)
+        
+        # Add noise/grain with method-specific characteristics
+        noise_amount = params.get('noise', 20)
+        if noise_amount > 0:
+            gray = self._apply_method_specific_noise(gray, noise_amount, method, params, buffers, strip_index)
+        
+        result = buffers.take(gray.shape, np.uint8)
+        np.copyto(result, gray, casting='unsafe')
+        gray = result
+        
+        # Paper texture over the finished tone, so the tint colors it too
+        texture = params.get('texture', 'none')
+        if texture != 'none':
+            self._apply_texture(gray, texture, strip_index)
+        
+        # Ensure the result is 2D before stacking
+        if len(gray.shape) != 2:
+            raise Exception(f"Gray array has invalid shape after processing: {gray.shape}")
+        
+        return gray
+    
+    def _apply_linear_contrast(self, gray, factor):
+        """Stretch around mid-gray in place"""
+        gray -= 128
+        gray *= factor
+        gray += 128
+        np.clip(gray, 0, 255, out=gray)
+        return gray
+    
     def _apply_s_curve(self, gray, contrast):
-        """Apply S-curve for gentle contrast enhancement"""
+        """Apply S-curve for gentle contrast enhancement, in place"""
         # Normalize to 0-1
-        normalized = gray / 255.0
-        # Apply S-curve
-        s_curve = 1 / (1 + np.exp(-contrast * (normalized - 0.5)))
-        return np.clip(s_curve * 255, 0, 255)
+        gray /= 255.0
+        # Apply S-curve: 1 / (1 + exp(-contrast * (normalized - 0.5)))
+        gray -= 0.5
+        gray *= -contrast
+        np.exp(gray, out=gray)
+        gray += 1
+        np.divide(1, gray, out=gray)
+        gray *= 255
+        np.clip(gray, 0, 255, out=gray)
+        return gray
     
     def _apply_manuscript_effect(self, gray, threshold):
         """Medieval manuscript processing"""
@@ -440,10 +768,26 @@ class DungeonSynthProcessor:
     
     def _apply_lithographic_effect(self, gray, threshold):
         """Lithographic/engraving simulation"""
-        # Simulate halftone patterns and cross-hatching
+        # Hard clip to ink and paper beyond 20 levels either side of the
+        # threshold, keeping the tone in between; the screened looks are the
+        # 'halftone' and 'crosshatch' methods
         return np.where(gray > threshold + 20, 255,
                        np.where(gray < threshold - 20, 0, gray))
     
+    def _apply_line_art(self, gray, edges, threshold, buffers):
+        """Line art: edges above a threshold-driven level inked over the washed-out tone, in place"""
+        gray *= LINE_ART_WASH
+        gray += 255 * (1 - LINE_ART_WASH)
+        
+        # A higher threshold inks fainter edges, like it darkens the other methods
+        level = (255 - threshold) * LINE_ART_EDGE_SCALE
+        ink = np.subtract(edges, level, out=buffers.take(gray.shape))
+        ink /= LINE_ART_SOFTNESS
+        np.clip(ink, 0, 1, out=ink)
+        np.subtract(1, ink, out=ink)
+        gray *= ink
+        return gray
+    
     def _apply_vintage_film_effect(self, gray):
         """Vintage film degradation effect"""
         # Lifted blacks, compressed highlights
@@ -463,14 +807,46 @@ class DungeonSynthProcessor:
                          np.where(gray < threshold - 30, 0, gray * 1.1))
         return forest
     
-    def _apply_method_specific_noise(self, gray, noise_amount, method, params):
+    def _apply_screen(self, gray, threshold, name, tile, strip_index=None):
+        """Ordered dithering and engraving screens: one compare against a cached, tiled threshold tile"""
+        height, width = gray.shape
+        screen = self.screen_cache.get_or_create(
+            (name, height, width), lambda: tile_screen(tile, height, width))
+        # Strips start part-way through the tile, where the whole image would be
+        top = 0 if strip_index is None else strip_index * STRIP_ROWS
+        phase = top % tile.shape[0]
+        # Shifting the image against the screen moves the black point like a threshold
+        gray -= threshold - 128
+        return np.where(gray > screen[phase:phase + height], 255, 0)
+    
+    def _apply_texture(self, gray, texture, strip_index=None):
+        """Blend a paper texture into a uint8 plane in place, tiled from the plane's place in the image"""
+        # Strips span the full width, so the level can be picked from the plane
+        level = self.textures.level(texture, gray.shape[1])
+        top = 0 if strip_index is None else strip_index * STRIP_ROWS
+        blend_texture(gray, level, self.texture_lut(texture), top)
+    
+    def _apply_method_specific_noise(self, gray, noise_amount, method, params, buffers, strip_index=None):
         """Apply noise based on method characteristics"""
+        noise_array = self._grain_field(gray, noise_amount, method, params, buffers, strip_index)
+        
+        # The noise buffer becomes the result
+        np.add(noise_array, gray, out=noise_array)
+        return np.clip(noise_array, 0, 255, out=noise_array)
+    
+    def _grain_field(self, gray, noise_amount, method, params, buffers, strip_index=None):
+        """Method-specific grain for a toned plane, seeded from the plane itself"""
         if len(gray.shape) != 2:
             raise ValueError(f"Expected 2D grayscale array, got shape {gray.shape}")
             
         height, width = gray.shape
-        seed_value = int(np.sum(gray) % 1000) + hash(str(params)) % 1000
-        np.random.seed(seed_value)
+        # Seed from the image and a stable parameter digest so every worker
+        # and thread renders identical grain for identical requests
+        seed_value = int(np.sum(gray) % 1000) + params_seed(params) % 1000
+        if strip_index is not None:
+            # Strips seed from their own rows and position, never from each other
+            seed_value += STRIP_SEED_STRIDE * (strip_index + 1)
+        rng = np.random.RandomState(seed_value)
         
         if method in ['manuscript', 'lithographic']:
             # Coarser grain for aged/printed effects
@@ -494,85 +870,148 @@ class DungeonSynthProcessor:
             # Create coarser grain - handle non-square dimensions properly
             small_height = max(1, height // grain_size)
             small_width = max(1, width // grain_size)
-            small_noise = np.random.uniform(-noise_scale/2, noise_scale/2, 
+            small_noise = rng.uniform(-noise_scale/2, noise_scale/2, 
                                           (small_height, small_width))
             
-            # Resize to match original dimensions
-            noise_array = np.zeros((height, width))
-            for i in range(small_height):
-                for j in range(small_width):
-                    y_start = i * grain_size
-                    y_end = min((i + 1) * grain_size, height)
-                    x_start = j * grain_size
-                    x_end = min((j + 1) * grain_size, width)
-                    noise_array[y_start:y_end, x_start:x_end] = small_noise[i, j]
+            # Resize to match original dimensions; each value fills a grain_size
+            # square, and a trailing odd row or column keeps no grain
+            noise_array = buffers.take((height, width))
+            covered_height = small_height * grain_size
+            covered_width = small_width * grain_size
+            if covered_height <= height and covered_width <= width:
+                noise_array[covered_height:] = 0
+                noise_array[:, covered_width:] = 0
+                # Broadcast each value over its square through a view, without a full-size temporary
+                cells = noise_array[:covered_height, :covered_width].reshape(
+                    small_height, grain_size, small_width, grain_size)
+                cells[...] = small_noise[:, np.newaxis, :, np.newaxis]
+            else:
+                # Smaller than one grain cell
+                cells = small_noise.repeat(grain_size, axis=0).repeat(grain_size, axis=1)
+                noise_array[...] = cells[:height, :width]
         else:
-            noise_array = np.random.uniform(-noise_scale/2, noise_scale/2, (height, width))
+            noise_array = rng.uniform(-noise_scale/2, noise_scale/2, (height, width))
         
-        return np.clip(gray + noise_array, 0, 255)
+        return noise_array
 
-    def process_at_size(self, filepath, params, target_size):
-        """Process image at specific target size"""
+    def render_at_size(self, filepath, params, target_size):
+        """Render an upload at a target size and return the processed image"""
         try:
-            img = Image.open(filepath)
-            img.load()
-            
-            # Fix orientation from EXIF data
-            img = ImageOps.exif_transpose(img)
-            
-            # Ensure proper color mode
-            if img.mode not in ('RGB', 'L'):
-                if img.mode == 'RGBA':
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[-1])
-                    img = background
-                else:
-                    img = img.convert('RGB')
+            # Decoded and resampled once per worker; every preset and tint
+            # rendered at this size shares the same base
+            preserve_aspect_ratio = bool(params.get('preserve_aspect_ratio', False))
+            resized = self._load_preview_base(filepath, target_size, preserve_aspect_ratio)
             
-            preserve_aspect_ratio = params.get('preserve_aspect_ratio', False)
-        
-            # Create square crop or preserve ratio based on preference
-            width, height = img.size
-            
-            if preserve_aspect_ratio:
-                # Preserve aspect ratio - scale to fit within target_size
-                # Create a copy to avoid modifying the original
-                img_copy = img.copy()
-                img_copy.thumbnail((target_size, target_size), Image.Resampling.LANCZOS)
-                resized = img_copy
-            else:
-                # Original square crop behavior
-                size = min(width, height)
-                sx = (width - size) // 2
-                sy = (height - size) // 2
-                
-                cropped = img.crop((sx, sy, sx + size, sy + size))
-                resized = cropped.resize((target_size, target_size), Image.Resampling.LANCZOS)
-            
-            img.close()
-            
-            # Apply processing at target size
-            processed = self._apply_dungeon_synth_processing(resized, params, is_preview=False)
-            
-            # Apply color tinting if specified
-            color_tint = params.get('color_tint', 'none')
-            if color_tint and color_tint != 'none':
-                processed = self._apply_color_tint(processed, color_tint)
+            # Apply processing and color tinting at target size
+            return self._process_and_tint(resized, params,
+                                          edges_key=(filepath, 'edges', target_size, preserve_aspect_ratio))
             
-            # Save to temporary file
-            output_path = os.path.join(self.temp_dir, f"processed_{target_size}_{os.path.basename(filepath)}.png")
-            processed.save(output_path, 'PNG', quality=100, optimize=True)
+        except Exception as e:
+            raise Exception(f"Error processing at size: {str(e)}")
+    
+    def render_to_file(self, filepath, params, target_size, output_path, compress_level=None):
+        """
+        Render at a target size straight to output_path; returns the image size
+        Without a compress_level the PNG is fully optimized
+        """
+        processed = self.render_at_size(filepath, params, target_size)
+        self._save_atomic(processed, output_path, compress_level)
+        return processed.size
+
+    def render_png(self, filepath, params, target_size, compress_level=FAST_PNG_COMPRESS_LEVEL):
+        """Render at a target size and return (PNG bytes, image size)"""
+        processed = self.render_at_size(filepath, params, target_size)
+        buffer = io.BytesIO()
+        processed.save(buffer, 'PNG', compress_level=compress_level)
+        return buffer.getvalue(), processed.size
+
+    def render_contact_sheet(self, filepath, variants, color_tint='none', tile_size=300,
+                             columns=4, preserve_aspect_ratio=False):
+        """
+        Render (label, params) variants side by side into one labelled PNG
+        The source is resampled once at tile size, each blur level's luma is
+        shared, and tiles are written straight into one preallocated grid
+        """
+        try:
+            base = self._load_preview_base(filepath, tile_size, preserve_aspect_ratio)
+            tile_width, tile_height = base.size
+            lut = self.tint_lut(color_tint)
+            
+            gutter = CONTACT_SHEET_GUTTER
+            cell_width = tile_size + gutter
+            cell_height = tile_size + CONTACT_SHEET_LABEL_HEIGHT + gutter
+            rows = math.ceil(len(variants) / columns)
+            grid = np.empty((rows * cell_height + gutter, columns * cell_width + gutter, 3), dtype=np.uint8)
+            grid[...] = CONTACT_SHEET_BACKGROUND
+            
+            lumas = {}
+            with self.buffer_pool.lease() as buffers:
+                for index, (label, params) in enumerate(variants):
+                    blur = params.get('blur', 0)
+                    if blur not in lumas:
+                        lumas[blur] = self._luma(base, blur, buffers)
+                    with self.buffer_pool.lease() as tile_buffers:
+                        tile = tile_buffers.take((tile_height, tile_width, 3), np.uint8)
+                        edges = self._edge_plane(lumas[blur], params,
+                                                 (filepath, 'edges', tile_size, bool(preserve_aspect_ratio)))
+                        self.kernels.tone_grain_tint(self, lumas[blur], params, lut, tile, tile_buffers,
+                                                     edges=edges)
+                        self._apply_text_layer(tile, params)
+                        
+                        # Center the tile in its cell when the aspect ratio is kept
+                        row, column = divmod(index, columns)
+                        x = gutter + column * cell_width + (tile_size - tile_width) // 2
+                        y = gutter + row * cell_height + (tile_size - tile_height) // 2
+                        grid[y:y + tile_height, x:x + tile_width] = tile
+            
+            sheet = Image.fromarray(grid)
+            draw = ImageDraw.Draw(sheet)
+            try:
+                font = ImageFont.load_default(size=max(12, CONTACT_SHEET_LABEL_HEIGHT // 2))
+            except TypeError:
+                # Pillow < 10.1 only ships the fixed-size bitmap font
+                font = ImageFont.load_default()
+            for index, (label, _) in enumerate(variants):
+                row, column = divmod(index, columns)
+                x = gutter + column * cell_width + tile_size // 2
+                y = gutter + row * cell_height + tile_size + CONTACT_SHEET_LABEL_HEIGHT // 2
+                draw.text((x, y), label, fill=CONTACT_SHEET_LABEL_COLOR, font=font, anchor='mm')
             
-            return output_path
+            buffer = io.BytesIO()
+            sheet.save(buffer, 'PNG')
+            return buffer.getvalue()
             
         except Exception as e:
-            raise Exception(f"Error processing at size: {str(e)}")
+            raise Exception(f"Error rendering contact sheet: {str(e)}")
+    
+    def process_at_size(self, filepath, params, target_size):
+        """Process image at specific target size; returns (output path, image size)"""
+        # Name the output after the request so concurrent renders never collide
+        stem = os.path.splitext(os.path.basename(filepath))[0]
+        output_path = os.path.join(
+            self.temp_dir, f"processed_{stem}_{target_size}_{params_digest(params)}.png")
+        size = self.render_to_file(filepath, params, target_size, output_path)
+        return output_path, size
+    
+    def _save_atomic(self, image, output_path, compress_level=None):
+        """Write a PNG so other workers never observe a partial file; optimized without a compress_level"""
+        # Threads of one worker may write the same output at once, so the
+        # temporary name is unique per thread as well as per process
+        tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if compress_level is None:
+            image.save(tmp_path, 'PNG', quality=100, optimize=True)
+        else:
+            image.save(tmp_path, 'PNG', compress_level=compress_level)
+        os.replace(tmp_path, output_path)
         
     def cleanup(self):
         """Clean up temporary files and cache"""
         try:
-            if os.path.exists(self.temp_dir):
+            if self.owns_temp_dir and os.path.exists(self.temp_dir):
                 shutil.rmtree(self.temp_dir)
             self.processed_cache.clear()
+            self.buffer_pool.clear()
+            if self.strip_pool is not None:
+                self.strip_pool.shutdown(wait=False)
         except Exception:
             pass
\ No newline at end of file
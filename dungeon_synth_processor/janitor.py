@@ -0,0 +1,185 @@
+"""
+Background expiry of uploads, renders and cached artifacts
+Upload and render files are aged by modification time, which request
+handlers bump when they use a file, so the oldest timestamp is the least
+recently used item. A periodic sweep deletes whatever outlived its TTL, then
+evicts in LRU order until the folders fit the disk quota. Only one worker
+process at a time sweeps the shared folders; every worker expires its own
+in-memory caches
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# A file is re-touched at most this often, however busy it is
+TOUCH_INTERVAL = 60
+
+# Name of the shared lease that picks the sweeping worker
+SWEEP_LEASE = 'janitor'
+
+# Upload folder entries that are never swept
+KEEP_FILES = {'.gitkeep'}
+
+DiskItem = namedtuple('DiskItem', ['kind', 'path', 'nbytes', 'used'])
+
+
+class Janitor:
+    """
+    Periodic sweeper enforcing TTLs and a byte quota on the shared folders
+    """
+
+    def __init__(self, processor, store, upload_folder, render_folder, interval=300,
+                 upload_ttl=24 * 3600, render_ttl=6 * 3600, partial_ttl=3600,
+                 cache_ttl=1800, quota_bytes=None, chunk_hashes=None):
+        self.processor = processor
+        self.store = store
+        self.upload_folder = upload_folder
+        self.render_folder = render_folder
+        self.interval = interval
+        self.ttls = {'upload': upload_ttl, 'render': render_ttl, 'partial': partial_ttl}
+        self.cache_ttl = cache_ttl
+        self.quota_bytes = quota_bytes
+        self.chunk_hashes = chunk_hashes
+        self.holder = f'{os.getpid()}-{uuid.uuid4().hex}'
+        self.touched = {}
+        self.lock = threading.Lock()
+        self.sweeps = 0
+        self.last_sweep = None
+        self.usage = {}
+        self.evicted = {'upload': 0, 'render': 0, 'partial': 0}
+        self.reclaimed_bytes = {'upload': 0, 'render': 0, 'partial': 0, 'cache': 0}
+        self.thread = None
+        if interval:
+            self.thread = threading.Thread(target=self._run, name='janitor', daemon=True)
+            self.thread.start()
+
+    def touch(self, path):
+        """Mark a file as just used; cheap enough to call on every request"""
+        now = time.time()
+        with self.lock:
+            if now - self.touched.get(path, 0) < TOUCH_INTERVAL:
+                return
+            self.touched[path] = now
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Janitor sweep failed: {str(e)}")
+
+    def sweep(self):
+        """One pass: expire idle cache entries, then TTL and quota on disk if this worker holds the lease"""
+        released = (self.processor.source_cache.expire_idle(self.cache_ttl)
+                    + self.processor.processed_cache.expire_idle(self.cache_ttl))
+        with self.lock:
+            self.reclaimed_bytes['cache'] += released
+            cutoff = time.time() - TOUCH_INTERVAL
+            self.touched = {path: at for path, at in self.touched.items() if at > cutoff}
+        self.store.prune_index()
+
+        # A lease longer than the interval keeps one worker sweeping until it goes away
+        if not self.store.acquire_lease(SWEEP_LEASE, self.holder, self.interval * 2 + 60):
+            return
+
+        now = time.time()
+        for item in self._scan():
+            if now - item.used > self.ttls[item.kind]:
+                self._evict(item)
+
+        # Rescan: evicting an upload also removed its renders
+        items = self._scan()
+        if self.quota_bytes is not None:
+            # Renders and partial uploads can be recreated, so they go before any upload
+            items.sort(key=lambda item: (item.kind == 'upload', item.used))
+            total = sum(item.nbytes for item in items)
+            while items and total > self.quota_bytes:
+                item = items.pop(0)
+                self._evict(item)
+                total -= item.nbytes
+
+        usage = {'upload': 0, 'render': 0, 'partial': 0}
+        for item in items:
+            usage[item.kind] += item.nbytes
+        with self.lock:
+            self.sweeps += 1
+            self.last_sweep = now
+            self.usage = usage
+
+    def _scan(self):
+        items = []
+        for kind, folder in (('upload', self.upload_folder), ('render', self.render_folder)):
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.name in KEEP_FILES or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                item_kind = kind
+                if kind == 'upload' and entry.name.startswith('.'):
+                    if not entry.name.endswith('.part'):
+                        continue
+                    item_kind = 'partial'
+                items.append(DiskItem(item_kind, entry.path, stat.st_size, stat.st_mtime))
+        return items
+
+    def _evict(self, item):
+        """Delete one item and everything derived from it; returns the bytes reclaimed"""
+        reclaimed = 0
+        name = os.path.basename(item.path)
+        if item.kind == 'upload':
+            # Expired or over quota: drop it however many handles are still out
+            for artifact_path in self.store.remove(name):
+                reclaimed += _remove(artifact_path)
+            self.processor.forget(item.path)
+        elif item.kind == 'partial':
+            upload_id = name[1:-len('.part')]
+            self.store.remove_session(upload_id)
+            if self.chunk_hashes is not None:
+                self.chunk_hashes.discard(upload_id)
+        reclaimed += _remove(item.path)
+
+        with self.lock:
+            self.evicted[item.kind] += 1
+            self.reclaimed_bytes[item.kind] += reclaimed
+        logger.info(f"Janitor evicted {item.kind} {name} ({reclaimed} bytes)")
+        return reclaimed
+
+    def stats(self):
+        with self.lock:
+            return {
+                'interval': self.interval,
+                'ttls': dict(self.ttls, cache=self.cache_ttl),
+                'quota_bytes': self.quota_bytes,
+                'sweeps': self.sweeps,
+                'last_sweep': self.last_sweep,
+                'usage_bytes': dict(self.usage),
+                'evicted': dict(self.evicted),
+                'reclaimed_bytes': dict(self.reclaimed_bytes)
+            }
+
+
+def _remove(path):
+    """Delete a file if it is still there; returns its size"""
+    try:
+        nbytes = os.path.getsize(path)
+        os.remove(path)
+        return nbytes
+    except FileNotFoundError:
+        return 0
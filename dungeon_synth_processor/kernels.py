@@ -0,0 +1,190 @@
+"""
+Per-pixel kernel backends for tone, grain and tint
+The reference backend is the processor's own NumPy pipeline, one pass over
+memory per step. The optional Numba backend fuses brightness, contrast and
+the method remap into one parallel pass, and grain, clip, cast and tint
+into a second, generating the grain field exactly like the reference. It
+is only used when numba is installed, and only after it has reproduced
+the reference on a test plane for every method
+"""
+
+import logging
+import math
+
+import numpy as np
+
+from presets import list_methods
+from render_params import normalize_params
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+logger = logging.getLogger(__name__)
+
+KERNEL_BACKENDS = ('numpy', 'numba')
+
+# Largest gray-level difference a backend may show against the reference;
+# a compiled exp can round the S-curve one ulp differently, moving a level
+VERIFY_TOLERANCE = 1
+VERIFY_SIZE = 64
+
+# Method remaps by number, for the compiled kernel
+METHOD_CODES = {
+    'threshold': 1, 'silhouette': 1, 'manuscript': 2, 'ghostly': 3, 'atmospheric': 4,
+    'cavern': 5, 'frozen': 6, 'ritual': 7, 'lithographic': 8, 'sepia': 9, 'comfy': 10,
+    'forest': 11
+}
+FUSED_METHODS = set(METHOD_CODES) | {'custom'}
+
+
+class NumpyKernels:
+    """
+    Reference backend: the processor's NumPy tone and grain, then one LUT gather
+    """
+
+    name = 'numpy'
+
+    def tone_grain_tint(self, processor, luma, params, lut, out, buffers, strip_index=None, edges=None):
+        """
+        Write the tinted render of a luma plane into out, an (h, w, 3) uint8 array
+        edges is the line-art gradient magnitude of luma, when the caller has it cached
+        """
+        gray = processor._tone_and_grain(luma, params, buffers, strip_index=strip_index, edges=edges)
+        np.take(lut, gray, axis=0, out=out)
+
+
+class NumbaKernels:
+    """
+    Two fused parallel passes compiled with Numba; grain comes from the processor
+    """
+
+    name = 'numba'
+
+    def __init__(self):
+        self.no_grain = np.empty((0, 0))
+
+    def tone_grain_tint(self, processor, luma, params, lut, out, buffers, strip_index=None, edges=None):
+        method = params.get('method', 'custom')
+        if method not in FUSED_METHODS or params.get('texture', 'none') != 'none':
+            # Dithering, screens and line art look at neighbours, and textures
+            # blend after the cast to gray levels, so they stay on the reference pipeline
+            return NumpyKernels().tone_grain_tint(processor, luma, params, lut, out, buffers, strip_index, edges)
+        contrast = params.get('contrast', 1.5)
+        # Same curve choice and factors as DungeonSynthProcessor._tone_and_grain
+        if method in ['comfy', 'sepia']:
+            s_curve, factor = False, contrast * 0.8
+        elif method in ['lithographic', 'forest']:
+            s_curve, factor = True, -contrast
+        else:
+            s_curve, factor = False, contrast
+
+        toned = buffers.take(luma.shape)
+        _tone_plane(luma, toned, float(params.get('brightness', 0)), s_curve, float(factor),
+                    METHOD_CODES.get(method, 0), float(params.get('threshold', 128)))
+
+        # The grain seed depends on the toned plane, so it is drawn between the passes
+        noise_amount = params.get('noise', 20)
+        grain = self.no_grain
+        if noise_amount > 0:
+            grain = processor._grain_field(toned, noise_amount, method, params, buffers, strip_index)
+        _grain_and_tint(toned, grain, lut, out)
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _tone_plane(luma, out, brightness, s_curve, factor, method, threshold):
+        height, width = luma.shape
+        for y in numba.prange(height):
+            for x in range(width):
+                v = min(max(luma[y, x] + brightness, 0.0), 255.0)
+                if s_curve:
+                    v = (v / 255.0 - 0.5) * factor
+                    v = 1.0 / (math.exp(v) + 1.0) * 255.0
+                else:
+                    v = (v - 128.0) * factor + 128.0
+                v = min(max(v, 0.0), 255.0)
+
+                if method == 1:
+                    v = 255.0 if v > threshold else 0.0
+                elif method == 2:
+                    v = min(255.0, v * 0.9 + 20) if v > threshold else max(15.0, v * 0.8)
+                elif method == 3:
+                    v = min(255.0, v + 30) if v > threshold else max(0.0, v - 20)
+                elif method == 4:
+                    v = min(max(v * 0.7 + 40, 0.0), 255.0)
+                elif method == 5:
+                    v = 255.0 if v > threshold + 40 else (0.0 if v < threshold - 60 else v * 0.3)
+                elif method == 6:
+                    v = min(255.0, v * 1.3) if v > threshold else max(0.0, v * 0.5)
+                elif method == 7:
+                    v = 255.0 if v > threshold + 20 else (0.0 if v < threshold - 40 else v * 0.8)
+                elif method == 8:
+                    v = 255.0 if v > threshold + 20 else (0.0 if v < threshold - 20 else v)
+                elif method == 9:
+                    v = min(max(v * 0.8 + 30, 0.0), 240.0)
+                elif method == 10:
+                    v = min(max(v * 0.7 + 50, 0.0), 255.0)
+                elif method == 11:
+                    v = 255.0 if v > threshold + 30 else (0.0 if v < threshold - 30 else v * 1.1)
+                out[y, x] = v
+
+    @numba.njit(parallel=True, cache=True)
+    def _grain_and_tint(toned, grain, lut, out):
+        height, width = toned.shape
+        has_grain = grain.shape[0] > 0
+        for y in numba.prange(height):
+            for x in range(width):
+                v = toned[y, x]
+                if has_grain:
+                    v = min(max(grain[y, x] + v, 0.0), 255.0)
+                # Wrap like NumPy's float to uint8 cast
+                level = np.int64(v) & 255
+                for channel in range(3):
+                    out[y, x, channel] = lut[level, channel]
+
+
+def load_kernels(name):
+    """Backend instance by name; None when its optional dependency is missing"""
+    if name == 'numpy':
+        return NumpyKernels()
+    if name == 'numba':
+        return NumbaKernels() if numba is not None else None
+    raise ValueError(f"Unknown kernel backend: {name}")
+
+
+def verify_kernels(processor, kernels):
+    """Largest gray-level difference between a backend and the reference over every method"""
+    reference = NumpyKernels()
+    luma = np.random.RandomState(0).uniform(0, 255, (VERIFY_SIZE, VERIFY_SIZE))
+    lut = processor.tint_lut('none')
+    worst = 0
+    for method in list_methods():
+        for noise in (0, 30):
+            params = normalize_params({'method': method, 'noise': noise})
+            with processor.buffer_pool.lease() as buffers:
+                expected = buffers.take(luma.shape + (3,), np.uint8)
+                actual = buffers.take(luma.shape + (3,), np.uint8)
+                reference.tone_grain_tint(processor, luma, params, lut, expected, buffers)
+                kernels.tone_grain_tint(processor, luma, params, lut, actual, buffers)
+                worst = max(worst, int(np.abs(expected.astype(np.int16) - actual).max()))
+    return worst
+
+
+def select_kernels(name, processor):
+    """
+    The backend to render with: name if it is available and matches the
+    reference, otherwise the NumPy reference
+    """
+    kernels = load_kernels(name)
+    if kernels is None:
+        logger.warning(f"Kernel backend {name} is not installed; using numpy")
+        return NumpyKernels()
+    if kernels.name != NumpyKernels.name:
+        difference = verify_kernels(processor, kernels)
+        if difference > VERIFY_TOLERANCE:
+            logger.error(f"Kernel backend {name} differs from numpy by {difference} levels; using numpy")
+            return NumpyKernels()
+        logger.info(f"Kernel backend {name} verified against numpy (max difference {difference})")
+    return kernels
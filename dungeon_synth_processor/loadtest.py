@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Load generator for the Dungeon Synth Image Processor
+Replays scripted editing sessions against the Flask app, either in-process
+through the test client or over HTTP against a running server
+"""
+
+import argparse
+import io
+import json
+import math
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from presets import PROCESSING_PRESETS, COLOR_TINTS
+
+# Slider ranges and steps as exposed by templates/index.html
+SLIDERS = {
+    'contrast': (0.5, 3.0, 0.1),
+    'brightness': (-100, 100, 5),
+    'threshold': (0, 255, 5),
+    'noise': (0, 50, 5),
+    'blur': (0, 5, 0.5)
+}
+
+DEFAULT_SLIDERS = {
+    'contrast': 1.5,
+    'brightness': 0,
+    'threshold': 128,
+    'noise': 20,
+    'blur': 0
+}
+
+
+def make_test_image(width, height, fmt='PNG', seed=0):
+    """Create a synthetic photo-like image with gradients, shapes and grain"""
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = (x / max(1, width - 1)) * 160 + (y / max(1, height - 1)) * 60
+    base += 40 * np.sin(x / 37.0) * np.cos(y / 53.0)
+    rgb = np.stack([base, base * 0.9 + 10, base * 0.8 + 20], axis=-1)
+    rgb += rng.normal(0, 12, rgb.shape)
+    rgb[height // 4:height // 2, width // 4:width // 2] *= 0.25
+    img = Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8))
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def read_rss_kb(pid=None):
+    """Return resident set size in kB for a process, or None if unknown"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+
+    if pid is None:
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except Exception:
+            pass
+    return None
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class RouteStats:
+    """Thread-safe latency and error bookkeeping per route label"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed):
+        """Build a per-route summary dictionary"""
+        with self.lock:
+            routes = {}
+            for route, values in sorted(self.latencies.items()):
+                ordered = sorted(values)
+                errors = self.errors.get(route, 0)
+                routes[route] = {
+                    'requests': len(ordered),
+                    'errors': errors,
+                    'error_rate': errors / len(ordered),
+                    'throughput_rps': len(ordered) / elapsed if elapsed > 0 else 0.0,
+                    'p50_ms': percentile(ordered, 50) * 1000,
+                    'p95_ms': percentile(ordered, 95) * 1000,
+                    'p99_ms': percentile(ordered, 99) * 1000,
+                    'max_ms': ordered[-1] * 1000
+                }
+            return routes
+
+
+class InProcessTransport:
+    """Drive the Flask app directly through its test client"""
+
+    def __init__(self):
+        from app import create_app
+        self.app = create_app()
+        self.local = threading.local()
+
+    def _client(self):
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        return self.local.client
+
+    def upload(self, name, data):
+        response = self._client().post(
+            '/upload',
+            data={'file': (io.BytesIO(data), name)},
+            content_type='multipart/form-data'
+        )
+        return response.status_code, response.get_json(silent=True)
+
+    def post_json(self, path, payload):
+        response = self._client().post(path, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+    def get(self, path, params):
+        response = self._client().get(path, query_string=params)
+        return response.status_code, len(response.data)
+
+    def post(self, path):
+        response = self._client().post(path)
+        return response.status_code, response.get_json(silent=True)
+
+    def server_rss_kb(self):
+        return read_rss_kb()
+
+
+class HTTPTransport:
+    """Drive a running server over HTTP"""
+
+    def __init__(self, base_url, server_pid=None):
+        import requests
+        self.requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.server_pid = server_pid
+        self.local = threading.local()
+
+    def _session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = self.requests.Session()
+        return self.local.session
+
+    def upload(self, name, data):
+        response = self._session().post(f"{self.base_url}/upload",
+                                        files={'file': (name, data)})
+        return response.status_code, self._json(response)
+
+    def post_json(self, path, payload):
+        response = self._session().post(f"{self.base_url}{path}", json=payload)
+        return response.status_code, self._json(response)
+
+    def get(self, path, params):
+        response = self._session().get(f"{self.base_url}{path}", params=params)
+        return response.status_code, len(response.content)
+
+    def post(self, path):
+        response = self._session().post(f"{self.base_url}{path}")
+        return response.status_code, self._json(response)
+
+    def server_rss_kb(self):
+        if self.server_pid is None:
+            return None
+        return read_rss_kb(self.server_pid)
+
+    @staticmethod
+    def _json(response):
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+
+class EditingSession:
+    """One scripted user session: upload, gallery, slider bursts, downloads, cleanup"""
+
+    def __init__(self, transport, stats, options, session_id):
+        self.transport = transport
+        self.stats = stats
+        self.options = options
+        self.seed = options.seed + session_id
+        self.rng = random.Random(self.seed)
+        self.tint = self.rng.choice(list(COLOR_TINTS.keys()))
+        self.preserve_aspect_ratio = self.rng.random() < 0.3
+
+    def _timed(self, route, call, *args):
+        start = time.perf_counter()
+        try:
+            status, body = call(*args)
+            ok = 200 <= status < 300
+        except Exception:
+            status, body, ok = None, None, False
+        self.stats.record(route, time.perf_counter() - start, ok)
+        return ok, body
+
+    def _think(self):
+        if self.options.think > 0:
+            time.sleep(self.rng.uniform(0, self.options.think))
+
+    def run(self):
+        ext = self.options.image_format.lower()
+        # A distinct image per session; identical uploads would share every
+        # cached render on the server and the report would measure cache hits
+        width, height = self.options.image_size
+        fmt = 'JPEG' if ext in ('jpg', 'jpeg') else 'PNG'
+        image_data = make_test_image(width, height, fmt, self.seed)
+        ok, body = self._timed('upload', self.transport.upload,
+                               f'session.{ext}', image_data)
+        if not ok or not body or not body.get('filename'):
+            return False
+        filename = body['filename']
+
+        # Preset gallery exactly as processAllPresets() requests it
+        for preset in PROCESSING_PRESETS.values():
+            params = {key: preset[key] for key in ('contrast', 'brightness', 'threshold',
+                                                   'noise', 'blur', 'method', 'texture')
+                      if key in preset}
+            params.update(filename=filename, color_tint=self.tint,
+                          preserve_aspect_ratio=self.preserve_aspect_ratio)
+            self._timed('process:gallery', self.transport.post_json, '/process', params)
+
+        # Slider drags arrive as bursts of custom renders
+        sliders = dict(DEFAULT_SLIDERS)
+        for _ in range(self.options.bursts):
+            self._think()
+            name = self.rng.choice(list(SLIDERS))
+            low, high, step = SLIDERS[name]
+            direction = self.rng.choice((-1, 1))
+            for _ in range(self.options.burst_length):
+                value = min(high, max(low, sliders[name] + direction * step))
+                sliders[name] = round(value, 2)
+                params = dict(sliders, filename=filename, method='custom',
+                              color_tint=self.tint,
+                              preserve_aspect_ratio=self.preserve_aspect_ratio)
+                self._timed('process:slider', self.transport.post_json, '/process', params)
+
+        for size in self.options.sizes:
+            self._think()
+            preset_name = self.rng.choice(['custom'] + list(PROCESSING_PRESETS))
+            query = {
+                'tint': self.tint,
+                'size': str(size),
+                'preserve_aspect_ratio': str(self.preserve_aspect_ratio).lower()
+            }
+            if preset_name == 'custom':
+                query.update({key: str(value) for key, value in sliders.items()})
+            self._timed(f'download:{size}', self.transport.get,
+                        f'/download/{preset_name}/{filename}', query)
+
+        ok, _ = self._timed('cleanup', self.transport.post, f'/cleanup/{filename}')
+        return ok
+
+
+class MemorySampler(threading.Thread):
+    """Track server RSS while the load runs"""
+
+    def __init__(self, transport, interval=0.5):
+        super().__init__(daemon=True)
+        self.transport = transport
+        self.interval = interval
+        self.peak_kb = None
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            rss = self.transport.server_rss_kb()
+            if rss is not None:
+                self.peak_kb = max(self.peak_kb or 0, rss)
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+def run_load(transport, options):
+    """Run all sessions and return a report dictionary"""
+    stats = RouteStats()
+    rss_start = transport.server_rss_kb()
+    sampler = MemorySampler(transport)
+    sampler.start()
+
+    total_sessions = options.users * options.sessions
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.users) as pool:
+        futures = [
+            pool.submit(EditingSession(transport, stats, options, i).run)
+            for i in range(total_sessions)
+        ]
+        completed = sum(1 for future in futures if future.result())
+    elapsed = time.perf_counter() - start
+
+    sampler.stop()
+    rss_end = transport.server_rss_kb()
+
+    routes = stats.summary(elapsed)
+    total_requests = sum(route['requests'] for route in routes.values())
+    total_errors = sum(route['errors'] for route in routes.values())
+
+    return {
+        'users': options.users,
+        'sessions': total_sessions,
+        'sessions_completed': completed,
+        'elapsed_s': elapsed,
+        'requests': total_requests,
+        'errors': total_errors,
+        'error_rate': total_errors / total_requests if total_requests else 0.0,
+        'throughput_rps': total_requests / elapsed if elapsed > 0 else 0.0,
+        'memory': {
+            'rss_start_kb': rss_start,
+            'rss_end_kb': rss_end,
+            'rss_peak_kb': sampler.peak_kb,
+            'rss_growth_kb': (rss_end - rss_start) if rss_start and rss_end else None
+        },
+        'routes': routes
+    }
+
+
+def print_report(report):
+    """Print a human readable report"""
+    print("=" * 78)
+    print("DUNGEON SYNTH IMAGE PROCESSOR - LOAD TEST REPORT")
+    print("=" * 78)
+    print(f"Users: {report['users']}  Sessions: {report['sessions_completed']}/{report['sessions']}  "
+          f"Elapsed: {report['elapsed_s']:.1f}s")
+    print(f"Requests: {report['requests']}  Throughput: {report['throughput_rps']:.1f} req/s  "
+          f"Errors: {report['errors']} ({report['error_rate'] * 100:.2f}%)")
+
+    memory = report['memory']
+    if memory['rss_start_kb'] is not None:
+        print(f"Server RSS: start {memory['rss_start_kb'] / 1024:.1f}MB, "
+              f"end {(memory['rss_end_kb'] or 0) / 1024:.1f}MB, "
+              f"peak {(memory['rss_peak_kb'] or 0) / 1024:.1f}MB, "
+              f"growth {(memory['rss_growth_kb'] or 0) / 1024:+.1f}MB")
+    else:
+        print("Server RSS: unavailable (pass --server-pid in http mode)")
+
+    print("-" * 78)
+    print(f"{'route':<18}{'reqs':>7}{'err%':>7}{'req/s':>8}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}{'maxms':>10}")
+    for route, row in report['routes'].items():
+        print(f"{route:<18}{row['requests']:>7}{row['error_rate'] * 100:>7.1f}"
+              f"{row['throughput_rps']:>8.2f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+    print("=" * 78)
+
+
+def parse_size(value):
+    """Parse WIDTHxHEIGHT"""
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+        return width, height
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected WIDTHxHEIGHT, got {value!r}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Replay editing sessions against the processor')
+    parser.add_argument('--mode', choices=['inprocess', 'http'], default='inprocess',
+                        help='Run through the Flask test client or against a server')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Server URL for http mode')
+    parser.add_argument('--server-pid', type=int, help='Server PID for memory tracking in http mode')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent editors')
+    parser.add_argument('--sessions', type=int, default=1, help='Sessions per editor')
+    parser.add_argument('--bursts', type=int, default=3, help='Slider bursts per session')
+    parser.add_argument('--burst-length', type=int, default=6, help='Renders per slider burst')
+    parser.add_argument('--sizes', default='400,1400,2000',
+                        type=lambda value: [int(size) for size in value.split(',') if size],
+                        help='Comma separated download sizes')
+    parser.add_argument('--image-size', type=parse_size, default=(1600, 1200),
+                        help='Uploaded image dimensions, WIDTHxHEIGHT')
+    parser.add_argument('--image-format', default='jpg', choices=['jpg', 'png'])
+    parser.add_argument('--think', type=float, default=0.0,
+                        help='Maximum random pause between user actions (seconds)')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--json', dest='json_path', help='Also write the report as JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    if options.mode == 'http':
+        transport = HTTPTransport(options.url, options.server_pid)
+    else:
+        transport = InProcessTransport()
+
+    report = run_load(transport, options)
+    print_report(report)
+
+    if options.json_path:
+        with open(options.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 0 if report['errors'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -138,6 +138,98 @@ PROCESSING_PRESETS = {
         'method': 'forest',
         'name': 'Forest Mystic',
         'description': 'Organic textures with deep green earth tone saturation'
+    },
+    
+    # DITHERED PHOTOCOPY PRESETS
+    'photocopyBayer': {
+        'contrast': 1.5,
+        'brightness': 5,
+        'threshold': 128,
+        'noise': 8,
+        'blur': 0.5,
+        'method': 'bayer',
+        'name': 'Photocopied Tape',
+        'description': 'Ordered Bayer dithering like a xeroxed demo tape inlay'
+    },
+    
+    'blueNoiseZine': {
+        'contrast': 1.4,
+        'brightness': 0,
+        'threshold': 128,
+        'noise': 6,
+        'blur': 0.8,
+        'method': 'bluenoise',
+        'name': 'Blue Noise Zine',
+        'description': 'Grainy blue-noise dithering without the Bayer cross-hatch'
+    },
+    
+    'diffusedFlyer': {
+        'contrast': 1.6,
+        'brightness': -5,
+        'threshold': 128,
+        'noise': 10,
+        'blur': 0.6,
+        'method': 'diffusion',
+        'name': 'Diffused Flyer',
+        'description': 'Floyd-Steinberg error diffusion with photocopied flyer grit'
+    },
+    
+    'atkinsonCodex': {
+        'contrast': 1.7,
+        'brightness': 0,
+        'threshold': 128,
+        'noise': 5,
+        'blur': 0.4,
+        'method': 'atkinson',
+        'name': 'Atkinson Codex',
+        'description': 'Atkinson diffusion with crisp, clean shadows like early bitmap art'
+    },
+    
+    # ENGRAVING PRESETS
+    'engravedHalftone': {
+        'contrast': 1.3,
+        'brightness': 5,
+        'threshold': 128,
+        'noise': 4,
+        'blur': 0.8,
+        'method': 'halftone',
+        'name': 'Engraved Halftone',
+        'description': 'Rotated round-dot halftone like a letterpress cassette J-card'
+    },
+    
+    'woodcutHatch': {
+        'contrast': 1.4,
+        'brightness': 0,
+        'threshold': 128,
+        'noise': 3,
+        'blur': 1.0,
+        'method': 'crosshatch',
+        'name': 'Woodcut Hatching',
+        'description': 'Multi-angle cross-hatching that deepens into the shadows'
+    },
+    
+    'inkedFolio': {
+        'contrast': 1.2,
+        'brightness': 10,
+        'threshold': 128,
+        'noise': 6,
+        'blur': 1.2,
+        'method': 'lineart',
+        'name': 'Inked Folio',
+        'description': 'Ink-drawn outlines over a pale wash, like a hand-drawn demo cover'
+    },
+    
+    # TEXTURED PRESETS
+    'agedGrimoire': {
+        'contrast': 1.3,
+        'brightness': 10,
+        'threshold': 120,
+        'noise': 12,
+        'blur': 0.8,
+        'method': 'manuscript',
+        'texture': 'parchment',
+        'name': 'Aged Grimoire',
+        'description': 'Manuscript processing printed onto mottled, procedurally aged parchment'
     }
 }
 
@@ -199,6 +291,31 @@ COLOR_TINTS = {
     }
 }
 
+# Paper textures blended into the processed image before tinting;
+# textures.py generates them
+TEXTURES = {
+    'none': {
+        'name': 'No Texture',
+        'opacity': 0.0,
+        'blend_mode': 'normal'
+    },
+    'parchment': {
+        'name': 'Aged Parchment',
+        'opacity': 0.85,
+        'blend_mode': 'multiply'
+    },
+    'fibers': {
+        'name': 'Paper Fibers',
+        'opacity': 0.70,
+        'blend_mode': 'multiply'
+    },
+    'stains': {
+        'name': 'Foxing Stains',
+        'opacity': 0.80,
+        'blend_mode': 'multiply'
+    }
+}
+
 # Default parameters for custom processing
 DEFAULT_PARAMS = {
     'contrast': 1.5,
@@ -222,6 +339,10 @@ def get_color_tint(name):
     """Get color tint by name"""
     return COLOR_TINTS.get(name, COLOR_TINTS['none'])
 
+def get_texture(name):
+    """Get paper texture by name"""
+    return TEXTURES.get(name, TEXTURES['none'])
+
 def list_presets():
     """Return list of available preset names"""
     return list(PROCESSING_PRESETS.keys())
@@ -230,6 +351,12 @@ def list_color_tints():
     """Return list of available color tint names"""
     return list(COLOR_TINTS.keys())
 
+def list_methods():
+    """Return processing method names used by presets, plus custom"""
+    methods = {preset['method'] for preset in PROCESSING_PRESETS.values()}
+    methods.add('custom')
+    return sorted(methods)
+
 def get_preset_info():
     """Return preset information for UI"""
     return {
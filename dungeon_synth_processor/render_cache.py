@@ -0,0 +1,140 @@
+"""
+Bounded in-memory caches for decoded sources and derived render artifacts
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+
+def estimate_nbytes(value):
+    """Approximate memory held by a cached value"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_nbytes(item) for item in value)
+    return 64
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache bounded by total bytes
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired_bytes = 0
+        self.lock = threading.Lock()
+        # Per-key locks so concurrent misses build a value only once
+        self.building = {}
+
+    def get(self, key):
+        """Return the cached value or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries[key] = (entry[0], entry[1], time.monotonic())
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_or_create(self, key, factory):
+        """Return the cached value, building it with factory() at most once at a time"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self.lock:
+            key_lock = self.building.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                with self.lock:
+                    entry = self.entries.get(key)
+                if entry is not None:
+                    return entry[0]
+                return self.put(key, factory())
+        finally:
+            with self.lock:
+                self.building.pop(key, None)
+
+    def put(self, key, value, nbytes=None):
+        """Insert a value, evicting least recently used entries to stay in budget"""
+        if nbytes is None:
+            nbytes = estimate_nbytes(value)
+        if nbytes > self.max_bytes:
+            return value
+
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self.entries[key] = (value, nbytes, time.monotonic())
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes, _) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+        return value
+
+    def discard_where(self, predicate):
+        """Drop every entry whose key matches predicate; returns the count"""
+        with self.lock:
+            doomed = [key for key in self.entries if predicate(key)]
+            for key in doomed:
+                self.current_bytes -= self.entries.pop(key)[1]
+            return len(doomed)
+
+    def expire_idle(self, max_age):
+        """Drop entries unused for max_age seconds; returns the bytes released"""
+        cutoff = time.monotonic() - max_age
+        released = 0
+        with self.lock:
+            # Entries are kept in use order, so the idle ones are all at the front
+            while self.entries:
+                key, (_, nbytes, used) = next(iter(self.entries.items()))
+                if used >= cutoff:
+                    break
+                del self.entries[key]
+                self.current_bytes -= nbytes
+                released += nbytes
+            self.expired_bytes += released
+        return released
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def stats(self):
+        """Snapshot of cache occupancy and hit rate"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'expired_bytes': self.expired_bytes
+            }
@@ -0,0 +1,223 @@
+"""
+One parameter schema for every render path
+Routes, batch jobs and exports normalize requests here so values are
+clamped, quantized for cache-friendliness and costed before any work starts
+"""
+
+import os
+import re
+from collections import namedtuple
+
+from presets import PROCESSING_PRESETS, COLOR_TINTS, TEXTURES, DEFAULT_PARAMS, list_methods
+from typography import (DEFAULT_FONT, DEFAULT_TEXT_BLEND, DEFAULT_TEXT_COLOR, DEFAULT_TEXT_POSITION,
+                        DEFAULT_TEXT_SIZE, MAX_TEXT_LENGTH, TEXT_BLEND_MODES, TEXT_POSITIONS)
+
+# Numeric parameters: (type, minimum, maximum, quantization step)
+PARAM_SCHEMA = {
+    'contrast': (float, 0.1, 5.0, 0.05),
+    'brightness': (int, -200, 200, 1),
+    'threshold': (int, 0, 255, 1),
+    'noise': (int, 0, 100, 1),
+    'blur': (float, 0.0, 10.0, 0.1)
+}
+
+# Band-logo text layer, see text_layer(); the size is a percentage of the shorter side
+TEXT_SCHEMA = {
+    'text_size': (float, 2.0, 30.0, 0.5)
+}
+HEX_COLOR = re.compile(r'^#?([0-9a-fA-F]{6})$')
+
+# Sliders that only remap tone, so a sweep can share the blurred luma plane
+SWEEP_PARAMS = ('threshold', 'contrast', 'brightness', 'noise')
+
+MIN_OUTPUT_SIZE = 64
+MAX_OUTPUT_SIZE = 8000
+
+# Relative cost of each pipeline stage, in passes over the output plane
+LUMA_STAGES = 4          # RGB to gray, brightness, clip, cast
+CONTRAST_STAGES = 2
+# Error diffusion walks the plane one anti-diagonal at a time; line art adds
+# two gradient planes and their magnitude
+METHOD_STAGES = {'custom': 0, 'atmospheric': 1, 'sepia': 1, 'comfy': 1, 'diffusion': 60, 'atkinson': 55,
+                 'lineart': 14}
+DEFAULT_METHOD_STAGES = 3
+GRAIN_STAGES = 2
+# manuscript and lithographic also repeat their grain cells up to full size
+COARSE_GRAIN_STAGES = 4
+COARSE_GRAIN_METHODS = ('manuscript', 'lithographic')
+TINT_STAGES = 12         # three float channels through the blend formula
+TEXTURE_STAGES = 3       # index build and table lookup
+TEXT_STAGES = 1          # blend under the text box, a small share of the plane
+ENCODE_STAGES = 10       # PNG filtering and deflate of three channels
+BLUR_STAGES_PER_RADIUS = 3
+RESAMPLE_STAGES = 1      # per source pixel, LANCZOS reduction
+
+RenderCost = namedtuple('RenderCost', ['width', 'height', 'pixels', 'stages', 'units'])
+
+
+class ParameterError(ValueError):
+    """Raised when a parameter cannot be interpreted at all"""
+
+
+def quantize(value, step):
+    """Snap value onto the schema grid so equivalent requests share cache keys"""
+    return round(round(value / step) * step, 4)
+
+
+def coerce_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def normalize_value(name, value, schema=PARAM_SCHEMA):
+    """Clamp and quantize one numeric parameter"""
+    kind, low, high, step = schema[name]
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ParameterError(f"Invalid value for {name}: {value!r}")
+    if number != number:  # NaN
+        raise ParameterError(f"Invalid value for {name}: {value!r}")
+
+    number = quantize(max(low, min(high, number)), step)
+    return int(round(number)) if kind is int else number
+
+
+def normalize_params(data, method=None):
+    """
+    Build a complete, clamped parameter dict from request data
+    Missing values fall back to DEFAULT_PARAMS; unknown methods, tints and
+    textures fall back to custom and none
+    """
+    params = {}
+    for name in PARAM_SCHEMA:
+        params[name] = normalize_value(name, data.get(name, DEFAULT_PARAMS[name]))
+
+    method = method or data.get('method', 'custom')
+    params['method'] = method if method in list_methods() else 'custom'
+
+    color_tint = data.get('color_tint', 'none')
+    params['color_tint'] = color_tint if color_tint in COLOR_TINTS else 'none'
+    # Only textured renders carry the key, so untextured digests, cache keys
+    # and grain stay what they were before textures existed
+    texture = data.get('texture', 'none')
+    if texture in TEXTURES and texture != 'none':
+        params['texture'] = texture
+    params['preserve_aspect_ratio'] = coerce_bool(data.get('preserve_aspect_ratio', False))
+    params.update(text_layer(data))
+    return params
+
+
+def text_layer(data):
+    """
+    Normalized band-logo parameters from request data, or an empty dict
+    without text, so renders without a logo keep their digests and cache keys
+    Lines are separated by newlines; unknown positions and blend modes fall
+    back to the defaults, and fonts are kept as bare file names
+    """
+    text = str(data.get('text') or '').replace('\r\n', '\n')
+    text = ''.join(char for char in text if char == '\n' or char.isprintable())
+    text = '\n'.join(line.strip() for line in text[:MAX_TEXT_LENGTH].strip().split('\n'))
+    if not text:
+        return {}
+
+    color = HEX_COLOR.match(str(data.get('text_color') or DEFAULT_TEXT_COLOR).strip())
+    if color is None:
+        raise ParameterError(f"Invalid value for text_color: {data.get('text_color')!r}")
+    position = data.get('text_position', DEFAULT_TEXT_POSITION)
+    blend = data.get('text_blend', DEFAULT_TEXT_BLEND)
+    return {
+        'text': text,
+        'text_font': os.path.basename(str(data.get('text_font') or DEFAULT_FONT)),
+        'text_size': normalize_value('text_size', data.get('text_size', DEFAULT_TEXT_SIZE), TEXT_SCHEMA),
+        'text_position': position if position in TEXT_POSITIONS else DEFAULT_TEXT_POSITION,
+        'text_blend': blend if blend in TEXT_BLEND_MODES else DEFAULT_TEXT_BLEND,
+        'text_color': f"#{color.group(1).lower()}"
+    }
+
+
+def preset_params(preset_name, color_tint='none', preserve_aspect_ratio=False):
+    """Normalized parameters for a named preset"""
+    if preset_name not in PROCESSING_PRESETS:
+        raise ParameterError(f"Unknown preset: {preset_name}")
+    preset = PROCESSING_PRESETS[preset_name]
+    return normalize_params({
+        **{name: preset[name] for name in PARAM_SCHEMA},
+        'method': preset['method'],
+        'texture': preset.get('texture', 'none'),
+        'color_tint': color_tint,
+        'preserve_aspect_ratio': preserve_aspect_ratio
+    })
+
+
+def sweep_values(name, count=9, start=None, stop=None, values=None):
+    """
+    Quantized values of one slider without duplicates: the given values, or
+    count evenly spaced points between start and stop (default: full range)
+    """
+    if name not in SWEEP_PARAMS:
+        raise ParameterError(f"Cannot sweep {name}; choose one of {', '.join(SWEEP_PARAMS)}")
+    if not values:
+        _, low, high, _ = PARAM_SCHEMA[name]
+        start = low if start is None else float(start)
+        stop = high if stop is None else float(stop)
+        count = max(2, int(count))
+        values = [start + (stop - start) * i / (count - 1) for i in range(count)]
+
+    swept = []
+    for value in values:
+        value = normalize_value(name, value)
+        if value not in swept:
+            swept.append(value)
+    return swept
+
+
+def normalize_size(value, max_size=MAX_OUTPUT_SIZE):
+    """Clamp a requested output edge length"""
+    try:
+        size = int(float(value))
+    except (TypeError, ValueError):
+        raise ParameterError(f"Invalid size: {value!r}")
+    return max(MIN_OUTPUT_SIZE, min(max_size, size))
+
+
+def output_dimensions(size, source_size=None, preserve_aspect_ratio=False):
+    """Dimensions a render at size will have, mirroring the crop/thumbnail logic"""
+    if not preserve_aspect_ratio or not source_size:
+        return size, size
+    width, height = source_size
+    # thumbnail() only ever shrinks
+    if width <= size and height <= size:
+        return width, height
+    scale = size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def estimate_cost(params, size, source_size=None, include_resample=False):
+    """
+    Estimate render work as pixels x stages, before anything is decoded
+    Blur adds passes proportional to its radius; resampling from the source
+    is only counted where it is not served from the preview base cache
+    """
+    width, height = output_dimensions(size, source_size, params.get('preserve_aspect_ratio'))
+    pixels = width * height
+    method = params.get('method', 'custom')
+
+    stages = LUMA_STAGES + CONTRAST_STAGES + ENCODE_STAGES
+    stages += METHOD_STAGES.get(method, DEFAULT_METHOD_STAGES)
+    if params.get('blur', 0) > 0:
+        stages += BLUR_STAGES_PER_RADIUS * (1 + params['blur'])
+    if params.get('noise', 0) > 0:
+        stages += COARSE_GRAIN_STAGES if method in COARSE_GRAIN_METHODS else GRAIN_STAGES
+    if params.get('color_tint', 'none') != 'none':
+        stages += TINT_STAGES
+    if params.get('texture', 'none') != 'none':
+        stages += TEXTURE_STAGES
+    if params.get('text'):
+        stages += TEXT_STAGES
+
+    units = pixels * stages
+    if include_resample and source_size:
+        units += source_size[0] * source_size[1] * RESAMPLE_STAGES
+    return RenderCost(width, height, pixels, stages, int(units))
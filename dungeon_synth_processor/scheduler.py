@@ -0,0 +1,186 @@
+"""
+Admission control and priority lanes in front of DungeonSynthProcessor
+Interactive previews, full-resolution renders and speculative pre-renders
+wait in separate bounded queues and share a fixed number of render slots;
+previews always win a free slot, heavy renders are capped so they cannot
+starve the sliders, and speculation only runs on slots nobody else wants
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+# max_share caps a lane at a fraction of the render slots unless
+# max_concurrent is given explicitly; max_cost bounds the estimated work
+# (render_params.estimate_cost units) a lane may have in flight at once
+DEFAULT_LANES = {
+    'preview': {'priority': 0, 'max_share': 1.0, 'max_queue': 64, 'queue_timeout': 10.0},
+    'render': {'priority': 1, 'max_share': 0.5, 'max_queue': 8, 'queue_timeout': 120.0,
+               'max_cost': 8_000_000_000},
+    # Background pre-rendering; gives up rather than wait long behind real work
+    'speculative': {'priority': 2, 'max_share': 0.25, 'max_queue': 4, 'queue_timeout': 30.0}
+}
+
+
+class SchedulerBusy(Exception):
+    """Raised when a lane is saturated; carries a Retry-After hint in seconds"""
+
+    def __init__(self, lane, retry_after, reason='queue full'):
+        super().__init__(f"{lane} lane busy ({reason})")
+        self.lane = lane
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class Lane:
+    """Bounded FIFO of waiting requests plus counters for one priority class"""
+
+    def __init__(self, name, priority, max_concurrent, max_queue, queue_timeout, max_cost=None):
+        self.name = name
+        self.priority = priority
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_cost = max_cost
+        self.queue = deque()
+        self.running = 0
+        self.running_cost = 0
+        self.total_cost = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    def average_run(self):
+        return self.total_run / self.completed if self.completed else 0.5
+
+    def stats(self):
+        return {
+            'priority': self.priority,
+            'running': self.running,
+            'queued': len(self.queue),
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'running_cost': self.running_cost,
+            'max_cost': self.max_cost,
+            'total_cost': self.total_cost,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'completed': self.completed,
+            'failed': self.failed,
+            'avg_wait_ms': self.total_wait / self.admitted * 1000 if self.admitted else 0.0,
+            'avg_run_ms': self.average_run() * 1000 if self.completed else 0.0
+        }
+
+
+class RenderScheduler:
+    """
+    Runs render callables on the caller's thread once a render slot is granted
+    """
+
+    def __init__(self, max_workers, lanes=None):
+        self.max_workers = max(1, int(max_workers))
+        self.running = 0
+        self.condition = threading.Condition()
+
+        # Lane settings are overrides on top of DEFAULT_LANES
+        configs = {name: dict(config) for name, config in DEFAULT_LANES.items()}
+        for name, overrides in (lanes or {}).items():
+            configs.setdefault(name, {}).update(overrides)
+
+        self.lanes = {}
+        for name, config in configs.items():
+            max_concurrent = config.get('max_concurrent') or max(
+                1, int(self.max_workers * config.get('max_share', 1.0)))
+            self.lanes[name] = Lane(
+                name,
+                config.get('priority', 0),
+                min(max_concurrent, self.max_workers),
+                config.get('max_queue', 16),
+                config.get('queue_timeout', 30.0),
+                config.get('max_cost')
+            )
+
+    def _retry_after(self, lane):
+        """Seconds until the lane's current backlog should have drained"""
+        backlog = len(lane.queue) + lane.running
+        return max(1, math.ceil(backlog * lane.average_run() / lane.max_concurrent))
+
+    def _can_start(self, lane, ticket, cost):
+        if lane.queue[0] is not ticket:
+            return False
+        if self.running >= self.max_workers or lane.running >= lane.max_concurrent:
+            return False
+        # Over-budget work waits for the lane to drain but always runs alone
+        if lane.max_cost and lane.running and lane.running_cost + cost > lane.max_cost:
+            return False
+        # A free slot goes to any higher-priority lane that could use it
+        for other in self.lanes.values():
+            if (other.priority < lane.priority and other.queue
+                    and other.running < other.max_concurrent):
+                return False
+        return True
+
+    def run(self, lane_name, fn, *args, cost=0, **kwargs):
+        """Run fn in the given lane, or raise SchedulerBusy if it cannot be admitted"""
+        lane = self.lanes[lane_name]
+        ticket = object()
+        enqueued = time.perf_counter()
+
+        with self.condition:
+            if len(lane.queue) >= lane.max_queue:
+                lane.rejected += 1
+                raise SchedulerBusy(lane_name, self._retry_after(lane))
+
+            lane.queue.append(ticket)
+            deadline = enqueued + lane.queue_timeout
+            while not self._can_start(lane, ticket, cost):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    lane.queue.remove(ticket)
+                    lane.timed_out += 1
+                    self.condition.notify_all()
+                    raise SchedulerBusy(lane_name, self._retry_after(lane), 'queue timeout')
+                self.condition.wait(remaining)
+
+            lane.queue.popleft()
+            lane.running += 1
+            lane.running_cost += cost
+            lane.total_cost += cost
+            lane.admitted += 1
+            lane.total_wait += time.perf_counter() - enqueued
+            self.running += 1
+            # Waiters behind this ticket, or in lower lanes, may now be able to start
+            self.condition.notify_all()
+
+        started = time.perf_counter()
+        succeeded = False
+        try:
+            result = fn(*args, **kwargs)
+            succeeded = True
+            return result
+        finally:
+            with self.condition:
+                lane.running -= 1
+                lane.running_cost -= cost
+                self.running -= 1
+                if succeeded:
+                    lane.completed += 1
+                    lane.total_run += time.perf_counter() - started
+                else:
+                    lane.failed += 1
+                self.condition.notify_all()
+
+    def stats(self):
+        """Snapshot of slot usage and per-lane queue counters"""
+        with self.condition:
+            return {
+                'max_workers': self.max_workers,
+                'running': self.running,
+                'lanes': {name: lane.stats() for name, lane in self.lanes.items()}
+            }
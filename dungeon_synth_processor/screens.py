@@ -0,0 +1,98 @@
+"""
+Halftone and hatching screens for the engraved look of old woodcuts
+A screen is a small uint8 threshold tile: a pixel stays white where the toned
+plane is above the tile repeated over it, and turns to ink elsewhere. Rotated
+screens use a rational angle, a cell vector (p, q) of whole pixels, so every
+screen repeats exactly on a square tile and one compare renders it at any
+size. Tiles are built once per process for each (angle, period)
+"""
+
+import math
+
+import numpy as np
+
+# Screen angle in degrees and period in pixels, one cell or line per period
+HALFTONE_SCREEN = (45, 6)
+
+# Cross-hatching: (angle, period, tone where lines appear, tone where they
+# reach full width). Each layer darkens a lower band, so hatching builds up
+# in the shadows
+HATCH_LAYERS = (
+    (45, 8, 240, 140),
+    (-45, 8, 180, 80),
+    (0, 8, 120, 20),
+    (90, 8, 60, 0)
+)
+# Widest hatch line, as a share of the period
+HATCH_LINE_WIDTH = 0.4
+
+_tiles = {}
+
+
+def screen_vector(angle, period):
+    """Whole-pixel cell vector (p, q) closest to a screen angle and period"""
+    radians = math.radians(angle)
+    p = int(round(period * math.cos(radians)))
+    q = int(round(period * math.sin(radians)))
+    if p == 0 and q == 0:
+        raise ValueError(f"Screen period {period} is too fine")
+    return p, q
+
+
+def screen_coordinates(angle, period, size=None):
+    """
+    Pixel-centre positions in screen cells, along and across the cell vector,
+    over a square tile of the given size (by default the smallest that repeats)
+    """
+    p, q = screen_vector(angle, period)
+    norm = p * p + q * q
+    if size is None:
+        size = norm // math.gcd(p, q)
+    y, x = np.mgrid[0:size, 0:size] + 0.5
+    return (p * x + q * y) / norm, (p * y - q * x) / norm, size
+
+
+def halftone_tile(angle=HALFTONE_SCREEN[0], period=HALFTONE_SCREEN[1]):
+    """Round-dot screen: thresholds rise towards each cell centre, so dots grow from it"""
+    key = ('halftone', angle, period)
+    tile = _tiles.get(key)
+    if tile is None:
+        along, across, size = screen_coordinates(angle, period)
+        distance = (along % 1 - 0.5) ** 2 + (across % 1 - 0.5) ** 2
+        # Rank every pixel of the tile so each gray level inks the same share of it
+        ranks = np.empty(distance.size, dtype=np.int64)
+        ranks[np.argsort(-distance, axis=None, kind='stable')] = np.arange(distance.size)
+        tile = ((ranks.reshape(size, size) + 0.5) * 256 / distance.size).astype(np.uint8)
+        _tiles[key] = tile
+    return tile
+
+
+def hatch_tile(layers=HATCH_LAYERS, line_width=HATCH_LINE_WIDTH):
+    """Cross-hatch screen: each layer's lines thicken across its band, and the darkest layer wins"""
+    key = ('hatch', layers, line_width)
+    tile = _tiles.get(key)
+    if tile is None:
+        size = 1
+        for angle, period, _, _ in layers:
+            size = math.lcm(size, screen_coordinates(angle, period)[2])
+        screen = np.zeros((size, size))
+        for angle, period, light, dark in layers:
+            along = screen_coordinates(angle, period, size)[0]
+            # 0 on a line's centre, 1 half way between lines; pixels beyond the
+            # widest line keep a zero threshold, so only pure black inks them
+            offset = np.abs(2 * (along % 1) - 1)
+            layer = np.where(offset <= line_width, light - offset / line_width * (light - dark), 0)
+            np.maximum(screen, layer, out=screen)
+        tile = np.clip(np.rint(screen), 0, 255).astype(np.uint8)
+        _tiles[key] = tile
+    return tile
+
+
+def tile_screen(tile, height, width):
+    """
+    A tile repeated over height + tile rows - 1 rows, anchored at the top-left
+    pixel; rows [r % tile rows, + height) line up with row r of a larger image
+    """
+    rows = height + tile.shape[0] - 1
+    reps = (-(-rows // tile.shape[0]), -(-width // tile.shape[1]))
+    return np.ascontiguousarray(np.tile(tile, reps)[:rows, :width])
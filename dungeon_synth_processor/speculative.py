@@ -0,0 +1,91 @@
+"""
+Speculative background rendering
+Work the client is likely to ask for next (the preset gallery right after an
+upload) is queued here and run in the scheduler's lowest-priority lane, one
+render per slot grant, so interactive requests always get the next free slot
+"""
+
+import logging
+import threading
+from collections import deque
+
+from scheduler import SchedulerBusy
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculativeRenderer:
+    """
+    Background threads feeding grouped jobs through the 'speculative' lane
+    Jobs are grouped by upload so a whole group can be cancelled at once
+    """
+
+    def __init__(self, scheduler, workers=1, max_pending=256, lane='speculative'):
+        self.scheduler = scheduler
+        self.lane = lane
+        self.max_pending = max_pending
+        self.jobs = deque()
+        self.condition = threading.Condition()
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.dropped = 0
+        self.failed = 0
+        self.threads = []
+        for index in range(max(0, workers)):
+            thread = threading.Thread(target=self._worker, name=f'speculative-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, group, fn, *args, cost=0):
+        """Queue fn(*args) under group; silently dropped when the backlog is full"""
+        if not self.threads:
+            return False
+        with self.condition:
+            if len(self.jobs) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.jobs.append((group, fn, args, cost))
+            self.submitted += 1
+            self.condition.notify()
+        return True
+
+    def cancel(self, group):
+        """Drop every queued job of group; returns how many were removed"""
+        with self.condition:
+            kept = deque(job for job in self.jobs if job[0] != group)
+            removed = len(self.jobs) - len(kept)
+            self.jobs = kept
+            self.cancelled += removed
+        return removed
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.condition.wait()
+                group, fn, args, cost = self.jobs.popleft()
+            try:
+                self.scheduler.run(self.lane, fn, *args, cost=cost)
+                with self.condition:
+                    self.completed += 1
+            except SchedulerBusy:
+                # Speculation is optional; never queue behind real load
+                with self.condition:
+                    self.dropped += 1
+            except Exception as e:
+                logger.warning(f"Speculative render for {group} failed: {str(e)}")
+                with self.condition:
+                    self.failed += 1
+
+    def stats(self):
+        with self.condition:
+            return {
+                'workers': len(self.threads),
+                'pending': len(self.jobs),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'cancelled': self.cancelled,
+                'dropped': self.dropped,
+                'failed': self.failed
+            }
@@ -7,15 +7,38 @@ class DungeonSynthApp {
         this.colorTints = {};
         this.preserveAspectRatio = false;
         this.processedImages = {}; // Store processed images for each preset
+        this.sweeps = {}; // Prefetched preview strips for tone sliders
+        this.tintLuts = null; // Gray-to-RGB table per color tint
+        this.toneBase = null; // Blurred luma and grain field for local previews
         this.initializeEventListeners();
         this.updateSliderDisplays();
         this.loadColorTints();
+        this.loadFonts();
+    }
+
+    async loadFonts() {
+        try {
+            const response = await fetch('/get_fonts');
+            const fonts = await response.json();
+            const select = document.getElementById('logoFont');
+            if (!select) return;
+            fonts.filter(font => font !== 'default').forEach(font => {
+                const option = document.createElement('option');
+                option.value = font;
+                option.textContent = font.replace(/\.(ttf|otf)$/i, '');
+                select.appendChild(option);
+            });
+        } catch (error) {
+            console.error('Failed to load fonts:', error);
+        }
     }
 
     async loadColorTints() {
         try {
             const response = await fetch('/get_color_tints');
             this.colorTints = await response.json();
+            const lutResponse = await fetch('/get_tint_luts');
+            this.tintLuts = await lutResponse.json();
         } catch (error) {
             console.error('Failed to load color tints:', error);
         }
@@ -37,11 +60,50 @@ class DungeonSynthApp {
             if (element) {
                 element.addEventListener('input', () => {
                     this.updateSliderDisplay(slider);
+                    // Tone sliders render locally or scrub through a prefetched
+                    // strip instead of a round trip per step
+                    if (!this.renderLocalTone(slider) && !this.showSweepFrame(slider)) {
+                        this.debounceCustomProcess();
+                    }
+                });
+            }
+        });
+
+        // The band logo is typeset on the server, over every render
+        ['logoText', 'logoFont', 'logoPosition', 'logoBlend', 'logoColor', 'logoSize'].forEach(id => {
+            const element = document.getElementById(id);
+            if (element) {
+                element.addEventListener(id === 'logoText' || id === 'logoSize' ? 'input' : 'change', () => {
+                    this.updateSliderDisplay('logoSize');
                     this.debounceCustomProcess();
                 });
             }
         });
 
+        // Paper textures are blended on the server
+        const textureSelect = document.getElementById('texture');
+        if (textureSelect) {
+            textureSelect.addEventListener('change', () => this.debounceCustomProcess());
+        }
+
+        // Prefetch a strip when a tone slider is grabbed; render for real only
+        // when it is released between sample points
+        SWEEP_SLIDERS.forEach(slider => {
+            const element = document.getElementById(slider);
+            if (element) {
+                element.addEventListener('pointerdown', () => this.prefetchPreviews(slider));
+                element.addEventListener('focus', () => this.prefetchPreviews(slider));
+                element.addEventListener('change', () => {
+                    // Local tone previews carry stand-in grain, so always confirm them
+                    if (!LOCAL_TONE_SLIDERS.includes(slider) && this.isSweepSample(slider)) {
+                        clearTimeout(this.customProcessTimeout);
+                    } else {
+                        this.debounceCustomProcess();
+                    }
+                });
+            }
+        });
+
         const aspectToggle = document.getElementById('preserveAspectRatio');
         if (aspectToggle) {
             aspectToggle.addEventListener('change', (e) => {
@@ -130,7 +192,15 @@ class DungeonSynthApp {
             'lithographic': { contrast: 1.8, brightness: 5, threshold: 130, noise: 20, blur: 0.3, method: 'lithographic' },
             'sepiaNostalgia': { contrast: 1.1, brightness: 20, threshold: 140, noise: 18, blur: 0.7, method: 'sepia' },
             'comfyHearth': { contrast: 1.0, brightness: 15, threshold: 160, noise: 12, blur: 1.2, method: 'comfy' },
-            'forestMystic': { contrast: 1.3, brightness: -10, threshold: 110, noise: 28, blur: 1.0, method: 'forest' }
+            'forestMystic': { contrast: 1.3, brightness: -10, threshold: 110, noise: 28, blur: 1.0, method: 'forest' },
+            'photocopyBayer': { contrast: 1.5, brightness: 5, threshold: 128, noise: 8, blur: 0.5, method: 'bayer' },
+            'blueNoiseZine': { contrast: 1.4, brightness: 0, threshold: 128, noise: 6, blur: 0.8, method: 'bluenoise' },
+            'diffusedFlyer': { contrast: 1.6, brightness: -5, threshold: 128, noise: 10, blur: 0.6, method: 'diffusion' },
+            'atkinsonCodex': { contrast: 1.7, brightness: 0, threshold: 128, noise: 5, blur: 0.4, method: 'atkinson' },
+            'engravedHalftone': { contrast: 1.3, brightness: 5, threshold: 128, noise: 4, blur: 0.8, method: 'halftone' },
+            'woodcutHatch': { contrast: 1.4, brightness: 0, threshold: 128, noise: 3, blur: 1.0, method: 'crosshatch' },
+            'inkedFolio': { contrast: 1.2, brightness: 10, threshold: 128, noise: 6, blur: 1.2, method: 'lineart' },
+            'agedGrimoire': { contrast: 1.3, brightness: 10, threshold: 120, noise: 12, blur: 0.8, method: 'manuscript', texture: 'parchment' }
         };
 
         const params = presets[presetName];
@@ -152,7 +222,15 @@ class DungeonSynthApp {
             'lithographic': 'lithographicImage',
             'sepiaNostalgia': 'sepiaNostalgiaImage',
             'comfyHearth': 'comfyHearthImage',
-            'forestMystic': 'forestMysticImage'
+            'forestMystic': 'forestMysticImage',
+            'photocopyBayer': 'photocopyBayerImage',
+            'blueNoiseZine': 'blueNoiseZineImage',
+            'diffusedFlyer': 'diffusedFlyerImage',
+            'atkinsonCodex': 'atkinsonCodexImage',
+            'engravedHalftone': 'engravedHalftoneImage',
+            'woodcutHatch': 'woodcutHatchImage',
+            'inkedFolio': 'inkedFolioImage',
+            'agedGrimoire': 'agedGrimoireImage'
         };
         
         this.displayProcessedImage(imageMap[presetName], preview);
@@ -280,16 +358,32 @@ class DungeonSynthApp {
 
             const formData = new FormData();
             formData.append('file', file);
-
-            const response = await fetch('/upload', {
-                method: 'POST',
-                body: formData
-            });
-
-            const result = await response.json();
+            // Lets the server pre-render the gallery with the settings it will be asked for
+            formData.append('color_tint', this.selectedColorTint);
+            formData.append('preserve_aspect_ratio', this.preserveAspectRatio);
+            Object.entries(this.getTextLayer()).forEach(([name, value]) => formData.append(name, value));
+
+            let result;
+            if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+                // Large files go up in resumable chunks so a dropped connection only costs one chunk
+                result = await this.uploadInChunks(file);
+            } else {
+                const response = await fetch('/upload', {
+                    method: 'POST',
+                    body: formData
+                });
+                result = await response.json();
+            }
 
             if (result.success) {
+                // Uploads are reference counted; let go of the one being replaced
+                const previousFilename = this.currentFilename;
                 this.currentFilename = result.filename;
+                if (previousFilename) {
+                    fetch(`/cleanup/${previousFilename}`, { method: 'POST' }).catch(error => {
+                        console.error('Cleanup error:', error);
+                    });
+                }
                 this.processedImages = {}; // Reset processed images
                 this.displayOriginalImage(result);
                 this.enableControls();
@@ -340,8 +434,12 @@ class DungeonSynthApp {
 
     enableControls() {
         const resetBtn = document.getElementById('resetBtn');
+        const exportBtn = document.getElementById('exportBtn');
+        const contactSheetBtn = document.getElementById('contactSheetBtn');
         
         if (resetBtn) resetBtn.disabled = false;
+        if (exportBtn) exportBtn.disabled = false;
+        if (contactSheetBtn) contactSheetBtn.disabled = false;
         
         document.querySelectorAll('.download-btn').forEach(btn => {
             btn.disabled = false;
@@ -382,10 +480,31 @@ class DungeonSynthApp {
             threshold: parseInt(document.getElementById('threshold')?.value || 128),
             noise: parseInt(document.getElementById('noise')?.value || 20),
             blur: parseFloat(document.getElementById('blur')?.value || 0),
-            preserve_aspect_ratio: this.preserveAspectRatio
+            texture: document.getElementById('texture')?.value || 'none',
+            preserve_aspect_ratio: this.preserveAspectRatio,
+            ...this.getTextLayer()
+        };
+    }
+
+    getTextLayer() {
+        // Only sent when there is text, so renders without a logo keep their cache keys
+        const text = (document.getElementById('logoText')?.value || '').trim();
+        if (!text) return {};
+        return {
+            text,
+            text_font: document.getElementById('logoFont')?.value || 'default',
+            text_size: parseFloat(document.getElementById('logoSize')?.value || 10),
+            text_position: document.getElementById('logoPosition')?.value || 'top',
+            text_blend: document.getElementById('logoBlend')?.value || 'normal',
+            text_color: document.getElementById('logoColor')?.value || '#e8e0d0'
         };
     }
 
+    textLayerQuery() {
+        const query = new URLSearchParams(this.getTextLayer()).toString();
+        return query ? `&${query}` : '';
+    }
+
     async applyPreset(presetName) {
         if (!this.currentFilename) {
             this.showStatus('Please upload an image first', 'error');
@@ -409,7 +528,15 @@ class DungeonSynthApp {
             'lithographic': { contrast: 1.8, brightness: 5, threshold: 130, noise: 20, blur: 0.3, method: 'lithographic' },
             'sepiaNostalgia': { contrast: 1.1, brightness: 20, threshold: 140, noise: 18, blur: 0.7, method: 'sepia' },
             'comfyHearth': { contrast: 1.0, brightness: 15, threshold: 160, noise: 12, blur: 1.2, method: 'comfy' },
-            'forestMystic': { contrast: 1.3, brightness: -10, threshold: 110, noise: 28, blur: 1.0, method: 'forest' }
+            'forestMystic': { contrast: 1.3, brightness: -10, threshold: 110, noise: 28, blur: 1.0, method: 'forest' },
+            'photocopyBayer': { contrast: 1.5, brightness: 5, threshold: 128, noise: 8, blur: 0.5, method: 'bayer' },
+            'blueNoiseZine': { contrast: 1.4, brightness: 0, threshold: 128, noise: 6, blur: 0.8, method: 'bluenoise' },
+            'diffusedFlyer': { contrast: 1.6, brightness: -5, threshold: 128, noise: 10, blur: 0.6, method: 'diffusion' },
+            'atkinsonCodex': { contrast: 1.7, brightness: 0, threshold: 128, noise: 5, blur: 0.4, method: 'atkinson' },
+            'engravedHalftone': { contrast: 1.3, brightness: 5, threshold: 128, noise: 4, blur: 0.8, method: 'halftone' },
+            'woodcutHatch': { contrast: 1.4, brightness: 0, threshold: 128, noise: 3, blur: 1.0, method: 'crosshatch' },
+            'inkedFolio': { contrast: 1.2, brightness: 10, threshold: 128, noise: 6, blur: 1.2, method: 'lineart' },
+            'agedGrimoire': { contrast: 1.3, brightness: 10, threshold: 120, noise: 12, blur: 0.8, method: 'manuscript', texture: 'parchment' }
         };
 
         const params = presets[presetName];
@@ -427,6 +554,8 @@ class DungeonSynthApp {
         if (thresholdSlider) thresholdSlider.value = params.threshold;
         if (noiseSlider) noiseSlider.value = params.noise;
         if (blurSlider) blurSlider.value = params.blur;
+        const textureSelect = document.getElementById('texture');
+        if (textureSelect) textureSelect.value = params.texture || 'none';
         
         this.updateSliderDisplays();
 
@@ -449,7 +578,15 @@ class DungeonSynthApp {
                 'lithographic': 'lithographicImage',
                 'sepiaNostalgia': 'sepiaNostalgiaImage',
                 'comfyHearth': 'comfyHearthImage',
-                'forestMystic': 'forestMysticImage'
+                'forestMystic': 'forestMysticImage',
+                'photocopyBayer': 'photocopyBayerImage',
+                'blueNoiseZine': 'blueNoiseZineImage',
+                'diffusedFlyer': 'diffusedFlyerImage',
+                'atkinsonCodex': 'atkinsonCodexImage',
+                'engravedHalftone': 'engravedHalftoneImage',
+                'woodcutHatch': 'woodcutHatchImage',
+                'inkedFolio': 'inkedFolioImage',
+                'agedGrimoire': 'agedGrimoireImage'
             };
             
             this.displayProcessedImage(imageMap[presetName] || 'customImage', preview);
@@ -495,7 +632,15 @@ class DungeonSynthApp {
             { name: 'lithographic', imageId: 'lithographicImage', params: { contrast: 1.8, brightness: 5, threshold: 130, noise: 20, blur: 0.3, method: 'lithographic' }},
             { name: 'sepiaNostalgia', imageId: 'sepiaNostalgiaImage', params: { contrast: 1.1, brightness: 20, threshold: 140, noise: 18, blur: 0.7, method: 'sepia' }},
             { name: 'comfyHearth', imageId: 'comfyHearthImage', params: { contrast: 1.0, brightness: 15, threshold: 160, noise: 12, blur: 1.2, method: 'comfy' }},
-            { name: 'forestMystic', imageId: 'forestMysticImage', params: { contrast: 1.3, brightness: -10, threshold: 110, noise: 28, blur: 1.0, method: 'forest' }}
+            { name: 'forestMystic', imageId: 'forestMysticImage', params: { contrast: 1.3, brightness: -10, threshold: 110, noise: 28, blur: 1.0, method: 'forest' }},
+            { name: 'photocopyBayer', imageId: 'photocopyBayerImage', params: { contrast: 1.5, brightness: 5, threshold: 128, noise: 8, blur: 0.5, method: 'bayer' }},
+            { name: 'blueNoiseZine', imageId: 'blueNoiseZineImage', params: { contrast: 1.4, brightness: 0, threshold: 128, noise: 6, blur: 0.8, method: 'bluenoise' }},
+            { name: 'diffusedFlyer', imageId: 'diffusedFlyerImage', params: { contrast: 1.6, brightness: -5, threshold: 128, noise: 10, blur: 0.6, method: 'diffusion' }},
+            { name: 'atkinsonCodex', imageId: 'atkinsonCodexImage', params: { contrast: 1.7, brightness: 0, threshold: 128, noise: 5, blur: 0.4, method: 'atkinson' }},
+            { name: 'engravedHalftone', imageId: 'engravedHalftoneImage', params: { contrast: 1.3, brightness: 5, threshold: 128, noise: 4, blur: 0.8, method: 'halftone' }},
+            { name: 'woodcutHatch', imageId: 'woodcutHatchImage', params: { contrast: 1.4, brightness: 0, threshold: 128, noise: 3, blur: 1.0, method: 'crosshatch' }},
+            { name: 'inkedFolio', imageId: 'inkedFolioImage', params: { contrast: 1.2, brightness: 10, threshold: 128, noise: 6, blur: 1.2, method: 'lineart' }},
+            { name: 'agedGrimoire', imageId: 'agedGrimoireImage', params: { contrast: 1.3, brightness: 10, threshold: 120, noise: 12, blur: 0.8, method: 'manuscript', texture: 'parchment' }}
         ];
 
         try {
@@ -529,10 +674,204 @@ class DungeonSynthApp {
         }
     }
 
+    prefetchPreviews(slider) {
+        if (LOCAL_TONE_SLIDERS.includes(slider)) {
+            this.prefetchToneBase();
+        } else {
+            this.prefetchSweep(slider);
+        }
+    }
+
+    toneBaseKey() {
+        const params = this.getCurrentParams();
+        return JSON.stringify([this.currentFilename, params.blur, this.preserveAspectRatio]);
+    }
+
+    async prefetchToneBase() {
+        if (!this.currentFilename) return;
+
+        const key = this.toneBaseKey();
+        if (this.toneBase && this.toneBase.key === key) return;
+
+        const toneBase = { key, ready: false };
+        this.toneBase = toneBase;
+        try {
+            const response = await fetch('/tone_base', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    filename: this.currentFilename,
+                    ...this.getCurrentParams()
+                })
+            });
+            const result = await response.json();
+            if (!response.ok || !result.success) {
+                throw new Error(result.error || `HTTP ${response.status}`);
+            }
+
+            toneBase.width = result.width;
+            toneBase.height = result.height;
+            toneBase.luma = await this.decodeGrayPlane(result.luma, result.width, result.height);
+            toneBase.grain = await this.decodeGrayPlane(result.grain, result.width, result.height);
+            toneBase.canvas = document.createElement('canvas');
+            toneBase.canvas.width = result.width;
+            toneBase.canvas.height = result.height;
+            toneBase.ready = true;
+        } catch (error) {
+            console.error('Tone base prefetch error:', error);
+            if (this.toneBase === toneBase) this.toneBase = null;
+        }
+    }
+
+    async decodeGrayPlane(dataUri, width, height) {
+        const img = new Image();
+        img.src = dataUri;
+        await img.decode();
+
+        const canvas = document.createElement('canvas');
+        canvas.width = width;
+        canvas.height = height;
+        const context = canvas.getContext('2d');
+        context.drawImage(img, 0, 0);
+
+        // Gray PNGs decode to RGBA with equal channels; keep one
+        const rgba = context.getImageData(0, 0, width, height).data;
+        const plane = new Uint8Array(width * height);
+        for (let i = 0; i < plane.length; i++) {
+            plane[i] = rgba[i * 4];
+        }
+        return plane;
+    }
+
+    renderLocalTone(slider) {
+        if (!LOCAL_TONE_SLIDERS.includes(slider)) return false;
+
+        const base = this.toneBase;
+        const tintLut = this.tintLuts?.[this.selectedColorTint];
+        if (!base || !base.ready || base.key !== this.toneBaseKey() || !tintLut) return false;
+
+        // Same order as the server's custom method: brightness, contrast, grain, tint
+        const params = this.getCurrentParams();
+        if (params.texture !== 'none' || params.text) return false;
+        const tone = new Float32Array(256);
+        for (let level = 0; level < 256; level++) {
+            const lifted = Math.min(255, Math.max(0, level + params.brightness));
+            tone[level] = Math.min(255, Math.max(0, (lifted - 128) * params.contrast + 128));
+        }
+
+        const context = base.canvas.getContext('2d');
+        const output = context.createImageData(base.width, base.height);
+        const pixels = output.data;
+        for (let i = 0; i < base.luma.length; i++) {
+            let value = tone[base.luma[i]];
+            if (params.noise > 0) {
+                value = Math.min(255, Math.max(0, value + (base.grain[i] / 255 - 0.5) * params.noise));
+            }
+            const row = Math.floor(value) * 3;
+            pixels[i * 4] = tintLut[row];
+            pixels[i * 4 + 1] = tintLut[row + 1];
+            pixels[i * 4 + 2] = tintLut[row + 2];
+            pixels[i * 4 + 3] = 255;
+        }
+        context.putImageData(output, 0, 0);
+
+        this.displayProcessedImage('customImage', base.canvas.toDataURL('image/png'));
+        return true;
+    }
+
+    sweepKey(slider) {
+        // A strip is only valid while everything except its own slider is unchanged
+        const params = this.getCurrentParams();
+        delete params[slider];
+        return JSON.stringify([this.currentFilename, this.selectedColorTint, params]);
+    }
+
+    async prefetchSweep(slider) {
+        if (!this.currentFilename) return;
+
+        const key = this.sweepKey(slider);
+        const existing = this.sweeps[slider];
+        if (existing && existing.key === key) return;
+
+        // Evenly spaced sample points, snapped to the slider's own steps
+        const element = document.getElementById(slider);
+        const min = parseFloat(element.min);
+        const max = parseFloat(element.max);
+        const step = parseFloat(element.step) || 1;
+        const values = [];
+        for (let i = 0; i < SWEEP_FRAMES; i++) {
+            const value = min + Math.round(((max - min) * i / (SWEEP_FRAMES - 1)) / step) * step;
+            values.push(parseFloat(value.toFixed(4)));
+        }
+
+        const sweep = { key, values: [], frames: [] };
+        this.sweeps[slider] = sweep;
+        try {
+            const response = await fetch('/process_sweep', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    filename: this.currentFilename,
+                    ...this.getCurrentParams(),
+                    method: 'custom',
+                    color_tint: this.selectedColorTint,
+                    slider,
+                    values
+                })
+            });
+            const result = await response.json();
+            if (!response.ok || !result.success) {
+                throw new Error(result.error || `HTTP ${response.status}`);
+            }
+
+            // Decode every frame up front so scrubbing never waits
+            sweep.values = result.values;
+            sweep.frames = result.frames;
+            sweep.frames.forEach(frame => { new Image().src = frame; });
+        } catch (error) {
+            console.error('Sweep prefetch error:', error);
+            delete this.sweeps[slider];
+        }
+    }
+
+    currentSweep(slider) {
+        const sweep = this.sweeps[slider];
+        if (!sweep || !sweep.frames.length || sweep.key !== this.sweepKey(slider)) return null;
+        return sweep;
+    }
+
+    showSweepFrame(slider) {
+        const sweep = this.currentSweep(slider);
+        if (!sweep) return false;
+
+        // Show the nearest sample while dragging
+        const value = parseFloat(document.getElementById(slider).value);
+        let nearest = 0;
+        sweep.values.forEach((sample, index) => {
+            if (Math.abs(sample - value) < Math.abs(sweep.values[nearest] - value)) {
+                nearest = index;
+            }
+        });
+        this.displayProcessedImage('customImage', sweep.frames[nearest]);
+        return true;
+    }
+
+    isSweepSample(slider) {
+        const sweep = this.currentSweep(slider);
+        if (!sweep) return false;
+        const value = parseFloat(document.getElementById(slider).value);
+        return sweep.values.some(sample => Math.abs(sample - value) < 1e-6);
+    }
+
     async processWithParams(params) {
         const requestData = {
             filename: this.currentFilename,
-            ...params
+            ...params,
+            ...this.getTextLayer()
         };
 
         const response = await fetch('/process', {
@@ -544,7 +883,9 @@ class DungeonSynthApp {
         });
 
         if (!response.ok) {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            // Parameter errors such as an unknown font carry their reason
+            const failure = await response.json().catch(() => ({}));
+            throw new Error(failure.error || `HTTP ${response.status}: ${response.statusText}`);
         }
 
         const result = await response.json();
@@ -569,6 +910,33 @@ class DungeonSynthApp {
         }
     }
 
+    exportAllPresets() {
+        if (!this.currentFilename) {
+            this.showStatus('Please upload an image first', 'error');
+            return;
+        }
+        
+        // Let the browser stream the ZIP straight to disk as entries finish
+        const outputSize = document.getElementById('outputSize')?.value || '400';
+        const a = document.createElement('a');
+        a.href = `/export/${this.currentFilename}?presets=all&tints=${this.selectedColorTint}&sizes=${outputSize}&preserve_aspect_ratio=${this.preserveAspectRatio}${this.textLayerQuery()}`;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        
+        this.showStatus('Export started - presets are added to the ZIP as they finish', 'success');
+    }
+
+    openContactSheet() {
+        if (!this.currentFilename) {
+            this.showStatus('Please upload an image first', 'error');
+            return;
+        }
+        
+        // One server-side render of every preset, labelled for client approval
+        window.open(`/contact_sheet/${this.currentFilename}?tint=${this.selectedColorTint}&preserve_aspect_ratio=${this.preserveAspectRatio}${this.textLayerQuery()}`, '_blank');
+    }
+
     async downloadProcessed(presetName) {
         if (!this.currentFilename) {
             this.showStatus('Please upload an image first', 'error');
@@ -593,8 +961,12 @@ class DungeonSynthApp {
                 url += `&threshold=${params.threshold}`;
                 url += `&noise=${params.noise}`;
                 url += `&blur=${params.blur}`;
+                url += `&texture=${params.texture}`;
             }
             
+            // The band logo goes on presets and custom renders alike
+            url += this.textLayerQuery();
+            
             this.showProcessingStatus(true, 'Downloading image...', 75);
             
             const response = await fetch(url);
@@ -661,6 +1033,8 @@ class DungeonSynthApp {
         if (thresholdSlider) thresholdSlider.value = 128;
         if (noiseSlider) noiseSlider.value = 20;
         if (blurSlider) blurSlider.value = 0;
+        const textureSelect = document.getElementById('texture');
+        if (textureSelect) textureSelect.value = 'none';
         
         this.updateSliderDisplays();
         
@@ -672,6 +1046,56 @@ class DungeonSynthApp {
         }
     }
 
+    async uploadInChunks(file) {
+        const created = await fetch('/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ size: file.size, filename: file.name })
+        });
+        let session = await created.json();
+        if (!created.ok) return session;
+
+        const uploadUrl = `/uploads/${session.upload_id}`;
+        let failures = 0;
+        while (session.offset < session.size) {
+            const end = Math.min(session.offset + session.chunk_size, session.size);
+            try {
+                const response = await fetch(`${uploadUrl}?offset=${session.offset}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: file.slice(session.offset, end)
+                });
+                const result = await response.json();
+                if (response.ok || response.status === 409) {
+                    // 409 carries the offset the server actually has
+                    session = result;
+                    failures = 0;
+                } else if (response.status < 500) {
+                    return result;
+                } else {
+                    throw new Error(result.error);
+                }
+            } catch (error) {
+                if (++failures > CHUNK_RETRIES) throw new Error('Upload interrupted. Please try again.');
+                await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+                session = await (await fetch(uploadUrl)).json();
+            }
+            const percent = Math.round(10 * session.offset / session.size);
+            this.showProcessingStatus(true, 'Uploading image...', percent);
+        }
+
+        const response = await fetch(`${uploadUrl}/finalize`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                color_tint: this.selectedColorTint,
+                preserve_aspect_ratio: this.preserveAspectRatio,
+                ...this.getTextLayer()
+            })
+        });
+        return response.json();
+    }
+
     async cleanup() {
         if (this.currentFilename) {
             try {
@@ -683,6 +1107,16 @@ class DungeonSynthApp {
     }
 }
 
+// Files above this size are uploaded in resumable chunks
+const CHUNKED_UPLOAD_THRESHOLD = 4 * 1024 * 1024;
+const CHUNK_RETRIES = 5;
+
+// Tone sliders that can be scrubbed through a prefetched preview strip
+const SWEEP_SLIDERS = ['contrast', 'brightness', 'threshold', 'noise'];
+// Pure per-pixel remaps of the blurred luma, previewed on a canvas without the server
+const LOCAL_TONE_SLIDERS = ['contrast', 'brightness'];
+const SWEEP_FRAMES = 11;
+
 // Global functions for button onclick handlers
 let app;
 
@@ -706,6 +1140,14 @@ function downloadProcessed(presetName) {
     if (app) app.downloadProcessed(presetName);
 }
 
+function exportAllPresets() {
+    if (app) app.exportAllPresets();
+}
+
+function openContactSheet() {
+    if (app) app.openContactSheet();
+}
+
 // Initialize app when page loads
 document.addEventListener('DOMContentLoaded', function() {
     app = new DungeonSynthApp();
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Allocation audit: peak bytes allocated per megapixel by every processing method
+Runs the processor in-process under tracemalloc, no server needed
+"""
+
+import sys
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from dither import DIFFUSION_WEIGHTS
+from image_processor import DungeonSynthProcessor, STRIP_MIN_PIXELS
+from presets import list_methods
+from render_params import normalize_params
+
+# Peak bytes per megapixel of one render, with headroom over what the
+# pipeline needs today; a new full-size temporary costs 8 MB/MP as float64
+WHOLE_IMAGE_BUDGET = 40 * 1024 * 1024
+STRIP_BUDGET = 16 * 1024 * 1024
+
+def budget_for(label, method):
+    """Error diffusion never renders in strips, so it keeps the whole-image budget"""
+    if label == 'strips' and method not in DIFFUSION_WEIGHTS:
+        return STRIP_BUDGET
+    return WHOLE_IMAGE_BUDGET
+
+def create_test_image(width, height):
+    """Random RGB image of the given size"""
+    rng = np.random.RandomState(7)
+    return Image.fromarray(rng.randint(0, 256, (height, width, 3), dtype=np.uint8))
+
+def peak_per_megapixel(processor, image, params):
+    """Peak bytes allocated by one render of image, per megapixel"""
+    # Warm the tint tables and thread pool so only the render itself is measured
+    processor._process_and_tint(image, params)
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        processor._process_and_tint(image, params)
+        peak = tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+    return peak / (image.width * image.height / 1e6)
+
+def test_allocations():
+    print("Testing Allocation Budgets")
+    print("=" * 50)
+
+    processor = DungeonSynthProcessor(strip_workers=1)
+    whole = create_test_image(1000, 1000)
+    strips = create_test_image(2500, (STRIP_MIN_PIXELS + 2499) // 2500)
+    ok = True
+
+    try:
+        for label, image in (('whole image', whole), ('strips', strips)):
+            for method in list_methods():
+                budget = budget_for(label, method)
+                for tint in ('none', 'sepia'):
+                    params = normalize_params({'method': method, 'color_tint': tint,
+                                               'noise': 30, 'blur': 1.0})
+                    per_mp = peak_per_megapixel(processor, image, params)
+                    if per_mp > budget:
+                        print(f"✗ {label} {method}/{tint}: {per_mp / 1e6:.1f} MB/MP "
+                              f"exceeds {budget / 1e6:.1f} MB/MP")
+                        ok = False
+                    else:
+                        print(f"✓ {label} {method}/{tint}: {per_mp / 1e6:.1f} MB/MP")
+
+        if ok:
+            print("\n✅ All allocation budgets met!")
+        return ok
+
+    finally:
+        processor.cleanup()
+
+if __name__ == "__main__":
+    success = test_allocations()
+    sys.exit(0 if success else 1)
@@ -14,6 +14,7 @@ from PIL import Image
 import io
 import base64
 import tempfile
+import zipfile
 
 # Configuration
 BASE_URL = "http://localhost:5000"
@@ -133,7 +134,15 @@ def test_all_presets(filename):
         ('lithographic', { 'contrast': 1.8, 'brightness': 5, 'threshold': 130, 'noise': 20, 'blur': 0.3, 'method': 'lithographic' }),
         ('sepiaNostalgia', { 'contrast': 1.1, 'brightness': 20, 'threshold': 140, 'noise': 18, 'blur': 0.7, 'method': 'sepia' }),
         ('comfyHearth', { 'contrast': 1.0, 'brightness': 15, 'threshold': 160, 'noise': 12, 'blur': 1.2, 'method': 'comfy' }),
-        ('forestMystic', { 'contrast': 1.3, 'brightness': -10, 'threshold': 110, 'noise': 28, 'blur': 1.0, 'method': 'forest' })
+        ('forestMystic', { 'contrast': 1.3, 'brightness': -10, 'threshold': 110, 'noise': 28, 'blur': 1.0, 'method': 'forest' }),
+        ('photocopyBayer', { 'contrast': 1.5, 'brightness': 5, 'threshold': 128, 'noise': 8, 'blur': 0.5, 'method': 'bayer' }),
+        ('blueNoiseZine', { 'contrast': 1.4, 'brightness': 0, 'threshold': 128, 'noise': 6, 'blur': 0.8, 'method': 'bluenoise' }),
+        ('diffusedFlyer', { 'contrast': 1.6, 'brightness': -5, 'threshold': 128, 'noise': 10, 'blur': 0.6, 'method': 'diffusion' }),
+        ('atkinsonCodex', { 'contrast': 1.7, 'brightness': 0, 'threshold': 128, 'noise': 5, 'blur': 0.4, 'method': 'atkinson' }),
+        ('engravedHalftone', { 'contrast': 1.3, 'brightness': 5, 'threshold': 128, 'noise': 4, 'blur': 0.8, 'method': 'halftone' }),
+        ('woodcutHatch', { 'contrast': 1.4, 'brightness': 0, 'threshold': 128, 'noise': 3, 'blur': 1.0, 'method': 'crosshatch' }),
+        ('inkedFolio', { 'contrast': 1.2, 'brightness': 10, 'threshold': 128, 'noise': 6, 'blur': 1.2, 'method': 'lineart' }),
+        ('agedGrimoire', { 'contrast': 1.3, 'brightness': 10, 'threshold': 120, 'noise': 12, 'blur': 0.8, 'method': 'manuscript', 'texture': 'parchment' })
     ]
     
     all_passed = True
@@ -261,6 +270,22 @@ def test_download_sizes(filename):
     
     return all_passed
 
+def test_indexed_download(filename):
+    """Test that a repeated download is served from the recorded render via the upload index"""
+    try:
+        url = f"{BASE_URL}/download/custom/{filename}?tint=none&size=400&preserve_aspect_ratio=false"
+        first = requests.get(url)
+        before = requests.get(f"{BASE_URL}/stats").json()['upload_index']['hits']
+        second = requests.get(url)
+        after = requests.get(f"{BASE_URL}/stats").json()['upload_index']['hits']
+        ok = (first.status_code == 200 and second.status_code == 200
+              and first.content == second.content and after > before)
+        log_test("Indexed Download", ok, f"Index hits during repeat: {after - before}")
+        return ok
+    except Exception as e:
+        log_test("Indexed Download", False, str(e))
+        return False
+
 def test_download_with_aspect_ratio(filename):
     """Test download with aspect ratio preserved"""
     try:
@@ -312,6 +337,71 @@ def test_download_with_aspect_ratio(filename):
         log_test("Download with Aspect Ratio", False, str(e))
         return False
 
+def test_duplicate_upload(image_path, filename):
+    """Test that re-uploading identical bytes shares the stored source"""
+    try:
+        with open(image_path, 'rb') as f:
+            files = {'file': ('again.png', f, 'image/png')}
+            response = requests.post(f"{BASE_URL}/upload", files=files)
+        data = response.json()
+        if response.status_code != 200 or data.get('filename') != filename or not data.get('deduplicated'):
+            log_test("Duplicate Upload", False, f"Status code: {response.status_code}, {data.get('filename')}")
+            return False
+        
+        # Releasing the second handle must leave the first one usable
+        released = requests.post(f"{BASE_URL}/cleanup/{filename}").json()
+        still_usable = test_processing(filename, {'method': 'manuscript'}, "Processing After Release")
+        ok = released.get('references') == 1 and still_usable
+        log_test("Duplicate Upload", ok, f"References left: {released.get('references')}")
+        return ok
+    except Exception as e:
+        log_test("Duplicate Upload", False, str(e))
+        return False
+
+def test_chunked_upload(image_path, filename):
+    """Test the resumable create / PUT chunks / finalize upload protocol"""
+    try:
+        with open(image_path, 'rb') as f:
+            content = f.read()
+        session = requests.post(f"{BASE_URL}/uploads", json={'size': len(content), 'filename': 'chunked.png'}).json()
+        upload_url = f"{BASE_URL}/uploads/{session['upload_id']}"
+        
+        middle = len(content) // 2
+        requests.put(f"{upload_url}?offset=0", data=content[:middle])
+        # A chunk at the wrong offset is refused with the offset to resume from
+        conflict = requests.put(f"{upload_url}?offset=0", data=content[:middle])
+        resume_at = requests.get(upload_url).json()['offset']
+        requests.put(f"{upload_url}?offset={resume_at}", data=content[resume_at:])
+        result = requests.post(f"{upload_url}/finalize", json={}).json()
+        
+        ok = (conflict.status_code == 409 and conflict.json()['offset'] == middle
+              and resume_at == middle and result.get('filename') == filename)
+        if ok:
+            requests.post(f"{BASE_URL}/cleanup/{filename}")
+        log_test("Chunked Upload", ok, f"Resumed at {resume_at}, stored as {result.get('filename')}")
+        return ok
+    except Exception as e:
+        log_test("Chunked Upload", False, str(e))
+        return False
+
+def test_raw_upload(image_path, filename):
+    """Test raw application/octet-stream uploads and header sniffing"""
+    try:
+        with open(image_path, 'rb') as f:
+            response = requests.post(f"{BASE_URL}/upload", data=f.read(),
+                                     headers={'Content-Type': 'application/octet-stream'})
+        result = response.json()
+        rejected = requests.post(f"{BASE_URL}/upload", data=b'definitely not an image',
+                                 headers={'Content-Type': 'application/octet-stream'})
+        ok = result.get('filename') == filename and rejected.status_code == 415
+        if result.get('filename'):
+            requests.post(f"{BASE_URL}/cleanup/{result['filename']}")
+        log_test("Raw Upload", ok, f"Stored as {result.get('filename')}, garbage got {rejected.status_code}")
+        return ok
+    except Exception as e:
+        log_test("Raw Upload", False, str(e))
+        return False
+
 def test_cleanup(filename):
     """Test file cleanup"""
     try:
@@ -326,6 +416,258 @@ def test_cleanup(filename):
         log_test("File Cleanup", False, str(e))
         return False
 
+def test_export_zip(filename):
+    """Test the streaming ZIP export of a presets x tints x sizes matrix"""
+    try:
+        url = (f"{BASE_URL}/export/{filename}?presets=threshold,medieval"
+               f"&tints=none,sepia&sizes=400,1400&preserve_aspect_ratio=true")
+        response = requests.get(url, stream=True)
+        if response.status_code != 200:
+            log_test("Export ZIP", False, f"Status code: {response.status_code}")
+            return False
+        
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            names = archive.namelist()
+            sizes = {Image.open(io.BytesIO(archive.read(name))).size for name in names}
+        
+        # 800x600 fits inside 1400 unchanged and shrinks to 400x300
+        if len(names) == 8 and sizes == {(400, 300), (800, 600)} and 'errors.txt' not in names:
+            log_test("Export ZIP", True, f"{len(names)} entries")
+            return True
+        log_test("Export ZIP", False, f"Entries: {names}, sizes: {sizes}")
+        return False
+    except Exception as e:
+        log_test("Export ZIP", False, str(e))
+        return False
+
+def test_export_duplicates(filename):
+    """Test that repeated presets and sizes beyond a kept shape's source export once"""
+    try:
+        url = (f"{BASE_URL}/export/{filename}?presets=threshold,threshold"
+               f"&tints=none,none&sizes=1400,2000&preserve_aspect_ratio=true")
+        response = requests.get(url)
+        if response.status_code != 200:
+            log_test("Export Duplicates", False, f"Status code: {response.status_code}")
+            return False
+        
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            names = [info.filename for info in archive.infolist()]
+        
+        # 800x600 comes out unchanged at both sizes
+        if names == ['dungeon_synth_threshold_800x600.png']:
+            log_test("Export Duplicates", True, f"Entries: {names}")
+            return True
+        log_test("Export Duplicates", False, f"Entries: {names}")
+        return False
+    except Exception as e:
+        log_test("Export Duplicates", False, str(e))
+        return False
+
+def test_process_sweep(filename):
+    """Test that a slider sweep returns frames identical to single previews"""
+    try:
+        params = {'contrast': 1.5, 'brightness': 0, 'threshold': 128, 'noise': 20, 'blur': 1.0,
+                  'method': 'custom', 'color_tint': 'sepia', 'preserve_aspect_ratio': False}
+        response = requests.post(f"{BASE_URL}/process_sweep", json={
+            'filename': filename, **params, 'slider': 'threshold', 'values': [0, 60, 125, 255]
+        })
+        if response.status_code != 200:
+            log_test("Process Sweep", False, f"Status code: {response.status_code}")
+            return False
+        
+        result = response.json()
+        if result['values'] != [0, 60, 125, 255] or len(result['frames']) != 4:
+            log_test("Process Sweep", False, f"Values: {result['values']}")
+            return False
+        
+        single = requests.post(f"{BASE_URL}/process", json={'filename': filename, **params, 'threshold': 60})
+        if single.json().get('preview') == result['frames'][1]:
+            log_test("Process Sweep", True, "4 frames match single previews")
+            return True
+        log_test("Process Sweep", False, "Sweep frame differs from /process preview")
+        return False
+    except Exception as e:
+        log_test("Process Sweep", False, str(e))
+        return False
+
+def test_tone_base(filename):
+    """Test the luma base and tint tables used for client-side tone previews"""
+    try:
+        response = requests.post(f"{BASE_URL}/tone_base", json={'filename': filename, 'blur': 1.5})
+        luts = requests.get(f"{BASE_URL}/get_tint_luts").json()
+        if response.status_code != 200:
+            log_test("Tone Base", False, f"Status code: {response.status_code}")
+            return False
+        
+        result = response.json()
+        luma = Image.open(io.BytesIO(base64.b64decode(result['luma'].split(',')[1])))
+        if luma.mode == 'L' and luma.size == (400, 400) and len(luts['none']) == 768 and luts['none'][-3:] == [255, 255, 255]:
+            log_test("Tone Base", True, f"Luma {luma.size[0]}x{luma.size[1]}, {len(luts)} tint tables")
+            return True
+        log_test("Tone Base", False, f"Unexpected luma {luma.mode} {luma.size}")
+        return False
+    except Exception as e:
+        log_test("Tone Base", False, str(e))
+        return False
+
+def test_contact_sheet(filename):
+    """Test the labelled contact sheet of every preset"""
+    try:
+        response = requests.get(f"{BASE_URL}/contact_sheet/{filename}?tint=sepia&tile=200&columns=4")
+        if response.status_code != 200:
+            log_test("Contact Sheet", False, f"Status code: {response.status_code}")
+            return False
+        
+        # 20 presets in 4 columns: 5 rows of 200px tiles with gutters and labels
+        img = Image.open(io.BytesIO(response.content))
+        if img.format == 'PNG' and img.size == (4 * 216 + 16, 5 * 248 + 16):
+            log_test("Contact Sheet", True, f"Size: {img.size[0]}x{img.size[1]}")
+            return True
+        log_test("Contact Sheet", False, f"Unexpected image: {img.format} {img.size}")
+        return False
+    except Exception as e:
+        log_test("Contact Sheet", False, str(e))
+        return False
+
+def test_text_layer(filename):
+    """Test the band-logo text layer on previews, preset downloads and exports"""
+    try:
+        fonts = requests.get(f"{BASE_URL}/get_fonts").json()
+        logo = {'text': 'MORTIIS\nEra I', 'text_size': 12, 'text_position': 'top', 'text_blend': 'normal',
+                'text_color': '#e8e0d0'}
+        params = {'filename': filename, 'contrast': 1.4, 'brightness': -5, 'threshold': 120, 'noise': 0,
+                  'blur': 0.8, 'method': 'manuscript', 'color_tint': 'sepia'}
+        plain = requests.post(f"{BASE_URL}/process", json=params).json()['preview']
+        lettered = requests.post(f"{BASE_URL}/process", json={**params, **logo}).json()['preview']
+        
+        def decode(uri):
+            return Image.open(io.BytesIO(base64.b64decode(uri.split(',')[1]))).convert('RGB')
+        plain_image, lettered_image = decode(plain), decode(lettered)
+        # Text at the top changes the top of the render and leaves the bottom alone
+        top_changed = plain_image.crop((0, 0, 400, 100)).tobytes() != lettered_image.crop((0, 0, 400, 100)).tobytes()
+        bottom_same = plain_image.crop((0, 300, 400, 400)).tobytes() == lettered_image.crop((0, 300, 400, 400)).tobytes()
+        
+        query = '&'.join(f"{key}={requests.utils.quote(str(value))}" for key, value in logo.items())
+        download = requests.get(f"{BASE_URL}/download/medieval/{filename}?tint=sepia&size=1400&{query}")
+        export = requests.get(f"{BASE_URL}/export/{filename}?presets=threshold,medieval&tints=none&sizes=400&{query}")
+        with zipfile.ZipFile(io.BytesIO(export.content)) as archive:
+            exported = [name for name in archive.namelist() if name != 'errors.txt']
+        unknown = requests.get(f"{BASE_URL}/download/medieval/{filename}?size=400&text=X&text_font=missing.ttf")
+        # The reason reaches the UI, not only the status
+        unknown_preview = requests.post(f"{BASE_URL}/process", json={**params, 'text': 'X', 'text_font': 'missing.ttf'})
+        atlases = requests.get(f"{BASE_URL}/stats").json()['caches']['glyph_atlases']
+        
+        ok = ('default' in fonts and top_changed and bottom_same and download.status_code == 200
+              and len(exported) == 2 and unknown.status_code == 400 and atlases['hits'] > 0
+              and unknown_preview.status_code == 400 and 'missing.ttf' in unknown_preview.json()['error'])
+        log_test("Text Layer", ok, f"Fonts: {len(fonts)}, export entries: {len(exported)}, "
+                                   f"unknown font: {unknown.status_code}, atlases: {atlases}")
+        return ok
+    except Exception as e:
+        log_test("Text Layer", False, str(e))
+        return False
+
+def test_speculative_gallery():
+    """Test that the preset gallery is pre-rendered in the background after upload"""
+    try:
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            speculative = requests.get(f"{BASE_URL}/stats").json().get('speculative', {})
+            if speculative.get('pending') == 0 and speculative.get('completed', 0) >= 12:
+                log_test("Speculative Gallery", True, f"Completed: {speculative['completed']}")
+                return True
+            time.sleep(0.5)
+        log_test("Speculative Gallery", False, f"Stats: {speculative}")
+        return False
+    except Exception as e:
+        log_test("Speculative Gallery", False, str(e))
+        return False
+
+def test_speculative_logo():
+    """Test that an upload sent with a band logo pre-renders the gallery with that logo"""
+    try:
+        logo = {'text': 'Burzum', 'text_size': 12, 'text_position': 'bottom', 'text_blend': 'normal',
+                'text_color': '#e8e0d0'}
+        buffer = io.BytesIO()
+        Image.new('RGB', (320, 240), color=(90, 60, 30)).save(buffer, 'PNG')
+        upload = requests.post(f"{BASE_URL}/upload", files={'file': ('logo.png', buffer.getvalue(), 'image/png')},
+                               data={'color_tint': 'none', 'preserve_aspect_ratio': 'false', **logo}).json()
+        filename = upload['filename']
+        
+        deadline = time.time() + 30
+        while time.time() < deadline and requests.get(f"{BASE_URL}/stats").json()['speculative']['pending']:
+            time.sleep(0.5)
+        
+        # The gallery's request for a preset, as processAllPresets() sends it with a logo set
+        preset = requests.get(f"{BASE_URL}/get_presets").json()['threshold']
+        params = {name: preset[name] for name in ('contrast', 'brightness', 'threshold', 'noise', 'blur', 'method')}
+        hits = requests.get(f"{BASE_URL}/stats").json()['caches']['processed']['hits']
+        response = requests.post(f"{BASE_URL}/process", json={'filename': filename, **params, 'color_tint': 'none',
+                                                              'preserve_aspect_ratio': False, **logo})
+        hit = requests.get(f"{BASE_URL}/stats").json()['caches']['processed']['hits'] > hits
+        requests.post(f"{BASE_URL}/cleanup/{filename}")
+        
+        ok = response.status_code == 200 and hit
+        log_test("Speculative Logo", ok, f"Status: {response.status_code}, cache hit: {hit}")
+        return ok
+    except Exception as e:
+        log_test("Speculative Logo", False, str(e))
+        return False
+
+def test_janitor_stats():
+    """Test that the janitor reports its limits and reclaimed bytes"""
+    try:
+        janitor = requests.get(f"{BASE_URL}/stats").json().get('janitor', {})
+        ok = (set(janitor.get('reclaimed_bytes', {})) == {'upload', 'render', 'partial', 'cache'}
+              and janitor.get('ttls', {}).get('upload', 0) > 0)
+        log_test("Janitor Stats", ok, f"Sweeps: {janitor.get('sweeps')}, quota: {janitor.get('quota_bytes')}")
+        return ok
+    except Exception as e:
+        log_test("Janitor Stats", False, str(e))
+        return False
+
+def test_kernel_backend():
+    """Test that the active kernel backend is reported"""
+    try:
+        backend = requests.get(f"{BASE_URL}/health").json().get('kernel_backend')
+        ok = backend in ('numpy', 'numba')
+        log_test("Kernel Backend", ok, f"Backend: {backend}")
+        return ok
+    except Exception as e:
+        log_test("Kernel Backend", False, str(e))
+        return False
+
+def test_buffer_pool_stats():
+    """Test that renders reuse pooled working arrays within the retained-bytes cap"""
+    try:
+        pool = requests.get(f"{BASE_URL}/stats").json().get('caches', {}).get('buffer_pool', {})
+        ok = pool.get('hits', 0) > 0 and pool.get('retained_bytes', -1) <= pool.get('max_bytes', 0)
+        log_test("Buffer Pool Stats", ok,
+                 f"Hit rate: {pool.get('hit_rate', 0):.2f}, retained: {pool.get('retained_bytes')} bytes")
+        return ok
+    except Exception as e:
+        log_test("Buffer Pool Stats", False, str(e))
+        return False
+
+def test_scheduler_stats():
+    """Test that scheduler lanes and cache stats are exported"""
+    try:
+        response = requests.get(f"{BASE_URL}/stats")
+        if response.status_code != 200:
+            log_test("Scheduler Stats", False, f"Status code: {response.status_code}")
+            return False
+        
+        lanes = response.json().get('scheduler', {}).get('lanes', {})
+        if 'preview' in lanes and 'render' in lanes and lanes['preview']['completed'] > 0:
+            log_test("Scheduler Stats", True,
+                     f"Previews: {lanes['preview']['completed']}, Renders: {lanes['render']['completed']}")
+            return True
+        log_test("Scheduler Stats", False, f"Unexpected lanes: {lanes}")
+        return False
+    except Exception as e:
+        log_test("Scheduler Stats", False, str(e))
+        return False
+
 def run_all_tests():
     """Run all tests"""
     print("=" * 60)
@@ -351,6 +693,11 @@ def run_all_tests():
         
         print("\n--- Testing Processing Features ---")
         
+        # Background gallery renders queued by the upload
+        print("\nTesting speculative gallery rendering...")
+        test_speculative_gallery()
+        test_speculative_logo()
+        
         # Test all presets
         print("\nTesting all presets...")
         test_all_presets(filename)
@@ -370,12 +717,48 @@ def run_all_tests():
         # Test download sizes
         print("\nTesting download sizes...")
         test_download_sizes(filename)
+        test_indexed_download(filename)
         
         # Test download with aspect ratio
         print("\nTesting download with aspect ratio preserved...")
         test_download_with_aspect_ratio(filename)
         
+        # Streaming export
+        print("\nTesting ZIP export...")
+        test_export_zip(filename)
+        test_export_duplicates(filename)
+        
+        # Slider sweep strip
+        print("\nTesting slider sweep...")
+        test_process_sweep(filename)
+        
+        # Client-side tone preview inputs
+        print("\nTesting tone base...")
+        test_tone_base(filename)
+        
+        # Contact sheet
+        print("\nTesting contact sheet...")
+        test_contact_sheet(filename)
+        
+        # Band-logo text layer
+        print("\nTesting text layer...")
+        test_text_layer(filename)
+        
+        # Scheduler stats
+        print("\nTesting scheduler stats...")
+        test_janitor_stats()
+        test_buffer_pool_stats()
+        test_kernel_backend()
+        test_scheduler_stats()
+        
         # Cleanup
+        print("\nTesting duplicate upload...")
+        test_duplicate_upload(test_image_path, filename)
+        
+        print("\nTesting chunked and raw uploads...")
+        test_chunked_upload(test_image_path, filename)
+        test_raw_upload(test_image_path, filename)
+        
         print("\nTesting cleanup...")
         test_cleanup(filename)
         
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Golden-image equivalence harness for the optimized render paths
+Seeded synthetic images are rendered through the plain reference pipeline
+(whole-image luma, NumPy tone and grain, blend-mode tint) and through every
+fast path, over randomized parameters for every method and tint. Fast paths
+must match bit for bit unless a tolerance is stated below. The reference
+itself is pinned by a small golden set in golden/; rewrite it with --update
+only after an intentional change to the output. Runs in-process, no server
+needed
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from dither import DIFFUSION_WEIGHTS
+from edges import edge_magnitude
+from image_processor import (DungeonSynthProcessor, CONTACT_SHEET_GUTTER,
+                             CONTACT_SHEET_LABEL_HEIGHT, STRIP_ROWS)
+from kernels import KERNEL_BACKENDS, VERIFY_TOLERANCE, load_kernels
+from presets import PROCESSING_PRESETS, COLOR_TINTS, TEXTURES, list_methods
+from render_params import normalize_params, preset_params
+from typography import TEXT_BLEND_MODES, TEXT_POSITIONS
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+GOLDEN_MANIFEST = os.path.join(GOLDEN_DIR, 'manifest.json')
+GOLDEN_SIZE = (64, 48)
+
+# Odd sizes, so grain cells and strips end part-way; strips are wide enough
+# to pick a texture level taller than one strip
+CASE_SIZE = (97, 61)
+STRIP_SIZE = (301, STRIP_ROWS * 2 + 37)
+PREVIEW_SIZE = 128
+
+# Band-logo texts for randomized cases; the empty one renders without a layer
+LOGO_TEXTS = ['', 'Burzum', 'Hällas\nExcerpts from a Future Past']
+
+def synthetic_image(seed, width, height):
+    """Seeded test card: color gradients, fine noise and a few solid shapes"""
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255.0 / max(1, width - 1),
+                     y * 255.0 / max(1, height - 1),
+                     (x + y) * 255.0 / max(1, width + height - 2)], axis=-1)
+    base += rng.normal(0, 12, base.shape)
+    image = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    for _ in range(4):
+        left, top = int(rng.randint(0, width)), int(rng.randint(0, height))
+        fill = tuple(int(v) for v in rng.randint(0, 256, 3))
+        draw.ellipse([left, top, left + width // 4, top + height // 4], fill=fill)
+    return image
+
+def random_params(rng, method, tint, noise=None):
+    """Seeded parameters spanning the slider ranges"""
+    if noise is None:
+        noise = int(rng.choice([0, rng.randint(1, 61)]))
+    return normalize_params({
+        'method': method,
+        'color_tint': tint,
+        'brightness': int(rng.randint(-60, 61)),
+        'contrast': float(rng.uniform(0.3, 3.0)),
+        'threshold': int(rng.randint(30, 226)),
+        'noise': noise,
+        'blur': float(rng.choice([0.0, rng.uniform(0.2, 4.0)])),
+        'texture': str(rng.choice(list(TEXTURES))),
+        'text': str(rng.choice(LOGO_TEXTS)),
+        'text_size': float(rng.uniform(4, 30)),
+        'text_position': str(rng.choice(TEXT_POSITIONS)),
+        'text_blend': str(rng.choice(TEXT_BLEND_MODES)),
+        'text_color': '#%06x' % rng.randint(0, 1 << 24)
+    })
+
+def reference_render(processor, image, params):
+    """The plain pipeline every fast path must reproduce"""
+    image = image.convert('RGB')
+    blur = params.get('blur', 0)
+    if blur > 0:
+        image = image.filter(ImageFilter.GaussianBlur(radius=blur))
+    luma = np.dot(np.array(image), [0.299, 0.587, 0.114])
+    with processor.buffer_pool.lease() as buffers:
+        gray = processor._tone_and_grain(luma, params, buffers)
+        result = Image.fromarray(np.stack([gray, gray, gray], axis=-1))
+    tint = params.get('color_tint', 'none')
+    if tint and tint != 'none':
+        result = processor._apply_color_tint(result, tint)
+    result = np.array(result)
+    processor._apply_text_layer(result, params)
+    return result
+
+def decode_data_uri(uri):
+    return np.array(Image.open(io.BytesIO(base64.b64decode(uri.split(',', 1)[1]))))
+
+class Harness:
+    """Counts comparisons per path and prints only the failures"""
+
+    def __init__(self):
+        self.checked = {}
+        self.failed = 0
+
+    def compare(self, path, label, expected, actual, tolerance=0):
+        self.checked[path] = self.checked.get(path, 0) + 1
+        if expected.shape != actual.shape:
+            print(f"✗ {path} {label}: shape {actual.shape} != {expected.shape}")
+            self.failed += 1
+            return
+        difference = int(np.abs(expected.astype(np.int16) - actual).max()) if expected.size else 0
+        if difference > tolerance:
+            print(f"✗ {path} {label}: differs by {difference} (tolerance {tolerance})")
+            self.failed += 1
+
+def golden_cases():
+    """(file name, params) for the golden set: every preset, each with a tint fixed by its name"""
+    tints = list(COLOR_TINTS)
+    cases = []
+    for name in sorted(PROCESSING_PRESETS):
+        tint = tints[zlib.crc32(name.encode('utf-8')) % len(tints)]
+        cases.append((f"{name}-{tint}.png", preset_params(name, tint)))
+    return cases
+
+def update_golden(processor):
+    source = synthetic_image(0, *GOLDEN_SIZE)
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    manifest = {}
+    for filename, params in golden_cases():
+        Image.fromarray(reference_render(processor, source, params)).save(os.path.join(GOLDEN_DIR, filename))
+        manifest[filename] = params
+    with open(GOLDEN_MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"✓ Wrote {len(manifest)} golden images to {GOLDEN_DIR}")
+
+def check_golden(harness, processor):
+    """The reference and the preview path against the stored images"""
+    with open(GOLDEN_MANIFEST) as f:
+        manifest = json.load(f)
+    source = synthetic_image(0, *GOLDEN_SIZE)
+    for filename, params in golden_cases():
+        if manifest.get(filename) != params:
+            print(f"✗ golden {filename}: stored parameters are out of date; rerun with --update")
+            harness.failed += 1
+            continue
+        golden = np.array(Image.open(os.path.join(GOLDEN_DIR, filename)).convert('RGB'))
+        harness.compare('golden', filename, golden, reference_render(processor, source, params))
+        rendered = processor._apply_dungeon_synth_processing(source, params, color_tint=params['color_tint'])
+        harness.compare('golden', f"{filename} (preview path)", golden, np.array(rendered))
+
+def check_in_memory_paths(harness, processors, rng, cases):
+    """Whole-image, strip and alternate-backend renders of seeded images"""
+    single, threaded = processors
+    tints = list(COLOR_TINTS)
+    backends = [kernels for kernels in (load_kernels(name) for name in KERNEL_BACKENDS if name != 'numpy')
+                if kernels is not None]
+    for method_index, method in enumerate(list_methods()):
+        for case in range(cases):
+            seed = method_index * cases + case
+            tint = tints[seed % len(tints)]
+            params = random_params(rng, method, tint)
+            label = f"{method}/{tint} #{case} {params}"
+
+            image = synthetic_image(seed, *CASE_SIZE)
+            expected = reference_render(single, image, params)
+            harness.compare('preview', label, expected,
+                            np.array(single._apply_dungeon_synth_processing(image, params, color_tint=tint)))
+            harness.compare('render', label, expected, np.array(single._process_and_tint(image, params)))
+
+            # Alternate backends: one gray level, which a tint can stretch to its widest step
+            lut = single.tint_lut(tint)
+            tolerance = VERIFY_TOLERANCE * int(np.abs(np.diff(lut.astype(np.int16), axis=0)).max())
+            for kernels in backends:
+                default = single.kernels
+                single.kernels = kernels
+                try:
+                    actual = np.array(single._apply_dungeon_synth_processing(image, params, color_tint=tint))
+                finally:
+                    single.kernels = default
+                harness.compare(f"kernels/{kernels.name}", label, expected, actual, tolerance)
+
+            # Strips seed their own grain, so they match the reference with the
+            # grain off, and match themselves at any thread count with it on;
+            # error diffusion never renders in strips
+            if method in DIFFUSION_WEIGHTS:
+                continue
+            tall = synthetic_image(seed, *STRIP_SIZE)
+            grainless = dict(params, noise=0)
+            harness.compare('strips', f"{label} without grain", reference_render(single, tall, grainless),
+                            np.array(single._process_strips(tall, grainless)))
+            harness.compare('strip threads', label, np.array(single._process_strips(tall, params)),
+                            np.array(threaded._process_strips(tall, params)))
+
+def check_file_paths(harness, processor, rng, workdir):
+    """Cached-base renders, slider sweeps and contact sheets of a stored upload"""
+    tints = list(COLOR_TINTS)
+    for method_index, method in enumerate(list_methods()):
+        path = os.path.join(workdir, f"{method}.png")
+        synthetic_image(100 + method_index, 150, 110).save(path)
+        preserve = bool(method_index % 2)
+        base = processor._load_preview_base(path, PREVIEW_SIZE, preserve)
+
+        first = random_params(rng, method, tints[method_index % len(tints)])
+        variants = [dict(random_params(rng, method, tint), blur=first['blur'],
+                         preserve_aspect_ratio=preserve) for tint in tints[:3]]
+        for index, params in enumerate(variants):
+            label = f"{method} #{index} {params}"
+            harness.compare('render_at_size', label, reference_render(processor, base, params),
+                            np.array(processor.render_at_size(path, params, PREVIEW_SIZE)))
+
+        # Line art keeps its gradients per upload, size and blur, for the next slider change
+        if method == 'lineart':
+            cached = processor.source_cache.get((path, 'edges', PREVIEW_SIZE, preserve, first['blur']))
+            if cached is None:
+                print(f"✗ edge cache {method}: gradients were not cached")
+                harness.failed += 1
+            else:
+                with processor.buffer_pool.lease() as buffers:
+                    expected = edge_magnitude(processor._luma(base, first['blur'], buffers))
+                harness.compare('edge cache', method, expected, cached)
+
+        # Sweeps always render at 400 and share one luma plane between frames
+        sweep_base = processor._load_preview_base(path, 400, preserve)
+        for index, (params, frame) in enumerate(zip(variants, processor.process_preview_sweep(path, variants))):
+            harness.compare('sweep', f"{method} #{index} {params}",
+                            reference_render(processor, sweep_base, params), decode_data_uri(frame))
+
+        # Contact sheets tint every tile alike, so the variants share one tint
+        tint = variants[0]['color_tint']
+        tiles = [(f"v{index}", dict(params, color_tint=tint)) for index, params in enumerate(variants)]
+        sheet = np.array(Image.open(io.BytesIO(processor.render_contact_sheet(
+            path, tiles, tint, PREVIEW_SIZE, 2, preserve))))
+        height, width = base.height, base.width
+        for index, (label, params) in enumerate(tiles):
+            row, column = divmod(index, 2)
+            x = CONTACT_SHEET_GUTTER + column * (PREVIEW_SIZE + CONTACT_SHEET_GUTTER) + (PREVIEW_SIZE - width) // 2
+            y = (CONTACT_SHEET_GUTTER + row * (PREVIEW_SIZE + CONTACT_SHEET_LABEL_HEIGHT + CONTACT_SHEET_GUTTER)
+                 + (PREVIEW_SIZE - height) // 2)
+            harness.compare('contact sheet', f"{method} {label} {params}",
+                            reference_render(processor, base, params), sheet[y:y + height, x:x + width])
+
+def check_glyph_atlases(harness, processor):
+    """The same logo at several sizes, twice over: the second pass rasterizes nothing"""
+    params = normalize_params({'method': 'threshold', 'text': LOGO_TEXTS[2], 'text_position': 'center'})
+    image = synthetic_image(7, 211, 173)
+    first = [np.array(processor._process_and_tint(image.resize((size, size)), params)) for size in (96, 211, 400)]
+    before = processor.typesetter.stats()
+    for size, expected in zip((96, 211, 400), first):
+        harness.compare('glyph atlas', f"{size}px", expected,
+                        np.array(processor._process_and_tint(image.resize((size, size)), params)))
+    after = processor.typesetter.stats()
+    if after['misses'] != before['misses'] or after['glyphs'] != before['glyphs']:
+        print(f"✗ glyph atlas: glyphs rasterized again ({before} -> {after})")
+        harness.failed += 1
+
+def test_golden(seed=0, cases=2):
+    print("Testing Golden-Image Equivalence")
+    print("=" * 50)
+
+    harness = Harness()
+    single = DungeonSynthProcessor(strip_workers=1)
+    threaded = DungeonSynthProcessor(strip_workers=3)
+    workdir = tempfile.mkdtemp()
+    rng = np.random.RandomState(seed)
+
+    try:
+        check_golden(harness, single)
+        check_in_memory_paths(harness, (single, threaded), rng, cases)
+        check_file_paths(harness, single, rng, workdir)
+        check_glyph_atlases(harness, single)
+
+        for path, count in harness.checked.items():
+            print(f"✓ {path}: {count} comparisons")
+        if harness.failed:
+            print(f"\n✗ {harness.failed} comparisons differ")
+            return False
+        print("\n✅ Every render path matches the reference!")
+        return True
+
+    finally:
+        single.cleanup()
+        threaded.cleanup()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the randomized parameters')
+    parser.add_argument('--cases', type=int, default=2, help='Randomized cases per method')
+    parser.add_argument('--update', action='store_true', help='Rewrite the golden set from the reference')
+    options = parser.parse_args()
+    if options.update:
+        processor = DungeonSynthProcessor(strip_workers=1)
+        update_golden(processor)
+        processor.cleanup()
+        sys.exit(0)
+    success = test_golden(options.seed, options.cases)
+    sys.exit(0 if success else 1)
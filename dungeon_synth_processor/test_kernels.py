@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Check every installed kernel backend against the NumPy reference
+Runs in-process, no server needed; backends whose optional dependency is
+missing are reported and skipped
+"""
+
+import sys
+
+from image_processor import DungeonSynthProcessor
+from kernels import KERNEL_BACKENDS, VERIFY_TOLERANCE, load_kernels, verify_kernels
+
+def test_kernels():
+    print("Testing Kernel Backends")
+    print("=" * 50)
+
+    processor = DungeonSynthProcessor(strip_workers=1)
+    ok = True
+
+    try:
+        for name in KERNEL_BACKENDS:
+            kernels = load_kernels(name)
+            if kernels is None:
+                print(f"- {name}: not installed, skipped")
+                continue
+            difference = verify_kernels(processor, kernels)
+            if difference > VERIFY_TOLERANCE:
+                print(f"✗ {name}: differs from numpy by {difference} levels")
+                ok = False
+            else:
+                print(f"✓ {name}: matches numpy (max difference {difference})")
+
+        if ok:
+            print("\n✅ All kernel backends match the reference!")
+        return ok
+
+    finally:
+        processor.cleanup()
+
+if __name__ == "__main__":
+    success = test_kernels()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,162 @@
+"""
+Procedural paper textures: parchment mottling, paper fibers and foxing stains
+Each texture is generated once from a fixed seed by shaping white noise in
+the frequency domain, which makes it wrap around seamlessly. It is stored as
+a pyramid of halved levels in .npy files that every worker memory-maps, so a
+render only reads the rows it blends, through a gray-by-texture table
+"""
+
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+TEXTURE_SIZE = 1024
+TEXTURE_LEVELS = 4        # 1024, 512, 256 and 128 pixels
+TEXTURE_SEED = 1347
+# Part of every file name; bump it when a generator changes so old pyramids are not reused
+TEXTURE_VERSION = 1
+DEFAULT_TEXTURE_DIR = os.path.join(tempfile.gettempdir(), 'dungeon_synth_processor', 'textures')
+
+
+def periodic_noise(rng, size, low, high, angle=0.0, stretch=1.0):
+    """
+    White noise band-passed to between low and high cycles per tile, scaled
+    to 0..1; a stretch above 1 draws streaks along angle (in degrees)
+    """
+    frequencies = np.fft.fftfreq(size) * size
+    fy, fx = frequencies[:, None], frequencies[None, :]
+    radians = np.radians(angle)
+    along = fx * np.cos(radians) + fy * np.sin(radians)
+    across = fy * np.cos(radians) - fx * np.sin(radians)
+    radius = np.hypot(along * stretch, across)
+
+    band = np.exp(-(radius / high) ** 2)
+    if low > 0:
+        band *= 1 - np.exp(-(radius / low) ** 2)
+    noise = np.real(np.fft.ifft2(np.fft.fft2(rng.standard_normal((size, size))) * band))
+    noise -= noise.min()
+    noise /= noise.max()
+    return noise
+
+
+def parchment(rng, size):
+    """Soft blotches and cloudiness of aged skin, never darker than a light tan"""
+    mottling = 0.55 * periodic_noise(rng, size, 0, 4) + 0.3 * periodic_noise(rng, size, 0, 16)
+    mottling += 0.15 * periodic_noise(rng, size, 64, 256)
+    return 0.7 + 0.3 * mottling
+
+
+def fibers(rng, size):
+    """Thin fibers laid in a few directions over a faint pulp speckle"""
+    paper = 0.94 + 0.06 * periodic_noise(rng, size, 96, 384)
+    for angle in (15, 70, 125):
+        # Ridges of band-passed noise, sharpened into hairlines
+        ridge = 1 - np.abs(2 * periodic_noise(rng, size, 8, 24, angle, stretch=8) - 1)
+        paper -= 0.25 * ridge ** 64
+    return paper
+
+
+def stains(rng, size):
+    """Water stains with darker tide lines, and small foxing spots"""
+    water = periodic_noise(rng, size, 0, 3)
+    inside = np.clip((water - 0.68) / 0.12, 0, 1)
+    tide = np.exp(-((water - 0.68) / 0.02) ** 2)
+    foxing = np.clip((periodic_noise(rng, size, 0, 48) - 0.82) / 0.06, 0, 1)
+    return 1 - 0.12 * inside - 0.3 * tide - 0.35 * foxing
+
+
+GENERATORS = {
+    'parchment': parchment,
+    'fibers': fibers,
+    'stains': stains
+}
+
+
+def build_pyramid(name):
+    """uint8 levels of a named texture, full size first, each half the one before"""
+    rng = np.random.RandomState(TEXTURE_SEED + sorted(GENERATORS).index(name))
+    texture = np.clip(GENERATORS[name](rng, TEXTURE_SIZE), 0, 1) * 255
+    levels = []
+    for _ in range(TEXTURE_LEVELS):
+        levels.append(np.rint(texture).astype(np.uint8))
+        # A 2x2 mean of a wrapping texture still wraps
+        half = texture.shape[0] // 2
+        texture = texture.reshape(half, 2, half, 2).mean(axis=(1, 3))
+    return levels
+
+
+def blend_texture(gray, level, lut, top=0):
+    """
+    Blend a texture level, repeated over a uint8 plane, into the plane in
+    place; lut is indexed by texture * 256 + gray, and top is the plane's
+    first row in the full image so strips continue the same tiling
+    """
+    height, width = gray.shape
+    size = level.shape[0]
+    y = 0
+    while y < height:
+        row = (top + y) % size
+        rows = min(height - y, size - row)
+        for x in range(0, width, size):
+            block = gray[y:y + rows, x:x + size]
+            index = level[row:row + rows, :block.shape[1]].astype(np.uint16)
+            index <<= 8
+            index |= block
+            block[...] = lut[index]
+        y += rows
+
+
+class TextureLibrary:
+    """
+    Texture pyramids on disk, generated by the first process that needs one
+    and memory-mapped by every process after that
+    """
+
+    def __init__(self, directory=DEFAULT_TEXTURE_DIR):
+        self.directory = directory
+        self.pyramids = {}
+        self.lock = threading.Lock()
+
+    def level(self, name, width):
+        """The smallest level at least width pixels wide, or the full-size one to repeat"""
+        pyramid = self.pyramid(name)
+        for level in reversed(pyramid):
+            if level.shape[1] >= width:
+                return level
+        return pyramid[0]
+
+    def pyramid(self, name):
+        with self.lock:
+            pyramid = self.pyramids.get(name)
+            if pyramid is None:
+                pyramid = self._load(name)
+                self.pyramids[name] = pyramid
+            return pyramid
+
+    def _paths(self, name):
+        return [os.path.join(self.directory, f"{name}-v{TEXTURE_VERSION}-{TEXTURE_SIZE >> index}.npy")
+                for index in range(TEXTURE_LEVELS)]
+
+    def _load(self, name):
+        if name not in GENERATORS:
+            raise ValueError(f"Unknown texture: {name}")
+        paths = self._paths(name)
+        if not all(os.path.exists(path) for path in paths):
+            os.makedirs(self.directory, exist_ok=True)
+            for path, level in zip(paths, build_pyramid(name)):
+                # Written aside under a per-thread name and renamed, so no process maps a partial file
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, level)
+                os.replace(tmp_path, path)
+        return [np.load(path, mmap_mode='r') for path in paths]
+
+    def stats(self):
+        """Textures mapped by this process and their bytes on disk"""
+        with self.lock:
+            return {
+                'mapped': sorted(self.pyramids),
+                'bytes': sum(level.nbytes for pyramid in self.pyramids.values() for level in pyramid)
+            }
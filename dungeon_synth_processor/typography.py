@@ -0,0 +1,194 @@
+"""
+Band-logo text layer, composited over a finished render
+Glyphs are rasterized once per (font, pixel size) into an atlas of coverage
+masks, so laying out a line is only array copies. The pixel size follows the
+render size, so each output size, and each shrink to fit a long line, builds
+its own atlas; renders that repeat a size, like a batch of equal images or
+the same export size again, reuse it. Glyphs are placed by their advances
+alone, without kerning pairs
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Fonts are chosen by file name from one folder; 'default' is Pillow's own font
+DEFAULT_FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
+FONT_EXTENSIONS = ('.ttf', '.otf')
+DEFAULT_FONT = 'default'
+
+# Horizontal centre and vertical placement of the text block
+TEXT_POSITIONS = ('top', 'center', 'bottom')
+# The tint blend modes, at full strength under each glyph
+TEXT_BLEND_MODES = ('normal', 'multiply', 'overlay', 'soft_light')
+
+DEFAULT_TEXT_SIZE = 10.0          # percent of the render's shorter side
+DEFAULT_TEXT_POSITION = 'top'
+DEFAULT_TEXT_BLEND = 'normal'
+DEFAULT_TEXT_COLOR = '#e8e0d0'
+MAX_TEXT_LENGTH = 120
+
+# Line pitch as a multiple of the font size, and the margin kept clear
+# around the block as a share of the shorter side
+TEXT_LINE_SPACING = 1.25
+TEXT_MARGIN = 0.06
+
+# Atlases kept per process, least recently used dropped first
+ATLAS_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def font_names(directory=DEFAULT_FONT_DIR):
+    """'default' and the font files in a folder, by file name"""
+    try:
+        files = sorted(name for name in os.listdir(directory)
+                       if name.lower().endswith(FONT_EXTENSIONS))
+    except FileNotFoundError:
+        files = []
+    return [DEFAULT_FONT] + files
+
+
+def load_font(directory, name, size):
+    """A font from the folder at a pixel size; raises ValueError for files that are not there"""
+    if name == DEFAULT_FONT:
+        try:
+            return ImageFont.load_default(size=size)
+        except TypeError:
+            # Pillow < 10.1 only ships the fixed-size bitmap font
+            return ImageFont.load_default()
+    path = os.path.join(directory, os.path.basename(name))
+    if not name.lower().endswith(FONT_EXTENSIONS) or not os.path.isfile(path):
+        raise ValueError(f"Unknown font: {name}")
+    return ImageFont.truetype(path, size)
+
+
+class GlyphAtlas:
+    """
+    Coverage masks of one font at one pixel size, rasterized on first use
+    Each glyph is (mask, left, top, advance), with left and top the mask's
+    offset from the pen position at the top of the line
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.glyphs = {}
+        self.nbytes = 0
+        # FreeType faces are not safe to rasterize from several threads
+        self.lock = threading.Lock()
+
+    def glyph(self, char):
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            with self.lock:
+                glyph = self.glyphs.get(char)
+                if glyph is None:
+                    glyph = self._rasterize(char)
+                    self.glyphs[char] = glyph
+                    self.nbytes += glyph[0].nbytes
+        return glyph
+
+    def _rasterize(self, char):
+        left, top, right, bottom = self.font.getbbox(char)
+        mask = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+        ImageDraw.Draw(mask).text((-left, -top), char, font=self.font, fill=255)
+        return np.array(mask), left, top, self.font.getlength(char)
+
+    def line_width(self, line):
+        return int(round(sum(self.glyph(char)[3] for char in line)))
+
+
+class Typesetter:
+    """
+    Lays out text blocks from cached glyph atlases, one per (font, size)
+    """
+
+    def __init__(self, directory=DEFAULT_FONT_DIR, max_bytes=ATLAS_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.atlases = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def fonts(self):
+        return font_names(self.directory)
+
+    def has_font(self, name):
+        return name in self.fonts()
+
+    def atlas(self, font, size):
+        key = (font, size)
+        with self.lock:
+            atlas = self.atlases.get(key)
+            if atlas is not None:
+                self.atlases.move_to_end(key)
+                self.hits += 1
+                return atlas
+            self.misses += 1
+            atlas = GlyphAtlas(load_font(self.directory, font, size))
+            self.atlases[key] = atlas
+            # Atlases grow as glyphs are added, so the budget is checked on each new one
+            while len(self.atlases) > 1 and sum(a.nbytes for a in self.atlases.values()) > self.max_bytes:
+                self.atlases.popitem(last=False)
+            return atlas
+
+    def layout(self, params, width, height):
+        """
+        Coverage plane of the text block for a width x height render, and the
+        (x, y) of its top-left pixel in the render, which may lie outside it
+        The font size follows the render size, and shrinks to fit the widest
+        line between the margins
+        """
+        lines = params['text'].split('\n')
+        margin = int(round(TEXT_MARGIN * min(width, height)))
+        size = max(1, int(round(params['text_size'] / 100 * min(width, height))))
+        atlas = self.atlas(params['text_font'], size)
+        widest = max(atlas.line_width(line) for line in lines)
+        available = max(1, width - 2 * margin)
+        if widest > available:
+            size = max(1, int(size * available / widest))
+            atlas = self.atlas(params['text_font'], size)
+            widest = max(atlas.line_width(line) for line in lines)
+
+        # Pen positions of every glyph, relative to the block's top-left corner
+        pitch = int(round(size * TEXT_LINE_SPACING))
+        placed = []
+        for row, line in enumerate(lines):
+            pen = (widest - atlas.line_width(line)) / 2
+            for char in line:
+                mask, left, top, advance = atlas.glyph(char)
+                placed.append((mask, int(round(pen)) + left, row * pitch + top))
+                pen += advance
+        block_height = (len(lines) - 1) * pitch + size
+
+        # Ink can overhang the layout box, so the plane spans every mask
+        x0 = min([0] + [x for _, x, _ in placed])
+        y0 = min([0] + [y for _, _, y in placed])
+        x1 = max([widest] + [x + mask.shape[1] for mask, x, _ in placed])
+        y1 = max([block_height] + [y + mask.shape[0] for mask, _, y in placed])
+        coverage = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        for mask, x, y in placed:
+            region = coverage[y - y0:y - y0 + mask.shape[0], x - x0:x - x0 + mask.shape[1]]
+            np.maximum(region, mask, out=region)
+
+        left = (width - widest) // 2
+        if params['text_position'] == 'top':
+            top = margin
+        elif params['text_position'] == 'center':
+            top = (height - block_height) // 2
+        else:
+            top = height - margin - block_height
+        return coverage, (left + x0, top + y0)
+
+    def stats(self):
+        """Atlases held by this process, their glyphs and bytes, and lookup hit rates"""
+        with self.lock:
+            return {
+                'atlases': len(self.atlases),
+                'glyphs': sum(len(atlas.glyphs) for atlas in self.atlases.values()),
+                'bytes': sum(atlas.nbytes for atlas in self.atlases.values()),
+                'hits': self.hits,
+                'misses': self.misses
+            }
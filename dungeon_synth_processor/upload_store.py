@@ -0,0 +1,297 @@
+"""
+Shared per-upload state for multi-process deployments
+Every worker opens the same SQLite database, so an upload accepted by one
+worker is known to all of them along with its derived artifacts. Rows are
+also kept in an in-memory index, so request handlers learn an upload's
+dimensions, format and renders without touching the disk
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    filename TEXT PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    format TEXT,
+    mode TEXT,
+    orientation INTEGER DEFAULT 1,
+    created REAL NOT NULL,
+    digest TEXT,
+    refs INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    filename TEXT NOT NULL,
+    key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    created REAL NOT NULL,
+    PRIMARY KEY (filename, key)
+);
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    upload_id TEXT PRIMARY KEY,
+    extension TEXT,
+    size INTEGER NOT NULL,
+    received INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+# Seconds an indexed row is trusted before it is re-read, which bounds how
+# long a removal by another worker can go unnoticed here
+INDEX_TTL = 5.0
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = {
+    'digest': 'ALTER TABLE uploads ADD COLUMN digest TEXT',
+    'refs': 'ALTER TABLE uploads ADD COLUMN refs INTEGER NOT NULL DEFAULT 1'
+}
+
+
+class UploadStore:
+    """
+    SQLite-backed upload registry shared by all worker processes
+    Uploads are content addressed: byte-identical files map to one stored
+    source, and every upload of it holds a reference until it is released
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._index = {}
+        self._index_lock = threading.Lock()
+        self.index_hits = 0
+        self.index_misses = 0
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(uploads)')}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                conn.execute(statement)
+        conn.execute('CREATE INDEX IF NOT EXISTS uploads_digest ON uploads (digest)')
+
+    def _connection(self):
+        """Return a connection owned by this thread and process"""
+        conn = getattr(self._local, 'conn', None)
+        # Connections must not cross a fork, so reopen in each worker
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _indexed(self, key, load):
+        """Row for key from the index, or from load() once the entry is missing or stale"""
+        now = time.monotonic()
+        with self._index_lock:
+            entry = self._index.get(key)
+            if entry is not None and now - entry[1] < INDEX_TTL:
+                self.index_hits += 1
+                return entry[0]
+            self.index_misses += 1
+        row = load()
+        with self._index_lock:
+            # Unknown rows are not remembered: another worker may add them any moment
+            if row is None:
+                self._index.pop(key, None)
+            else:
+                self._index[key] = (row, now)
+        return row
+
+    def _forget(self, filename):
+        """Drop an upload and its artifacts from the index"""
+        with self._index_lock:
+            for key in [key for key in self._index if key[1] == filename]:
+                del self._index[key]
+
+    def add(self, filename, width, height, format=None, mode=None, orientation=1, digest=None):
+        """Register a validated upload holding one reference"""
+        # Two workers storing the same new content both end up here; count both
+        self._connection().execute(
+            'INSERT INTO uploads '
+            '(filename, width, height, format, mode, orientation, created, digest, refs) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1) '
+            'ON CONFLICT (filename) DO UPDATE SET refs = refs + 1',
+            (filename, width, height, format, mode, orientation, time.time(), digest)
+        )
+        self._forget(filename)
+
+    def acquire(self, digest):
+        """Take another reference on the upload with this content digest, or return None"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT * FROM uploads WHERE digest = ? ORDER BY created LIMIT 1', (digest,)
+            ).fetchone()
+            if row is not None:
+                conn.execute('UPDATE uploads SET refs = refs + 1 WHERE filename = ?', (row['filename'],))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        upload = dict(row)
+        upload['refs'] += 1
+        with self._index_lock:
+            self._index[('upload', upload['filename'])] = (upload, time.monotonic())
+        return dict(upload)
+
+    def release(self, filename):
+        """
+        Drop one reference to an upload
+        Returns (references left, artifact paths); once the count reaches zero
+        the upload is forgotten and its artifacts are the caller's to delete
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('UPDATE uploads SET refs = refs - 1 WHERE filename = ?', (filename,))
+            row = conn.execute('SELECT refs FROM uploads WHERE filename = ?', (filename,)).fetchone()
+            remaining = max(row['refs'], 0) if row else 0
+            paths = []
+            if remaining == 0:
+                paths = [r['path'] for r in conn.execute(
+                    'SELECT path FROM artifacts WHERE filename = ?', (filename,)
+                )]
+                conn.execute('DELETE FROM artifacts WHERE filename = ?', (filename,))
+                conn.execute('DELETE FROM uploads WHERE filename = ?', (filename,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._forget(filename)
+        return remaining, paths
+
+    def get(self, filename):
+        """Return upload metadata as a dict, or None if unknown"""
+        def load():
+            row = self._connection().execute(
+                'SELECT * FROM uploads WHERE filename = ?', (filename,)
+            ).fetchone()
+            return dict(row) if row else None
+        upload = self._indexed(('upload', filename), load)
+        return dict(upload) if upload else None
+
+    def remove(self, filename):
+        """Forget an upload and return the paths of its derived artifacts"""
+        conn = self._connection()
+        paths = [row['path'] for row in conn.execute(
+            'SELECT path FROM artifacts WHERE filename = ?', (filename,)
+        )]
+        conn.execute('DELETE FROM artifacts WHERE filename = ?', (filename,))
+        conn.execute('DELETE FROM uploads WHERE filename = ?', (filename,))
+        self._forget(filename)
+        return paths
+
+    def add_artifact(self, filename, key, path, width=None, height=None):
+        """Record the location of a derived artifact for an upload"""
+        created = time.time()
+        self._connection().execute(
+            'INSERT OR REPLACE INTO artifacts '
+            '(filename, key, path, width, height, created) VALUES (?, ?, ?, ?, ?, ?)',
+            (filename, key, path, width, height, created)
+        )
+        artifact = {'filename': filename, 'key': key, 'path': path,
+                    'width': width, 'height': height, 'created': created}
+        with self._index_lock:
+            self._index[('artifact', filename, key)] = (artifact, time.monotonic())
+
+    def get_artifact(self, filename, key):
+        """
+        Return recorded artifact metadata, or None
+        The file is not checked; callers that find it gone should discard_artifact
+        """
+        def load():
+            row = self._connection().execute(
+                'SELECT * FROM artifacts WHERE filename = ? AND key = ?', (filename, key)
+            ).fetchone()
+            return dict(row) if row else None
+        artifact = self._indexed(('artifact', filename, key), load)
+        return dict(artifact) if artifact else None
+
+    def discard_artifact(self, filename, key):
+        """Forget an artifact whose file has disappeared"""
+        self._connection().execute(
+            'DELETE FROM artifacts WHERE filename = ? AND key = ?', (filename, key)
+        )
+        with self._index_lock:
+            self._index.pop(('artifact', filename, key), None)
+
+    def create_session(self, upload_id, size, extension=None):
+        """Start a chunked upload of size bytes"""
+        now = time.time()
+        self._connection().execute(
+            'INSERT INTO upload_sessions (upload_id, extension, size, received, created, updated) '
+            'VALUES (?, ?, ?, 0, ?, ?)',
+            (upload_id, extension, size, now, now)
+        )
+
+    def get_session(self, upload_id):
+        """Return chunked upload state as a dict, or None if unknown"""
+        row = self._connection().execute(
+            'SELECT * FROM upload_sessions WHERE upload_id = ?', (upload_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def advance_session(self, upload_id, offset, received):
+        """Move a session from offset to received bytes; False if another chunk got there first"""
+        cursor = self._connection().execute(
+            'UPDATE upload_sessions SET received = ?, updated = ? WHERE upload_id = ? AND received = ?',
+            (received, time.time(), upload_id, offset)
+        )
+        return cursor.rowcount == 1
+
+    def remove_session(self, upload_id):
+        """Forget a chunked upload, finished or abandoned; False if it was already gone"""
+        cursor = self._connection().execute('DELETE FROM upload_sessions WHERE upload_id = ?', (upload_id,))
+        return cursor.rowcount == 1
+
+    def acquire_lease(self, name, holder, ttl):
+        """Take or renew a named lease for ttl seconds; False while another holder's is live"""
+        now = time.time()
+        cursor = self._connection().execute(
+            'INSERT INTO leases (name, holder, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires = excluded.expires '
+            'WHERE leases.expires < ? OR leases.holder = excluded.holder',
+            (name, holder, now + ttl, now)
+        )
+        return cursor.rowcount == 1
+
+    def prune_index(self):
+        """Drop stale index entries, e.g. of uploads removed by other workers"""
+        cutoff = time.monotonic() - INDEX_TTL
+        with self._index_lock:
+            for key in [key for key, (_, loaded) in self._index.items() if loaded < cutoff]:
+                del self._index[key]
+
+    def index_stats(self):
+        """Hit rate of the in-memory index"""
+        with self._index_lock:
+            lookups = self.index_hits + self.index_misses
+            return {
+                'entries': len(self._index),
+                'hits': self.index_hits,
+                'misses': self.index_misses,
+                'hit_rate': self.index_hits / lookups if lookups else 0.0
+            }
+
+    def count(self):
+        """Number of uploads currently tracked"""
+        return self._connection().execute('SELECT COUNT(*) FROM uploads').fetchone()[0]
@@ -0,0 +1,122 @@
+"""
+Incremental upload handling
+Request bodies are copied to disk in fixed-size pieces while their SHA-256 is
+computed and the image header is sniffed, so neither a single POST nor a
+series of resumable chunks is ever buffered whole or read back to be hashed
+"""
+
+import hashlib
+import threading
+
+# Bodies are read and written in pieces of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Bytes needed before the header can be identified
+SNIFF_BYTES = 12
+
+# Leading bytes of every accepted format, mapped to a stored file extension
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+    (b'BM', 'bmp'),
+)
+
+
+def sniff_format(header):
+    """Extension for an image header, or None if it is no supported format"""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
+
+
+class HashingWriter:
+    """
+    Append-only writer feeding every byte through SHA-256 and the header sniffer
+    """
+
+    def __init__(self, path, offset=0, digest=None, header=b''):
+        self.path = path
+        self.offset = offset
+        self.digest = digest or hashlib.sha256()
+        self.header = header
+
+    def update(self, chunk):
+        """Account for chunk as the next bytes of the upload"""
+        if len(self.header) < SNIFF_BYTES:
+            self.header += chunk[:SNIFF_BYTES - len(self.header)]
+        self.digest.update(chunk)
+        self.offset += len(chunk)
+
+    def copy(self, stream, limit=None):
+        """Append stream to the file; refuses to go past limit bytes in total"""
+        mode = 'r+b' if self.offset else 'wb'
+        with open(self.path, mode) as f:
+            f.seek(self.offset)
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if limit is not None and self.offset + len(chunk) > limit:
+                    raise ValueError(f"Upload exceeds its declared size of {limit} bytes")
+                f.write(chunk)
+                self.update(chunk)
+            # Drop anything a previously interrupted chunk left past this point
+            f.truncate()
+        return self
+
+    def format(self):
+        return sniff_format(self.header)
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def copy_stream(stream, path):
+    """Write a complete body to path; returns (SHA-256 hex digest, sniffed extension)"""
+    writer = HashingWriter(path).copy(stream)
+    return writer.hexdigest(), writer.format()
+
+
+class ChunkHashes:
+    """
+    Running hashes of in-progress chunked uploads received by this worker
+    Session state lives in the shared upload store, but hash state cannot
+    cross processes; a chunk landing on another worker simply makes the next
+    writer hash the missing prefix back from disk first
+    """
+
+    def __init__(self):
+        self.writers = {}
+        self.lock = threading.Lock()
+
+    def writer(self, upload_id, path, offset):
+        """A writer positioned at offset whose digest covers every earlier byte"""
+        with self.lock:
+            writer = self.writers.pop(upload_id, None)
+        if writer is None or writer.offset > offset:
+            writer = HashingWriter(path)
+        if writer.offset < offset:
+            # Catch up on bytes this worker did not see arrive
+            with open(path, 'rb') as f:
+                f.seek(writer.offset)
+                remaining = offset - writer.offset
+                while remaining:
+                    chunk = f.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ValueError('Partial upload is shorter than its recorded offset')
+                    writer.update(chunk)
+                    remaining -= len(chunk)
+        return writer
+
+    def keep(self, upload_id, writer):
+        with self.lock:
+            self.writers[upload_id] = writer
+
+    def discard(self, upload_id):
+        with self.lock:
+            self.writers.pop(upload_id, None)
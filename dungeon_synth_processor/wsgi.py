@@ -0,0 +1,13 @@
+"""
+WSGI entry point for pre-forking servers, e.g.
+
+    gunicorn --workers 8 --threads 4 --bind 0.0.0.0:5000 wsgi:app
+
+Every worker builds its own app; uploads and derived renders are shared
+through UPLOAD_FOLDER, RENDER_FOLDER and the UPLOAD_STORE database.
+Point DUNGEON_SYNTH_SETTINGS at a Python config file to override them.
+"""
+
+from app import create_app
+
+app = create_app()